@@ -5,9 +5,16 @@
 """
 
 import time
-from flask import Flask
+from flask import Flask, request
+from sqlalchemy import inspect
 from config import Config
 from app.models import db
+from app import migrations
+from app.models.replicas import init_replicas
+from app.models.sharding import init_sharding
+from app.utils.shared_state import create_backend
+from app.utils.profiler import init_profiler
+from app.utils.assets import load_manifest, asset_url, is_immutable_asset, IMMUTABLE_CACHE_CONTROL
 
 def create_app():
     """
@@ -23,19 +30,52 @@ def create_app():
     app.config.from_object(Config)
 
     app.config["START_TIME"] = str(int(time.time()))
-    app.config["TEMPLATES_AUTO_RELOAD"] = True
-    app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
+    app.config["TEMPLATES_AUTO_RELOAD"] = app.config["DEV_MODE"]
+    app.config["SEND_FILE_MAX_AGE_DEFAULT"] = None
+    app.config["ASSET_MANIFEST"] = load_manifest(app.static_folder)
+    app.jinja_env.globals["asset_url"] = asset_url
 
     @app.after_request
-    def no_cache(resp):
-        resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-        resp.headers["Pragma"] = "no-cache"
-        resp.headers["Expires"] = "0"
+    def cache_headers(resp):
+        path = request.path
+        if path.startswith(("/api/", "/auth/", "/bot/")):
+            # Ответы API всегда свежие
+            resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+            resp.headers["Pragma"] = "no-cache"
+            resp.headers["Expires"] = "0"
+        elif is_immutable_asset(path):
+            resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            # HTML и статика без хэша — только с ревалидацией по ETag
+            resp.headers["Cache-Control"] = "no-cache"
         return resp
 
     db.init_app(app)
     with app.app_context():
+        fresh = not inspect(db.engine).has_table("players")
         db.create_all()
+        if fresh:
+            # Свежая БД создана по моделям целиком — миграции ей не нужны
+            migrations.stamp_all(db.engine)
+        for key, engine in db.engines.items():
+            if key is not None and not inspect(engine).has_table("players"):
+                # Новый шард: схема целиком по моделям, как у свежей основной БД
+                db.metadata.create_all(engine)
+                migrations.stamp_all(engine)
+        app.extensions["shared_state"] = create_backend(app.config, db.engine)
+        init_replicas(app, app.extensions["shared_state"])
+        init_sharding(app, db, app.extensions["shared_state"])
+    init_profiler(app)
+
+    @app.before_request
+    def warm_up():
+        # Структуры в памяти строятся в фоне с первого запроса воркера (после fork),
+        # а не внутри запроса, которому они понадобились
+        if "warmed_up" not in app.extensions:
+            app.extensions["warmed_up"] = True
+            from app.logic import leaderboard, pricing
+            leaderboard.start(app)
+            pricing.start(app)
 
     from .routes.main import bp_main
     from .routes.auth import bp_auth
@@ -47,4 +87,8 @@ def create_app():
     app.register_blueprint(bp_player, url_prefix="/api")
     app.register_blueprint(bp_actions, url_prefix="/api")
 
+    if app.config["BOT_MODE"] == "webhook":
+        from .routes.bot import bp_bot
+        app.register_blueprint(bp_bot, url_prefix="/bot")
+
     return app
@@ -0,0 +1,173 @@
+"""ASGI-режим сервера.
+
+Игровой API (``/api/state``, ``/api/inventory``, ``/api/leaderboard*``,
+``/api/prices``, ``/api/action/*``) обслуживается асинхронными обработчиками
+(``app/asgi/views.py``) на async-движке SQLAlchemy; ``/api/events`` —
+SSE-поток обновлений. Всё остальное (страницы, ``/auth``, ``/bot``,
+dev-эндпоинты) отдаёт то же Flask-приложение через WSGI-адаптер uvicorn
+в пуле тредов.
+
+Сессия читается из подписанной cookie Flask, поэтому вход через
+``/auth`` работает в обоих режимах без изменений.
+
+Запуск::
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5500
+"""
+
+from __future__ import annotations
+import json
+from urllib.parse import parse_qsl
+
+from itsdangerous import BadSignature
+
+from app import create_app
+from app.asgi import views
+from app.asgi.db import create_engine_for, make_sessionmaker
+from app.logic import leaderboard, pricing
+
+class Request:
+    """Минимальный HTTP-запрос поверх ASGI scope."""
+    __slots__ = ("scope", "receive", "method", "path", "headers", "query", "uid")
+
+    def __init__(self, scope, receive, uid: int | None):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        self.query = dict(parse_qsl(scope.get("query_string", b"").decode()))
+        self.uid = uid
+
+    async def body(self) -> bytes:
+        chunks = []
+        while True:
+            msg = await self.receive()
+            chunks.append(msg.get("body", b""))
+            if not msg.get("more_body"):
+                return b"".join(chunks)
+
+    async def json(self) -> dict:
+        """Тело как JSON; при ошибке — пустой dict (как ``get_json(silent=True)``)."""
+        try:
+            data = json.loads(await self.body() or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    async def wait_disconnect(self) -> None:
+        while (await self.receive())["type"] != "http.disconnect":
+            pass
+
+# Ответы API всегда свежие — как after_request во Flask
+_API_HEADERS = [
+    (b"cache-control", b"no-store, no-cache, must-revalidate, max-age=0"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+
+class AsgiGame:
+    """
+    ASGI-приложение: async API + Flask для остального.
+
+    Args:
+        flask_app: Flask-приложение (конфиг, сессии, логика действий)
+    """
+
+    def __init__(self, flask_app):
+        from uvicorn.middleware.wsgi import WSGIMiddleware
+
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config.get("ASGI_WSGI_THREADS", 10))
+        self.engine = None
+        self.sessions = None
+        self.hub = views.EventHub()
+        self.leaderboard = None
+        self._serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._cookie = flask_app.config["SESSION_COOKIE_NAME"]
+        self._max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.routes = {
+            ("GET", "/api/state"): views.state,
+            ("GET", "/api/inventory"): views.inventory,
+            ("GET", "/api/leaderboard"): views.leaderboard,
+            ("GET", "/api/leaderboard/me"): views.leaderboard_me,
+            ("GET", "/api/prices"): views.prices,
+            **{("POST", path): views.action for path in views.ACTIONS},
+        }
+
+    def dumps(self, data) -> bytes:
+        return self.flask_app.json.dumps(data).encode()
+
+    def _uid(self, headers) -> int | None:
+        raw = headers.get("cookie")
+        if not raw:
+            return None
+        for part in raw.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == self._cookie:
+                try:
+                    return self._serializer.loads(value, max_age=self._max_age).get("uid")
+                except BadSignature:
+                    return None
+        return None
+
+    async def send_json(self, send, status: int, payload, extra_headers=()) -> None:
+        body = payload if isinstance(payload, bytes) else self.dumps(payload)
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *_API_HEADERS, *extra_headers,
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                self.engine = create_engine_for(self.flask_app)
+                self.sessions = make_sessionmaker(self.engine)
+                leaderboard.start(self.flask_app)  # сборка в фоне, не в первом запросе
+                pricing.start(self.flask_app)
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                aq = self.flask_app.extensions.get("action_queue")
+                if aq is not None:
+                    aq.stop()
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self.engine is None:  # сервер без lifespan
+            self.engine = create_engine_for(self.flask_app)
+            self.sessions = make_sessionmaker(self.engine)
+
+        key = (scope["method"], scope["path"])
+        if key == ("GET", "/api/events"):
+            req = Request(scope, receive, None)
+            req.uid = self._uid(req.headers)
+            await views.events(self, req, send)
+            return
+        handler = self.routes.get(key)
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        req = Request(scope, receive, None)
+        req.uid = self._uid(req.headers)
+        status, payload, *extra = await handler(self, req)
+        await self.send_json(send, status, payload, extra[0] if extra else ())
+
+def create_asgi_app(flask_app=None) -> AsgiGame:
+    flask_app = flask_app or create_app()
+    if flask_app.extensions.get("shards"):
+        # async-движок один и смотрит в основную БД
+        raise RuntimeError("ASGI mode does not support sharding (SHARDS); run the WSGI app")
+    return AsgiGame(flask_app)
@@ -0,0 +1,51 @@
+"""Асинхронный движок SQLAlchemy для ASGI-режима.
+
+URL берётся у движка Flask-SQLAlchemy (``db.engine.url``) — тот же файл,
+что у WSGI-части и очереди действий: относительный путь SQLite
+Flask-SQLAlchemy разрешает от ``instance_path``, а не от рабочего
+каталога. Драйвер меняется на асинхронный: ``aiosqlite`` для SQLite,
+``psycopg`` (v3, async) для PostgreSQL.
+Пул соединений настраивается отдельно от числа одновременных запросов:
+ожидающий SSE-клиент или медленный клиент соединение не держит.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.models import db
+
+def async_url(url: str | URL) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+psycopg://..."""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return u.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+    raise ValueError(f"ASGI mode: unsupported database backend {backend!r}")
+
+def create_engine_for(flask_app) -> AsyncEngine:
+    """
+    Async-движок к основной БД Flask-приложения.
+
+    ``ASGI_DB_POOL_SIZE`` / ``ASGI_DB_MAX_OVERFLOW`` — размер пула,
+    ``ASGI_DB_POOL_TIMEOUT`` — сколько ждать свободного соединения.
+    """
+    config = flask_app.config
+    with flask_app.app_context():
+        url = async_url(db.engine.url)
+    if url.startswith("sqlite"):
+        # aiosqlite: одно соединение = один тред; пул по умолчанию подходит
+        return create_async_engine(url)
+    return create_async_engine(
+        url,
+        pool_size=config.get("ASGI_DB_POOL_SIZE", 10),
+        max_overflow=config.get("ASGI_DB_MAX_OVERFLOW", 5),
+        pool_timeout=config.get("ASGI_DB_POOL_TIMEOUT", 10),
+        pool_pre_ping=True,
+    )
+
+def make_sessionmaker(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(engine, expire_on_commit=False)
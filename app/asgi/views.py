@@ -0,0 +1,358 @@
+"""Асинхронные обработчики API для ASGI-режима.
+
+Чтения (``/api/state``, ``/api/inventory``) идут через async-движок.
+Действия используют ту же игровую логику, что и Flask-обработчики
+(``_*_tx`` из ``app/routes/actions.py``): команда уходит в очередь
+группового коммита (``app/logic/action_queue.py``), а обработчик ждёт
+результат через ``await`` — тред на время ожидания не занят.
+
+``/api/events`` — SSE-поток состояния игрока: после каждого действия
+клиент получает свежий ``state``, раз в ``ASGI_SSE_HEARTBEAT_SEC`` — пинг.
+"""
+
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.logic.action_queue import ActionRejected, get_action_queue
+from app.logic.crops import crop_stage_info
+from app.logic.leaderboard import BOARDS, get_leaderboard
+from app.logic import nonces, pricing
+from app.models import Inventory, Player, Plot
+from app.routes.actions import (
+    RATE_LIMITS, _auto_replant_tx, _buy_field_tx, _harvest_tx, _market_cancel_tx, _market_order_args,
+    _market_order_tx, _plant_tx, _sell_tx, _settle_tx, _shop_buy_tx,
+)
+from app.utils.idempotency import HEADER as IDEMPOTENCY_HEADER, MAX_KEY_LEN, PENDING, get_cache
+from app.utils.shared_state import get_shared_state, hit_rate_limit
+
+def _as_utc(dt):
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def _now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+# --- общие запросы -------------------------------------------------------
+
+async def _plots_payload(s, uid: int) -> list[dict]:
+    rows = (await s.execute(select(Plot).where(Plot.user_id == uid))).scalars().all()
+    out = []
+    for r in rows:
+        planted_utc = _as_utc(r.planted_at)
+        info = crop_stage_info(r.crop_key, planted_utc) if r.crop_key and planted_utc else {}
+        out.append({
+            "idx": r.idx,
+            "crop_key": r.crop_key or None,
+            "stage": info.get("stage"),
+            "ready_at": info.get("ready_at"),
+            "ready_at_unix_ms": info.get("ready_at_unix_ms"),
+            "remaining_ms": info.get("remaining_ms"),
+            "planted_at_iso": planted_utc.isoformat() if planted_utc else None,
+            "planted_at_unix_ms": int(planted_utc.timestamp() * 1000) if planted_utc else None,
+            "auto_replant": bool(r.auto_replant),
+        })
+    return out
+
+def _state(game):
+    return get_shared_state(game.flask_app)
+
+async def _verify_nonce(game, uid: int, presented: str | None) -> bool:
+    # Бэкенды общего состояния синхронные (SQL, Redis) — уводим в тред
+    return await asyncio.to_thread(nonces.verify_and_rotate, uid, presented, state=_state(game)) is not None
+
+async def _rate_limited(game, uid: int, action: str) -> bool:
+    max_per_window, window_sec = RATE_LIMITS[action]
+    return not await asyncio.to_thread(hit_rate_limit, _state(game), uid, max_per_window, window_sec)
+
+async def state_payload(game, uid: int, *, with_plots: bool, issue_nonce: bool) -> dict | None:
+    async with game.sessions() as s:
+        player = await s.get(Player, uid)
+        if player is None:
+            return None
+        st = player.to_public_dict()
+        if with_plots:
+            st["plots"] = await _plots_payload(s, uid)
+    fn = nonces.issue if issue_nonce else nonces.current
+    nonce = await asyncio.to_thread(fn, uid, state=_state(game))
+    # SSE-поток может открыться раньше первого /api/state — nonce ещё нет
+    st["action_nonce"] = nonce.value if nonce else None
+    st["nonce_expiry"] = nonce.expires_at.isoformat() if nonce else None
+    st["server_time_unix_ms"] = _now_ms()
+    return st
+
+async def _settle_auto_plots(game, uid: int) -> None:
+    """Созревшую автопосадку досчитывает очередь действий (см. app/logic/autofarm.py)."""
+    async with game.sessions() as s:
+        due = (await s.execute(
+            select(Plot.id).where(Plot.user_id == uid, Plot.auto_replant == 1,
+                                  Plot.ready_at <= datetime.utcnow()).limit(1)
+        )).first()
+    if due is None:
+        return
+    fut = get_action_queue(game.flask_app).submit(uid, _settle_tx)
+    await asyncio.wait_for(asyncio.wrap_future(fut), game.config.get("ACTION_QUEUE_TIMEOUT_SEC", 30))
+
+# --- чтения --------------------------------------------------------------
+
+async def state(game, req):
+    uid = req.uid
+    if not uid:
+        return 401, {"ok": False, "error": "unauthorized"}
+    try:
+        await _settle_auto_plots(game, uid)
+    except ActionRejected as e:
+        return e.status, {"ok": False, "error": e.error, **e.extra}
+    st = await state_payload(game, uid, with_plots=True, issue_nonce=True)
+    if st is None:
+        return 404, {"ok": False, "error": "player_not_found"}
+    return 200, {"ok": True, "state": st}
+
+async def inventory(game, req):
+    uid = req.uid
+    if not uid:
+        return 401, {"ok": False, "error": "unauthorized"}
+    async with game.sessions() as s:
+        rows = (await s.execute(
+            select(Inventory.item_key, Inventory.qty).where(Inventory.user_id == uid)
+        )).all()
+    return 200, {"ok": True, "inventory": [{"item_key": k, "qty": q} for k, q in rows]}
+
+async def _board(game, req):
+    board = req.query.get("board", "balance")
+    if board not in BOARDS:
+        return None, None
+    lb = game.leaderboard
+    if lb is None:
+        lb = game.leaderboard = await asyncio.to_thread(_build_leaderboard, game.flask_app)
+    return board, lb
+
+def _build_leaderboard(flask_app):
+    with flask_app.app_context():
+        return get_leaderboard(flask_app)
+
+async def leaderboard(game, req):
+    board, lb = await _board(game, req)
+    if board is None:
+        return 400, {"ok": False, "error": "bad_board"}
+    try:
+        limit = int(req.query.get("limit", 10))
+    except ValueError:
+        return 400, {"ok": False, "error": "bad_limit"}
+    limit = max(1, min(limit, game.config["LEADERBOARD_MAX_LIMIT"]))
+    return 200, {"ok": True, "board": board, "top": lb.top(board, limit)}
+
+async def leaderboard_me(game, req):
+    if not req.uid:
+        return 401, {"ok": False, "error": "unauthorized"}
+    board, lb = await _board(game, req)
+    if board is None:
+        return 400, {"ok": False, "error": "bad_board"}
+    return 200, {"ok": True, "board": board, **lb.me(board, req.uid)}
+
+async def prices(game, req):
+    _, body = pricing.get_prices(game.flask_app).table(game.config)
+    return 200, body
+
+# --- действия ------------------------------------------------------------
+
+def _idx(data) -> int:
+    try:
+        return int(data.get("idx"))
+    except (TypeError, ValueError):
+        raise ActionRejected("bad_index")
+
+def _prep_buy_field(cfg, data):
+    return _buy_field_tx, (), True, lambda r: {"bought_index": r["bought_index"]}
+
+def _prep_shop_buy(cfg, data):
+    item_key = data.get("item_key")
+    catalog = cfg["SHOP_ITEMS"]
+    if item_key not in catalog:
+        raise ActionRejected("unknown_item")
+    price = int(catalog[item_key]["price"])
+    bought = {"item_key": item_key, "title": catalog[item_key]["title"], "qty": 1}
+    return _shop_buy_tx, (item_key, price), False, lambda r: {"bought": bought}
+
+def _prep_plant(cfg, data):
+    idx = _idx(data)
+    item_key = data.get("item_key")
+    if not item_key or not item_key.startswith("seed_") or item_key not in cfg["SHOP_ITEMS"]:
+        raise ActionRejected("unknown_seed")
+    crop_type = item_key.replace("seed_", "")
+    now = datetime.now(timezone.utc)
+    return (_plant_tx, (idx, item_key, crop_type, now), True,
+            lambda r: {"planted": {"idx": idx, "crop_key": crop_type}, "progress": r["progress"]})
+
+def _prep_harvest(cfg, data):
+    idx = _idx(data)
+    return (_harvest_tx, (idx,), True,
+            lambda r: {"harvested": {"idx": idx, "item_key": f"crop_{r['crop']}", "qty": 1}, "progress": r["progress"]})
+
+def _prep_sell(cfg, data):
+    item_key = data.get("item_key")
+    if item_key not in cfg["SELL_PRICES"]:
+        raise ActionRejected("cannot_sell_item")
+    price = pricing.quote(cfg, item_key)  # до чтения общих счётчиков — базовая
+    return (_sell_tx, (item_key, price), False,
+            lambda r: {"sold": {"item_key": item_key, "price": price, "qty": 1}, "progress": r["progress"]})
+
+def _prep_auto_replant(cfg, data):
+    idx = _idx(data)
+    enabled = bool(data.get("enabled", True))
+    now = datetime.now(timezone.utc)
+    return (_auto_replant_tx, (idx, enabled, now), True,
+            lambda r: {"auto_replant": {"idx": idx, "enabled": enabled}})
+
+def _prep_market_order(cfg, data):
+    args = _market_order_args(data, cfg)
+    return _market_order_tx, args, False, lambda r: {"order": r["order"], "trades": r["trades"]}
+
+def _prep_market_cancel(cfg, data):
+    try:
+        order_id = int(data.get("order_id"))
+    except (TypeError, ValueError):
+        raise ActionRejected("bad_order")
+    return _market_cancel_tx, (order_id,), False, lambda r: {"order": r["order"]}
+
+# путь -> (имя для rate limit, подготовка)
+ACTIONS = {
+    "/api/action/buy_field": ("buy_field", _prep_buy_field),
+    "/api/action/shop/buy": ("shop_buy", _prep_shop_buy),
+    "/api/action/plant": ("plant", _prep_plant),
+    "/api/action/harvest": ("harvest", _prep_harvest),
+    "/api/action/sell": ("sell", _prep_sell),
+    "/api/action/auto_replant": ("auto_replant", _prep_auto_replant),
+    "/api/action/market/order": ("market", _prep_market_order),
+    "/api/action/market/cancel": ("market", _prep_market_cancel),
+}
+
+async def action(game, req):
+    """Действие: те же проверки и порядок, что у Flask-обработчиков."""
+    uid = req.uid
+    if not uid:
+        return 401, {"ok": False, "error": "unauthorized"}
+
+    key = req.headers.get(IDEMPOTENCY_HEADER.lower())
+    cache = get_cache(game.flask_app) if key else None
+    if key:
+        if len(key) > MAX_KEY_LEN:
+            return 400, {"ok": False, "error": "bad_idempotency_key"}
+        found = await asyncio.to_thread(cache.reserve, uid, key, req.path)
+        if found is PENDING:
+            return 409, {"ok": False, "error": "request_in_progress"}
+        if found is not None:
+            path, status, body = found
+            if path != req.path:
+                return 422, {"ok": False, "error": "idempotency_key_reused"}
+            return status, body, [(b"idempotent-replayed", b"true")]
+
+    try:
+        status, payload = await _action(game, req, uid)
+    except BaseException:
+        if key:
+            await asyncio.to_thread(cache.release, uid, key)
+        raise
+    if key:
+        if status in (409, 429) or status >= 500:
+            await asyncio.to_thread(cache.release, uid, key)
+        else:
+            payload = game.dumps(payload)
+            await asyncio.to_thread(cache.store, uid, key, req.path, status, payload)
+    return status, payload
+
+async def _action(game, req, uid: int):
+    name, prepare = ACTIONS[req.path]
+    async with game.sessions() as s:
+        blocked = (await s.execute(
+            select(Player.is_blocked, Player.blocked_reason).where(Player.user_id == uid)
+        )).first()
+        if blocked and blocked.is_blocked:
+            return 403, {"ok": False, "error": "user_blocked",
+                         "blocked_reason": blocked.blocked_reason or "Аккаунт заблокирован"}
+    if not await _verify_nonce(game, uid, req.headers.get("x-action-nonce")):
+        return 409, {"ok": False, "error": "bad_or_expired_nonce"}
+    if await _rate_limited(game, uid, name):
+        return 429, {"ok": False, "error": "rate_limited"}
+
+    data = await req.json()
+    try:
+        tx, args, with_plots, extra = prepare(game.config, data)
+        fut = get_action_queue(game.flask_app).submit(uid, tx, *args)
+        result = await asyncio.wait_for(asyncio.wrap_future(fut), game.config.get("ACTION_QUEUE_TIMEOUT_SEC", 30))
+    except ActionRejected as e:
+        return e.status, {"ok": False, "error": e.error, **e.extra}
+    except asyncio.TimeoutError:
+        return 503, {"ok": False, "error": "queue_timeout"}
+
+    st = await state_payload(game, uid, with_plots=with_plots, issue_nonce=False)
+    game.hub.publish(uid, st)
+    return 200, {"ok": True, "state": st, **extra(result)}
+
+# --- SSE -----------------------------------------------------------------
+
+class EventHub:
+    """Подписки SSE процесса: uid -> очереди открытых потоков."""
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subs: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, uid: int) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self.queue_size)
+        self._subs.setdefault(uid, set()).add(q)
+        return q
+
+    def unsubscribe(self, uid: int, q: asyncio.Queue) -> None:
+        subs = self._subs.get(uid)
+        if subs:
+            subs.discard(q)
+            if not subs:
+                del self._subs[uid]
+
+    def publish(self, uid: int, state: dict) -> None:
+        for q in self._subs.get(uid, ()):
+            if q.full():
+                q.get_nowait()  # медленный клиент получит только свежее
+            q.put_nowait(state)
+
+    @property
+    def connections(self) -> int:
+        return sum(len(v) for v in self._subs.values())
+
+async def events(game, req, send):
+    uid = req.uid
+    if not uid:
+        await game.send_json(send, 401, {"ok": False, "error": "unauthorized"})
+        return
+    st = await state_payload(game, uid, with_plots=True, issue_nonce=False)
+    if st is None:
+        await game.send_json(send, 404, {"ok": False, "error": "player_not_found"})
+        return
+
+    q = game.hub.subscribe(uid)
+    disconnected = asyncio.create_task(req.wait_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-store"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        heartbeat = game.config.get("ASGI_SSE_HEARTBEAT_SEC", 15)
+        chunk = f"event: state\ndata: {game.dumps(st).decode()}\n\n"
+        while not disconnected.done():
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+            getter = asyncio.ensure_future(q.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=heartbeat,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                chunk = f"event: state\ndata: {game.dumps(getter.result()).decode()}\n\n"
+            else:
+                getter.cancel()
+                chunk = ": ping\n\n"
+    finally:
+        disconnected.cancel()
+        game.hub.unsubscribe(uid, q)
@@ -0,0 +1,6 @@
+"""Фоновые сервисы Telegram-бота.
+
+Уведомления о созревании, рассылки и общий отправщик сообщений
+с учётом лимитов Bot API. Точки входа — скрипты в корне проекта
+(``bot.py``, ``notifier.py``).
+"""
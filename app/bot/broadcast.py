@@ -0,0 +1,224 @@
+"""Рассылка сообщения всем игрокам.
+
+ID игроков читаются потоком по возрастанию ``user_id`` (на PostgreSQL —
+серверный курсор с ``yield_per``) в отдельном треде и через ограниченную очередь
+попадают в пул воркеров. Воркеры отправляют через общий ``RateLimiter``.
+Результаты копятся и пишутся пачками: счётчики, контрольная точка
+``cursor_user_id`` и флаг ``bot_blocked`` для заблокировавших бота.
+
+Контрольная точка двигается только по непрерывному префиксу
+обработанных ID, поэтому после падения рассылка продолжается с неё;
+повторно могут уйти лишь сообщения, бывшие «в полёте» (не больше
+размера очереди плюс число воркеров).
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+import heapq
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import or_, select, update
+
+from app.models import db, Broadcast, Player
+from app.models.sharding import group_by_shard, on_shard, shard_names
+from app.bot.sender import RateLimiter, send_with_retry, SENT, BLOCKED, FAILED
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+class BroadcastEngine:
+    """
+    Движок рассылок.
+
+    Args:
+        app: Flask-приложение (для доступа к БД)
+        bot: ``telegram.Bot``
+        limiter: Лимитер отправки
+        workers: Сколько сообщений отправляется одновременно
+        fetch_batch: Размер пачки серверного курсора
+        flush_every: Через сколько результатов писать их в БД
+        flush_sec: Не реже чем раз в столько секунд писать результаты
+        reply_markup: Клавиатура к сообщению
+    """
+
+    def __init__(self, app, bot, *, limiter: RateLimiter | None = None, workers: int = 20,
+                 fetch_batch: int = 1000, flush_every: int = 500, flush_sec: float = 2.0,
+                 reply_markup=None):
+        self.app = app
+        self.bot = bot
+        self.limiter = limiter or RateLimiter()
+        self.workers = workers
+        self.fetch_batch = fetch_batch
+        self.flush_every = flush_every
+        self.flush_sec = flush_sec
+        self.reply_markup = reply_markup
+
+    # --- БД --------------------------------------------------------------
+
+    def create(self, text: str) -> int:
+        """Создаёт рассылку и возвращает её ID."""
+        with self.app.app_context():
+            b = Broadcast(text=text, status="pending")
+            db.session.add(b)
+            db.session.commit()
+            return b.id
+
+    def _load(self, broadcast_id: int) -> tuple[str, int]:
+        with self.app.app_context():
+            b = db.session.get(Broadcast, broadcast_id)
+            if b is None:
+                raise ValueError(f"broadcast {broadcast_id} not found")
+            b.status = "running"
+            b.updated_at = datetime.utcnow()
+            db.session.commit()
+            return b.text, b.cursor_user_id
+
+    def _iter_ids(self, after_uid: int):
+        """ID игроков по возрастанию; при шардировании — слияние потоков шардов."""
+        streams = [self._iter_shard_ids(after_uid, shard) for shard in shard_names()]
+        return streams[0] if len(streams) == 1 else heapq.merge(*streams)
+
+    def _iter_shard_ids(self, after_uid: int, shard: str | None):
+        """
+        ID игроков шарда по возрастанию.
+
+        На PostgreSQL — серверный курсор (MVCC не мешает записи результатов).
+        На SQLite открытый курсор держит SHARED-блокировку и не дал бы
+        закоммитить пачку результатов, поэтому читаем keyset-страницами.
+        """
+        base = select(Player.user_id).where(or_(Player.bot_blocked.is_(None), Player.bot_blocked == 0))
+        with on_shard(shard):
+            postgres = db.session.get_bind(Player).dialect.name == "postgresql"
+        if postgres:
+            q = (
+                base.where(Player.user_id > after_uid)
+                .order_by(Player.user_id)
+                .execution_options(stream_results=True, yield_per=self.fetch_batch)
+            )
+            with on_shard(shard):
+                result = db.session.scalars(q)
+            yield from result
+            return
+        last = after_uid
+        while True:
+            with on_shard(shard):
+                page = db.session.scalars(
+                    base.where(Player.user_id > last).order_by(Player.user_id).limit(self.fetch_batch)
+                ).all()
+            db.session.rollback()  # отпускаем блокировку чтения
+            yield from page
+            if len(page) < self.fetch_batch:
+                return
+            last = page[-1]
+
+    def _produce(self, after_uid: int, queue: asyncio.Queue, loop, cancel: threading.Event) -> None:
+        """Стримит ID игроков в очередь (в отдельном треде)."""
+        try:
+            with self.app.app_context():
+                for uid in self._iter_ids(after_uid):
+                    if cancel.is_set():
+                        break
+                    asyncio.run_coroutine_threadsafe(queue.put(uid), loop).result()
+        finally:
+            asyncio.run_coroutine_threadsafe(queue.put(_DONE), loop).result()
+
+    def _flush(self, broadcast_id: int, counts: dict, blocked_ids: list[int], cursor: int,
+               finished: bool) -> None:
+        """Пишет пачку результатов одной транзакцией."""
+        with self.app.app_context():
+            for shard, ids in group_by_shard(blocked_ids).items():
+                with on_shard(shard):
+                    db.session.execute(
+                        update(Player).where(Player.user_id.in_(ids)).values(bot_blocked=True)
+                    )
+            values = {
+                "sent": Broadcast.sent + counts[SENT],
+                "blocked": Broadcast.blocked + counts[BLOCKED],
+                "failed": Broadcast.failed + counts[FAILED],
+                "cursor_user_id": cursor,
+                "updated_at": datetime.utcnow(),
+            }
+            if finished:
+                values["status"] = "done"
+            db.session.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(**values))
+            db.session.commit()
+
+    # --- запуск ----------------------------------------------------------
+
+    async def run(self, broadcast_id: int, stop: asyncio.Event | None = None) -> dict:
+        """
+        Выполняет (или продолжает) рассылку.
+
+        Returns:
+            dict: Счётчики за этот запуск и итоговая контрольная точка
+        """
+        stop = stop or asyncio.Event()
+        text, cursor = await asyncio.to_thread(self._load, broadcast_id)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+        cancel = threading.Event()
+
+        totals = {SENT: 0, BLOCKED: 0, FAILED: 0}
+        pending = {SENT: 0, BLOCKED: 0, FAILED: 0}
+        pending_blocked: list[int] = []
+        dispatched: deque[int] = deque()  # ID в порядке выдачи из курсора
+        done: set[int] = set()
+        flush_lock = asyncio.Lock()
+        last_flush = time.monotonic()
+
+        def advance_cursor() -> int:
+            nonlocal cursor
+            while dispatched and dispatched[0] in done:
+                cursor = dispatched.popleft()
+                done.discard(cursor)
+            return cursor
+
+        async def flush(finished: bool = False) -> None:
+            nonlocal pending, pending_blocked, last_flush
+            async with flush_lock:
+                counts, blocked_ids = pending, pending_blocked
+                pending, pending_blocked = {SENT: 0, BLOCKED: 0, FAILED: 0}, []
+                last_flush = time.monotonic()
+                await asyncio.to_thread(self._flush, broadcast_id, counts, blocked_ids,
+                                        advance_cursor(), finished)
+
+        async def worker() -> None:
+            while True:
+                uid = await queue.get()
+                if uid is _DONE:
+                    await queue.put(_DONE)  # разбудить остальных воркеров
+                    return
+                if stop.is_set():
+                    continue  # дочитываем очередь, не отправляя
+                dispatched.append(uid)
+                res = await send_with_retry(self.bot, uid, text, limiter=self.limiter,
+                                            reply_markup=self.reply_markup)
+                totals[res] += 1
+                pending[res] += 1
+                if res == BLOCKED:
+                    pending_blocked.append(uid)
+                done.add(uid)
+                n = pending[SENT] + pending[BLOCKED] + pending[FAILED]
+                if n >= self.flush_every or time.monotonic() - last_flush >= self.flush_sec:
+                    await flush()
+
+        async def watch_stop() -> None:
+            await stop.wait()
+            cancel.set()
+
+        producer = asyncio.create_task(asyncio.to_thread(self._produce, cursor, queue, loop, cancel))
+        watcher = asyncio.create_task(watch_stop())
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.workers)))
+            await producer
+        finally:
+            watcher.cancel()
+            cancel.set()
+        await flush(finished=not stop.is_set())
+        log.info("broadcast %s: %s, cursor=%s", broadcast_id, totals, cursor)
+        return {**totals, "cursor_user_id": cursor, "finished": not stop.is_set()}
@@ -0,0 +1,134 @@
+"""Локальная заглушка Telegram Bot API для проверок без сети.
+
+Поднимает минимальный HTTP/1.1-сервер на asyncio (keep-alive, без
+внешних зависимостей), понимает ``getMe`` и ``sendMessage`` и
+складывает отправленные сообщения в ``sent``. Умеет имитировать 429
+и заблокированных пользователей.
+
+Пример::
+
+    api = FakeBotApi(blocked={13})
+    await api.start()
+    bot = telegram.Bot("123:TEST", base_url=api.base_url)
+    ...
+    await api.stop()
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import time
+from urllib.parse import parse_qsl
+
+class FakeBotApi:
+    """
+    Заглушка Bot API.
+
+    Args:
+        blocked: chat_id, для которых ``sendMessage`` отвечает 403
+        flood_every: Каждый N-й ``sendMessage`` отвечает 429 (0 — никогда)
+        retry_after: Значение ``retry_after`` для 429
+        latency: Искусственная задержка ответа (сек)
+    """
+
+    def __init__(self, blocked=(), flood_every: int = 0, retry_after: int = 1, latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.blocked = set(blocked)
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.sent: list[dict] = []
+        self.requests = 0
+        self.floods = 0
+        self._server: asyncio.base_events.Server | None = None
+        self._message_id = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    # --- HTTP ------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                _method, path, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = b""
+                length = int(headers.get("content-length", "0") or 0)
+                if length:
+                    body = await reader.readexactly(length)
+
+                status, payload = self._dispatch(path, headers.get("content-type", ""), body)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # --- Bot API ---------------------------------------------------------
+
+    def _dispatch(self, path: str, content_type: str, body: bytes) -> tuple[int, dict]:
+        self.requests += 1
+        method = path.rsplit("/", 1)[-1].split("?", 1)[0]
+        if "json" in content_type:
+            params = json.loads(body or b"{}")
+        else:
+            params = dict(parse_qsl(body.decode("utf-8")))
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+                "can_join_groups": False, "can_read_all_group_messages": False,
+                "supports_inline_queries": False,
+            }}
+        if method == "sendMessage":
+            return self._send_message(params)
+        if method in ("setWebhook", "deleteWebhook"):
+            return 200, {"ok": True, "result": True}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def _send_message(self, params: dict) -> tuple[int, dict]:
+        chat_id = int(params["chat_id"])
+        if chat_id in self.blocked:
+            return 403, {"ok": False, "error_code": 403,
+                         "description": "Forbidden: bot was blocked by the user"}
+        if self.flood_every and (self.requests % self.flood_every) == 0:
+            self.floods += 1
+            return 429, {"ok": False, "error_code": 429,
+                         "description": f"Too Many Requests: retry after {self.retry_after}",
+                         "parameters": {"retry_after": self.retry_after}}
+        self._message_id += 1
+        self.sent.append({"chat_id": chat_id, "text": params.get("text", "")})
+        return 200, {"ok": True, "result": {
+            "message_id": self._message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", ""),
+        }}
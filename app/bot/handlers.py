@@ -0,0 +1,49 @@
+"""Обработчики команд бота и сборка PTB-приложения.
+
+Общие для режима polling (``bot.py``) и webhook (``/bot/webhook``).
+"""
+
+from __future__ import annotations
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
+from telegram.ext import Application, CommandHandler, ContextTypes
+
+# Текст приветствия
+WELCOME = (
+    "Привет! 👋\n"
+    "Это мини-ферма. Открой её внутри Telegram WebApp.\n\n"
+    "Нажми кнопку ниже — «Открыть ферму»."
+)
+
+def webapp_keyboard_inline(webapp_url: str) -> InlineKeyboardMarkup:
+    # Инлайн-кнопка над сообщением
+    kb = InlineKeyboardMarkup([
+        [InlineKeyboardButton(text="🌾 Открыть ферму", web_app=WebAppInfo(url=webapp_url))]
+    ])
+    return kb
+
+async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(
+        WELCOME,
+        reply_markup=webapp_keyboard_inline(context.bot_data["webapp_url"])
+    )
+
+def build_application(token: str, webapp_url: str, *, polling: bool = True, base_url: str | None = None) -> Application:
+    """
+    Собирает PTB-приложение с обработчиками.
+
+    Args:
+        token: Токен бота
+        webapp_url: URL WebApp для кнопки
+        polling: False — без Updater (апдейты приходят через webhook)
+        base_url: Адрес Bot API (для локальной заглушки)
+    """
+    builder = Application.builder().token(token)
+    if base_url:
+        builder = builder.base_url(base_url)
+    if not polling:
+        builder = builder.updater(None)
+    application = builder.build()
+    application.bot_data["webapp_url"] = webapp_url
+    application.add_handler(CommandHandler("start", cmd_start))
+    return application
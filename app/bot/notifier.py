@@ -0,0 +1,171 @@
+"""Уведомления «урожай готов» по таймеру.
+
+Сервис периодически читает из ``plots`` ближайшие ``ready_at``
+(диапазонный запрос по индексу, пачками с keyset-пагинацией),
+держит их в куче и в нужный момент шлёт игроку одно сообщение
+на все грядки, созревшие в окне склейки.
+
+Почему не пропускаются новые посадки: окно чтения ``(watermark,
+now + horizon]`` уже минимального времени роста, поэтому всё,
+что посажено после чтения, созреет позже ``watermark`` и попадёт
+в следующее чтение.
+"""
+
+from __future__ import annotations
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select
+
+from app.logic.crops import CROP_DURATIONS
+from app.models import db, Player, Plot
+from app.models.sharding import on_shard, shard_names, use_shard
+from app.bot.sender import RateLimiter, send_with_retry, SENT, BLOCKED, FAILED
+
+log = logging.getLogger(__name__)
+
+READY_TEXT = "🌾 Урожай созрел! Готово грядок: {count}. Заходи собрать."
+
+class ReadyNotifier:
+    """
+    Планировщик уведомлений о созревании.
+
+    Args:
+        app: Flask-приложение (для доступа к БД)
+        bot: ``telegram.Bot``
+        limiter: Лимитер отправки (общий с другими рассылками)
+        horizon_sec: На сколько вперёд читать ``ready_at``
+        poll_sec: Период чтения из БД
+        batch_size: Размер пачки при чтении
+        coalesce_sec: Окно склейки грядок одного игрока в одно сообщение
+        reply_markup: Клавиатура к сообщению (кнопка WebApp)
+    """
+
+    def __init__(self, app, bot, *, limiter: RateLimiter | None = None, horizon_sec: int = 60,
+                 poll_sec: int = 15, batch_size: int = 500, coalesce_sec: int = 5, reply_markup=None):
+        min_grow_sec = min(CROP_DURATIONS.values()) // 1000
+        self.app = app
+        self.bot = bot
+        self.limiter = limiter or RateLimiter()
+        # Горизонт строго меньше минимального роста — иначе новые посадки теряются
+        self.horizon = timedelta(seconds=max(1, min(horizon_sec, min_grow_sec - 1)))
+        self.poll_sec = max(1, min(poll_sec, int(self.horizon.total_seconds())))
+        self.batch_size = batch_size
+        self.coalesce = timedelta(seconds=coalesce_sec)
+        self.reply_markup = reply_markup
+
+        self.watermark = datetime.utcnow()
+        # (время отправки = ready_at + coalesce, user_id)
+        self._heap: list[tuple[datetime, int]] = []
+        # Когда игроку последний раз ушло уведомление: всё, что созрело
+        # раньше, уже посчитано в том сообщении
+        self._last_sent: dict[int, datetime] = {}
+        self.stats = {"loaded": 0, "skipped": 0, SENT: 0, BLOCKED: 0, FAILED: 0}
+
+    # --- чтение из БД ----------------------------------------------------
+
+    def _load_window(self, lo: datetime, hi: datetime) -> list[tuple[int, datetime]]:
+        out = []
+        with self.app.app_context():
+            for shard in shard_names():
+                with on_shard(shard):
+                    self._load_shard_window(lo, hi, out)
+        return out
+
+    def _load_shard_window(self, lo: datetime, hi: datetime, out: list) -> None:
+        last = None
+        while True:
+            q = select(Plot.id, Plot.user_id, Plot.ready_at).where(
+                Plot.ready_at > lo, Plot.ready_at <= hi, Plot.crop_key.isnot(None),
+            )
+            if last is not None:
+                q = q.where(or_(Plot.ready_at > last[0], and_(Plot.ready_at == last[0], Plot.id > last[1])))
+            rows = db.session.execute(q.order_by(Plot.ready_at, Plot.id).limit(self.batch_size)).all()
+            out.extend((r.user_id, r.ready_at) for r in rows)
+            if len(rows) < self.batch_size:
+                break
+            last = (rows[-1].ready_at, rows[-1].id)
+
+    def _schedule(self, uid: int, ready_at: datetime) -> None:
+        heapq.heappush(self._heap, (ready_at + self.coalesce, uid))
+
+    async def refresh(self) -> int:
+        """Дочитывает окно ``(watermark, now + horizon]`` в кучу."""
+        hi = datetime.utcnow() + self.horizon
+        rows = await asyncio.to_thread(self._load_window, self.watermark, hi)
+        for uid, ready_at in rows:
+            self._schedule(uid, ready_at)
+        self.watermark = hi
+        self.stats["loaded"] += len(rows)
+        # Отметки старше окна склейки больше ничего не отсекут
+        cutoff = datetime.utcnow() - self.coalesce
+        self._last_sent = {uid: t for uid, t in self._last_sent.items() if t >= cutoff}
+        return len(rows)
+
+    def _ready_count(self, uid: int, now: datetime) -> int:
+        with self.app.app_context(), use_shard(uid):
+            cnt = db.session.execute(
+                select(func.count(Plot.id))
+                .join(Player, Player.user_id == Plot.user_id)
+                .where(Plot.user_id == uid, Plot.crop_key.isnot(None), Plot.ready_at <= now,
+                       or_(Player.is_blocked.is_(None), Player.is_blocked == 0),
+                       or_(Player.bot_blocked.is_(None), Player.bot_blocked == 0))
+            ).scalar_one()
+        return cnt
+
+    # --- отправка --------------------------------------------------------
+
+    async def _notify(self, uid: int) -> None:
+        # Игрок мог собрать урожай раньше уведомления — тогда молчим
+        count = await asyncio.to_thread(self._ready_count, uid, datetime.utcnow())
+        if not count:
+            self.stats["skipped"] += 1
+            return
+        res = await send_with_retry(self.bot, uid, READY_TEXT.format(count=count),
+                                    limiter=self.limiter, reply_markup=self.reply_markup)
+        self.stats[res] += 1
+
+    def pop_due(self, now: datetime) -> list[int]:
+        """Снимает с кучи игроков, которым пора отправить уведомление."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, uid = heapq.heappop(self._heap)
+            last = self._last_sent.get(uid)
+            if last is not None and fire_at - self.coalesce <= last:
+                continue  # грядка уже вошла в предыдущее сообщение
+            self._last_sent[uid] = now
+            due.append(uid)
+        return due
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        """Основной цикл: чтение раз в ``poll_sec``, отправка по таймеру кучи."""
+        stop = stop or asyncio.Event()
+        tasks: set[asyncio.Task] = set()
+        next_refresh = datetime.utcnow()
+        while not stop.is_set():
+            now = datetime.utcnow()
+            if now >= next_refresh:
+                try:
+                    await self.refresh()
+                except Exception:
+                    log.exception("notifier: refresh failed")
+                next_refresh = now + timedelta(seconds=self.poll_sec)
+
+            for uid in self.pop_due(datetime.utcnow()):
+                t = asyncio.create_task(self._notify(uid))
+                tasks.add(t)
+                t.add_done_callback(tasks.discard)
+
+            wake = next_refresh
+            if self._heap and self._heap[0][0] < wake:
+                wake = self._heap[0][0]
+            timeout = max(0.05, (wake - datetime.utcnow()).total_seconds())
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
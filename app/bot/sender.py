@@ -0,0 +1,101 @@
+"""Отправка сообщений с учётом лимитов Telegram Bot API.
+
+Telegram допускает около 30 сообщений в секунду на бота и не больше
+одного сообщения в секунду в один чат. ``RateLimiter`` держит оба
+ограничения, ``send_with_retry`` повторяет отправку при 429 и сетевых
+ошибках и отличает заблокировавших бота пользователей.
+"""
+
+from __future__ import annotations
+import asyncio
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+# Результаты отправки
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+class RateLimiter:
+    """
+    Глобальный token bucket плюс минимальный интервал на чат.
+
+    Args:
+        per_sec: Глобальный лимит сообщений в секунду
+        per_chat_interval: Минимальный интервал между сообщениями в один чат (сек)
+        max_chats: Сколько чатов помнить для интервала (старые вытесняются)
+    """
+
+    def __init__(self, per_sec: float = 25.0, per_chat_interval: float = 1.0, max_chats: int = 100_000):
+        self.per_sec = float(per_sec)
+        self.per_chat_interval = float(per_chat_interval)
+        self.max_chats = max_chats
+        self._tokens = self.per_sec
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._chat_next: dict[int, float] = {}
+
+    async def _acquire_global(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.per_sec, self._tokens + (now - self._updated) * self.per_sec)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.per_sec)
+
+    async def acquire(self, chat_id: int) -> None:
+        """Ждёт, пока можно отправить сообщение в чат."""
+        now = time.monotonic()
+        ready = self._chat_next.get(chat_id, 0.0)
+        if ready > now:
+            await asyncio.sleep(ready - now)
+        self._chat_next[chat_id] = max(now, ready) + self.per_chat_interval
+        if len(self._chat_next) > self.max_chats:
+            # dict хранит порядок вставки — выкидываем самые старые записи
+            for key in list(self._chat_next)[: self.max_chats // 10]:
+                del self._chat_next[key]
+        await self._acquire_global()
+
+def _retry_after_sec(value) -> float:
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+async def send_with_retry(bot, chat_id: int, text: str, *, limiter: RateLimiter,
+                          attempts: int = 5, **kwargs) -> str:
+    """
+    Отправляет сообщение с повторами.
+
+    Args:
+        bot: ``telegram.Bot``
+        chat_id: ID чата (для личных чатов совпадает с user_id)
+        text: Текст сообщения
+        limiter: Общий лимитер отправки
+        attempts: Максимум попыток
+        **kwargs: Прочие параметры ``send_message`` (reply_markup и т.п.)
+
+    Returns:
+        str: ``SENT``, ``BLOCKED`` (бот заблокирован/чат недоступен) или ``FAILED``
+    """
+    for attempt in range(attempts):
+        await limiter.acquire(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            return SENT
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_after_sec(e.retry_after))
+        except Forbidden:
+            return BLOCKED
+        except BadRequest as e:
+            # "chat not found" — пользователь ни разу не запускал бота
+            if "chat not found" in str(e).lower():
+                return BLOCKED
+            return FAILED
+        except (TimedOut, NetworkError):
+            await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt))
+    return FAILED
@@ -0,0 +1,140 @@
+"""Приём апдейтов бота через webhook внутри процесса Flask.
+
+Эндпоинт ``/bot/webhook`` (см. ``app/routes/bot.py``) только проверяет
+секрет, отсекает повторы ``update_id`` и кладёт апдейт в asyncio-очередь.
+Повторы отсекаются через общее состояние узлов (``SharedState.add``):
+повторную доставку Telegram может получить другой воркер или узел.
+Очередь разбирает ограниченный пул воркеров в отдельном треде со своим
+event loop, где живёт PTB-приложение. Если очередь полна, эндпоинт
+отвечает 503 — Telegram повторит доставку позже.
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+
+from telegram import Update
+
+from app.utils.shared_state import MemoryBackend, SharedState
+
+log = logging.getLogger(__name__)
+
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+BUSY = "busy"
+
+class WebhookDispatcher:
+    """
+    Очередь апдейтов и пул воркеров.
+
+    Args:
+        application: PTB ``Application`` без Updater
+        workers: Сколько апдейтов обрабатывается одновременно
+        queue_size: Ёмкость очереди
+        state: Общее состояние узлов для отсева повторов; None — память процесса
+        dedup_ttl: Сколько секунд помнить ``update_id``
+    """
+
+    def __init__(self, application, *, workers: int = 8, queue_size: int = 1000,
+                 state: SharedState | None = None, dedup_ttl: float = 3600):
+        self.application = application
+        self.workers = workers
+        self.queue_size = queue_size
+        self.state = state or MemoryBackend()
+        self.dedup_ttl = dedup_ttl
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._thread: threading.Thread | None = None
+        self._ready = threading.Event()
+        self._error: BaseException | None = None
+        self._abandoned = False
+        self._stopping: asyncio.Event | None = None
+
+    # --- жизненный цикл --------------------------------------------------
+
+    def start(self, timeout: float = 30.0) -> None:
+        """Запускает тред с PTB-приложением; ошибки инициализации пробрасывает сюда."""
+        self._thread = threading.Thread(target=self._run_loop, name="bot-webhook", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            self._abandoned = True  # тред сам остановится, если старт всё же завершится
+            raise TimeoutError(f"bot application did not start in {timeout} s")
+        if self._error is not None:
+            raise self._error
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join(timeout)
+
+    def _run_loop(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._main())
+        self._loop.close()
+
+    async def _main(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = asyncio.Event()
+        try:
+            await self.application.initialize()
+            await self.application.start()
+        except BaseException as e:  # неверный токен, недоступен getMe и т.п.
+            self._error = e
+            self._ready.set()
+            return
+        tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._ready.set()
+        if self._abandoned:
+            self._stopping.set()
+        await self._stopping.wait()
+        await self._queue.join()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.application.stop()
+        await self.application.shutdown()
+
+    async def _worker(self) -> None:
+        while True:
+            data = await self._queue.get()
+            try:
+                update = Update.de_json(data, self.application.bot)
+                await self.application.process_update(update)
+            except Exception:
+                log.exception("webhook: update %s failed", data.get("update_id"))
+            finally:
+                self._queue.task_done()
+
+    # --- приём -----------------------------------------------------------
+
+    def _mark_seen(self, update_id: int) -> bool:
+        return self.state.add(f"tg_update:{update_id}", b"1", ttl=self.dedup_ttl)
+
+    def _unmark(self, update_id: int) -> None:
+        self.state.delete(f"tg_update:{update_id}")
+
+    def submit(self, data: dict) -> str:
+        """
+        Ставит апдейт в очередь (вызывается из треда Flask).
+
+        Returns:
+            str: ``QUEUED``, ``DUPLICATE`` (уже был) или ``BUSY`` (очередь полна)
+        """
+        update_id = int(data.get("update_id", -1))
+        if not self._mark_seen(update_id):
+            return DUPLICATE
+        fut = asyncio.run_coroutine_threadsafe(self._put(data), self._loop)
+        if not fut.result():
+            self._unmark(update_id)  # чтобы повтор от Telegram приняли
+            return BUSY
+        return QUEUED
+
+    async def _put(self, data: dict) -> bool:
+        try:
+            self._queue.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
@@ -0,0 +1,220 @@
+"""Очередь игровых действий с групповым коммитом.
+
+Обычный режим: каждое действие — своя транзакция в треде запроса
+с ``SELECT ... FOR UPDATE`` по строке игрока. При всплесках нагрузки
+запросы одного игрока ждут друг друга на блокировке, а каждый коммит —
+отдельный fsync.
+
+Режим очереди (``ACTION_QUEUE=1``): HTTP-тред отправляет команду в
+очередь процесса и ждёт результат. Один тред-коммиттер раз в
+``ACTION_QUEUE_BATCH_MS`` забирает накопившиеся команды разных игроков и
+выполняет их одну за другой в одной транзакции — один коммит на пачку.
+Команды одного игрока выполняются строго по порядку поступления, и
+строку игрока блокировать не нужно.
+
+При шардировании пачка делится по шардам игроков: один коммит на шард.
+
+Ограничение: сериализация — внутри процесса. Если действия пишут
+несколько процессов (gunicorn ``-w N``), включите
+``ACTION_QUEUE_ROW_LOCKS=1`` — строки снова блокируются, но между
+процессами, а не между запросами одного процесса.
+
+Контракт команды: ``fn(uid, *args, lock) -> dict``. Все проверки идут
+до первого изменения; отказ — исключение ``ActionRejected``, после
+которого в сессии не остаётся изменений этой команды. Команду, чья
+транзакция откатилась из-за взаимоблокировки (``is_deadlock``), можно
+выполнить заново — до ``DEADLOCK_RETRIES`` раз.
+"""
+
+from __future__ import annotations
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import jsonify
+from sqlalchemy.exc import DBAPIError
+
+from app.models import db
+from app.models.sharding import ShardMoving, on_shard, shard_of
+
+log = logging.getLogger(__name__)
+
+# PostgreSQL откатывает одну из транзакций взаимоблокировки (SQLSTATE 40P01)
+DEADLOCK_SQLSTATES = frozenset({"40P01"})
+DEADLOCK_RETRIES = 3
+
+def is_deadlock(exc: BaseException) -> bool:
+    """Транзакция откачена из-за взаимоблокировки — её можно повторить целиком."""
+    if not isinstance(exc, DBAPIError):
+        return False
+    code = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+    return code in DEADLOCK_SQLSTATES
+
+class ActionRejected(Exception):
+    """Действие отклонено проверкой (ответ клиенту 4xx)."""
+
+    def __init__(self, error: str, status: int = 400, **extra):
+        super().__init__(error)
+        self.error = error
+        self.status = status
+        self.extra = extra
+
+    def response(self):
+        return jsonify(ok=False, error=self.error, **self.extra), self.status
+
+class _Command:
+    __slots__ = ("uid", "fn", "args", "future")
+
+    def __init__(self, uid: int, fn, args: tuple):
+        self.uid = uid
+        self.fn = fn
+        self.args = args
+        self.future: Future = Future()
+
+class ActionQueue:
+    """
+    Очередь команд и тред группового коммита.
+
+    Args:
+        app: Flask-приложение (для контекста в треде-коммиттере)
+        batch_ms: Сколько миллисекунд копить пачку после первой команды
+        max_batch: Максимум команд в одной транзакции
+        row_locks: Блокировать строки ``FOR UPDATE`` (несколько процессов)
+    """
+
+    def __init__(self, app, *, batch_ms: float = 5.0, max_batch: int = 256, row_locks: bool = False):
+        self.app = app
+        self.batch_sec = batch_ms / 1000.0
+        self.max_batch = max_batch
+        self.row_locks = row_locks
+        self._queue: queue.SimpleQueue[_Command | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self.stats = {"commands": 0, "batches": 0, "fallbacks": 0}
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="action-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, uid: int, fn, *args) -> Future:
+        """Ставит команду в очередь; результат — ``Future`` с dict или исключением."""
+        cmd = _Command(uid, fn, args)
+        self._queue.put(cmd)
+        return cmd.future
+
+    # --- тред-коммиттер ----------------------------------------------------
+
+    def _collect(self, first: _Command) -> tuple[list[_Command], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.batch_sec
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                cmd = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if cmd is None:
+                return batch, True
+            batch.append(cmd)
+        return batch, False
+
+    def _loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            try:
+                with self.app.app_context():
+                    self._run_batch(batch)
+            except Exception:
+                log.exception("action-queue: batch failed")
+                for cmd in batch:
+                    if not cmd.future.done():
+                        cmd.future.set_exception(RuntimeError("action queue failure"))
+
+    def _run_batch(self, batch: list[_Command]) -> None:
+        groups: dict[str | None, list[_Command]] = {}
+        for cmd in batch:
+            try:
+                groups.setdefault(shard_of(cmd.uid), []).append(cmd)
+            except ShardMoving as e:
+                cmd.future.set_exception(e)
+        for shard, cmds in groups.items():
+            with on_shard(shard):
+                self._run_group(cmds)
+
+    def _run_group(self, batch: list[_Command]) -> None:
+        done = []
+        try:
+            for cmd in batch:
+                try:
+                    done.append((cmd, cmd.fn(cmd.uid, *cmd.args, lock=self.row_locks), None))
+                except ActionRejected as e:
+                    done.append((cmd, None, e))
+            db.session.commit()
+        except Exception:
+            # Одна команда упала неожиданно — откатываем пачку и выполняем
+            # каждую команду в своей транзакции, чтобы ошибка не задела соседей
+            db.session.rollback()
+            log.exception("action-queue: group commit of %d failed, retrying one by one", len(batch))
+            self.stats["fallbacks"] += 1
+            for cmd in batch:
+                self._run_single(cmd)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["commands"] += len(batch)
+        for cmd, result, rejected in done:
+            if rejected is not None:
+                cmd.future.set_exception(rejected)
+            else:
+                cmd.future.set_result(result)
+
+    def _run_single(self, cmd: _Command) -> None:
+        for attempt in range(DEADLOCK_RETRIES + 1):
+            try:
+                result = cmd.fn(cmd.uid, *cmd.args, lock=self.row_locks)
+                db.session.commit()
+            except ActionRejected as e:
+                db.session.rollback()
+                cmd.future.set_exception(e)
+            except Exception as e:
+                db.session.rollback()
+                if is_deadlock(e) and attempt < DEADLOCK_RETRIES:
+                    continue
+                cmd.future.set_exception(e)
+            else:
+                cmd.future.set_result(result)
+            break
+        self.stats["commands"] += 1
+
+def get_action_queue(app) -> ActionQueue:
+    """Очередь процесса; создаётся и запускается при первом действии (после fork)."""
+    aq = app.extensions.get("action_queue")
+    if aq is None:
+        with _init_lock:
+            aq = app.extensions.get("action_queue")
+            if aq is None:
+                aq = ActionQueue(
+                    app,
+                    batch_ms=app.config.get("ACTION_QUEUE_BATCH_MS", 5),
+                    max_batch=app.config.get("ACTION_QUEUE_MAX_BATCH", 256),
+                    row_locks=app.config.get("ACTION_QUEUE_ROW_LOCKS", False),
+                )
+                aq.start()
+                app.extensions["action_queue"] = aq
+    return aq
+
+_init_lock = threading.Lock()
@@ -0,0 +1,256 @@
+"""Потоковый анти-чит по действиям игроков.
+
+Транзакции действий сообщают о себе через ``note()``; после коммита
+события попадают в детектор процесса. На игрока — объект ``_UserStats``
+со ``__slots__`` и кольцевым буфером последних интервалов: память
+ограничена (``ANTICHEAT_MAX_USERS`` игроков, вытесняются давно не
+действовавшие), каждое событие — O(1).
+
+Признаки бота:
+    * ``regular_intervals`` — интервалы между действиями почти одинаковые:
+      коэффициент вариации последних ``WINDOW`` интервалов ниже
+      ``ANTICHEAT_MIN_CV`` (у человека — десятки процентов);
+    * ``harvest_at_ready`` — ``ANTICHEAT_READY_STREAK`` сборов подряд в
+      первые ``ANTICHEAT_READY_WINDOW_MS`` после созревания грядки;
+    * ``income_rate`` — доход с полей (цена продажи собранного урожая,
+      экспоненциально затухающая сумма за ~10 минут) выше
+      ``ANTICHEAT_MAX_INCOME_PER_MIN`` — больше, чем дают все поля под
+      самым дорогим урожаем. Продажи не считаются: распродать запас
+      быстро — нормально.
+
+Сработавший признак пишется в лог и в ``recent_flags()``; при
+``ANTICHEAT_AUTOBLOCK`` игрок блокируется через ``is_blocked`` фоновым
+потоком (в ``after_commit`` сессию трогать нельзя).
+
+Статистика — в памяти процесса: при нескольких воркерах каждый видит
+свою часть действий игрока.
+"""
+
+from __future__ import annotations
+import logging
+import math
+import queue
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+WINDOW = 32  # интервалов в кольцевом буфере
+INCOME_TAU_SEC = 600.0  # постоянная затухания дохода
+
+class _UserStats:
+    """Скользящая статистика игрока: O(1) на событие, фиксированный размер."""
+
+    __slots__ = ("intervals", "head", "n", "sum", "sumsq", "last_ts",
+                 "ready_streak", "income", "income_ts", "flagged")
+
+    def __init__(self):
+        self.intervals = array("d", bytes(8 * WINDOW))
+        self.head = 0
+        self.n = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.last_ts: float | None = None
+        self.ready_streak = 0
+        self.income = 0.0
+        self.income_ts = 0.0
+        self.flagged = False
+
+    def push_interval(self, dt: float) -> None:
+        if self.n == WINDOW:
+            old = self.intervals[self.head]
+            self.sum -= old
+            self.sumsq -= old * old
+        else:
+            self.n += 1
+        self.intervals[self.head] = dt
+        self.head = (self.head + 1) % WINDOW
+        self.sum += dt
+        self.sumsq += dt * dt
+
+    def cv(self) -> float | None:
+        """Коэффициент вариации интервалов (σ/μ), если буфер заполнен."""
+        if self.n < WINDOW or self.sum <= 0:
+            return None
+        mean = self.sum / self.n
+        var = max(self.sumsq / self.n - mean * mean, 0.0)
+        return math.sqrt(var) / mean
+
+    def add_income(self, coins: int, ts: float) -> float:
+        """Добавляет доход; возвращает оценку дохода в минуту."""
+        self.income = self.income * math.exp(-(ts - self.income_ts) / INCOME_TAU_SEC) + coins
+        self.income_ts = ts
+        return self.income * 60.0 / INCOME_TAU_SEC
+
+class Detector:
+    """
+    Детектор процесса.
+
+    Args:
+        max_users: Сколько игроков держать в памяти (LRU)
+        min_cv: Порог коэффициента вариации интервалов
+        ready_streak: Сборов подряд сразу после созревания
+        ready_window_ms: Что считать «сразу после созревания»
+        max_income_per_min: Предел дохода в минуту
+    """
+
+    def __init__(self, *, max_users: int = 100_000, min_cv: float = 0.05, ready_streak: int = 12,
+                 ready_window_ms: int = 500, max_income_per_min: float = 1500.0):
+        self.max_users = max_users
+        self.min_cv = min_cv
+        self.ready_streak = ready_streak
+        self.ready_window_ms = ready_window_ms
+        self.max_income_per_min = max_income_per_min
+        self._users: OrderedDict[int, _UserStats] = OrderedDict()
+        self._lock = threading.Lock()
+        self.flags: deque[dict] = deque(maxlen=200)
+
+    def _stats(self, uid: int) -> _UserStats:
+        st = self._users.get(uid)
+        if st is None:
+            st = self._users[uid] = _UserStats()
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(uid)
+        return st
+
+    def observe(self, uid: int, action: str, ts: float, *, coins: int = 0,
+                ready_at_ms: int | None = None) -> str | None:
+        """
+        Учитывает действие; возвращает признак бота при первом срабатывании.
+
+        ``ts`` — время действия (сек, ``time.time()``), ``coins`` — доход
+        с полей (для сбора — цена урожая), ``ready_at_ms`` — для сбора:
+        когда грядка созрела.
+        """
+        with self._lock:
+            st = self._stats(uid)
+            reason = None
+
+            if st.last_ts is not None:
+                st.push_interval(ts - st.last_ts)
+                cv = st.cv()
+                if cv is not None and cv < self.min_cv:
+                    reason = f"regular_intervals cv={cv:.3f}"
+            st.last_ts = ts
+
+            if ready_at_ms is not None:
+                delta_ms = ts * 1000 - ready_at_ms
+                st.ready_streak = st.ready_streak + 1 if 0 <= delta_ms < self.ready_window_ms else 0
+                if st.ready_streak >= self.ready_streak:
+                    reason = reason or f"harvest_at_ready streak={st.ready_streak}"
+
+            if coins:
+                rate = st.add_income(coins, ts)
+                if rate > self.max_income_per_min:
+                    reason = reason or f"income_rate {rate:.0f}/min"
+
+            if reason is None or st.flagged:
+                return None
+            st.flagged = True
+            self.flags.append({"user_id": uid, "reason": reason, "at": ts})
+            return reason
+
+    def forget(self, uid: int) -> None:
+        """Сбрасывает статистику (например, после разблокировки)."""
+        with self._lock:
+            self._users.pop(uid, None)
+
+_detector: Detector | None = None
+_detector_lock = threading.Lock()
+_blocks: queue.Queue = queue.Queue(maxsize=10_000)
+_blocker: threading.Thread | None = None
+
+def get_detector(app) -> Detector:
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                cfg = app.config
+                _detector = Detector(
+                    max_users=cfg.get("ANTICHEAT_MAX_USERS", 100_000),
+                    min_cv=cfg.get("ANTICHEAT_MIN_CV", 0.05),
+                    ready_streak=cfg.get("ANTICHEAT_READY_STREAK", 12),
+                    ready_window_ms=cfg.get("ANTICHEAT_READY_WINDOW_MS", 500),
+                    max_income_per_min=cfg.get("ANTICHEAT_MAX_INCOME_PER_MIN", 1500),
+                )
+    return _detector
+
+def recent_flags() -> list[dict]:
+    return list(_detector.flags) if _detector is not None else []
+
+def forget(uid: int) -> None:
+    if _detector is not None:
+        _detector.forget(uid)
+
+def note(session, uid: int, action: str, *, coins: int = 0, ready_at_ms: int | None = None) -> None:
+    """Событие действия из транзакции; уйдёт в детектор после коммита."""
+    session.info.setdefault("anticheat_events", []).append(
+        (uid, action, time.time(), coins, ready_at_ms))
+
+# --- автоблокировка ----------------------------------------------------------
+
+def _block(app, uid: int, reason: str) -> None:
+    from app.models import db, Player
+    from app.models.sharding import use_shard
+
+    with app.app_context(), use_shard(uid):
+        player = db.session.get(Player, uid)
+        if player is None or player.is_blocked:
+            return
+        player.is_blocked = True
+        player.blocked_reason = f"Автоблокировка: {reason}"
+        player.touch()
+        db.session.commit()
+    log.warning("anticheat: blocked user %s (%s)", uid, reason)
+
+def _blocker_loop(app) -> None:
+    while True:
+        uid, reason = _blocks.get()
+        try:
+            _block(app, uid, reason)
+        except Exception:
+            log.exception("anticheat: failed to block user %s", uid)
+
+def _schedule_block(app, uid: int, reason: str) -> None:
+    global _blocker
+    if _blocker is None:
+        with _detector_lock:
+            if _blocker is None:
+                _blocker = threading.Thread(target=_blocker_loop, args=(app,),
+                                            name="anticheat-blocker", daemon=True)
+                _blocker.start()
+    try:
+        _blocks.put_nowait((uid, reason))
+    except queue.Full:
+        log.error("anticheat: block queue is full, user %s not blocked", uid)
+
+# --- события сессии ------------------------------------------------------
+
+@event.listens_for(Session, "after_commit")
+def _feed_detector(session):
+    events = session.info.pop("anticheat_events", None)
+    if not events or not has_app_context():
+        return
+    app = current_app._get_current_object()
+    if not app.config.get("ANTICHEAT", True):
+        return
+    detector = get_detector(app)
+    for uid, action, ts, coins, ready_at_ms in events:
+        reason = detector.observe(uid, action, ts, coins=coins, ready_at_ms=ready_at_ms)
+        if reason is None:
+            continue
+        log.warning("anticheat: user %s flagged: %s", uid, reason)
+        if app.config.get("ANTICHEAT_AUTOBLOCK", True):
+            _schedule_block(app, uid, reason)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_events(session):
+    session.info.pop("anticheat_events", None)
@@ -0,0 +1,137 @@
+"""Автопосадка: грядка сама собирает урожай и сажает его снова.
+
+Фоновой задачи нет — состояние грядки с ``auto_replant`` досчитывается
+в замкнутой форме, когда игрок в следующий раз читает ферму или
+действует. Пока игрок не заходит, сервер ничего для него не делает.
+
+Для грядки, посаженной в ``p``, с длительностью роста ``d`` к моменту
+``t`` созрело ``k = ⌊(t − p) / d⌋`` урожаев подряд: после каждого сбора
+грядка засевается снова, если есть семена. Семена одной культуры общие
+для всех её грядок и достаются самым ранним пересадкам: момент отсечки
+ищется бинарным поиском по времени — O(грядок · log) вместо
+пошагового моделирования. Итог на грядку:
+    * пересадок ``r`` (≤ ``k``, в сумме не больше семян);
+    * сборов ``min(k, r + 1)``;
+    * если ``r == k`` — грядка растёт дальше с ``p + k·d``, иначе
+      семена кончились и после последнего сбора она пуста.
+
+Всё применяется одной транзакцией: грядки, инвентарь (−семена,
++урожай) и опыт игрока; в ``action_logs`` — по строке
+``auto_harvest:<культура>`` на грядку. Автосборы не идут в анти-чит:
+сбор ровно в момент созревания здесь — норма.
+"""
+
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.logic import progression
+from app.logic.crops import CROP_DURATIONS
+from app.models import db, ActionLog, Inventory, Plot, add_inventory
+
+def _naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _ms(dt: datetime) -> int:
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def allocate(starts: list[int], ripe: list[int], duration: int, seeds: int) -> list[int]:
+    """
+    Сколько пересадок получит каждая грядка.
+
+    ``starts`` — моменты посадки (мс), ``ripe`` — сколько урожаев
+    созрело, пересадки грядки ``i`` — в моменты ``starts[i] + j·duration``
+    (``j = 1..ripe[i]``). Семена (``seeds``) достаются самым ранним.
+    """
+    total = sum(ripe)
+    if seeds >= total:
+        return list(ripe)
+    if seeds <= 0:
+        return [0] * len(ripe)
+
+    def count(t: int) -> list[int]:
+        return [min(k, max(0, (t - p) // duration)) for p, k in zip(starts, ripe)]
+
+    # Последний момент t, к которому пересадок не больше, чем семян
+    lo = min(starts)
+    hi = max(p + k * duration for p, k in zip(starts, ripe))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if sum(count(mid)) <= seeds:
+            lo = mid
+        else:
+            hi = mid - 1
+    out = count(lo)
+    left = seeds - sum(out)
+    # Остаток — пересадкам ровно в следующий момент (одновременные), по порядку грядок
+    for i, (p, k) in enumerate(zip(starts, ripe)):
+        if left and out[i] < k and p + (out[i] + 1) * duration == lo + 1:
+            out[i] += 1
+            left -= 1
+    return out
+
+def settle(player, now: datetime, *, lock: bool) -> dict[str, int]:
+    """
+    Досчитывает грядки игрока с автопосадкой на момент ``now`` (без коммита).
+
+    Args:
+        player: ``Player`` игрока (для блокировок — уже ``with_for_update``)
+        now: Текущее время
+        lock: Блокировать строки грядок и инвентаря
+
+    Returns:
+        dict: Собрано урожая по культурам (пусто — делать было нечего)
+    """
+    now = _naive_utc(now)
+    q = select(Plot).where(Plot.user_id == player.user_id, Plot.auto_replant == 1,
+                           Plot.ready_at <= now)
+    if lock:
+        q = q.with_for_update()
+    plots = db.session.execute(q).scalars().all()
+    by_crop: dict[str, list[Plot]] = defaultdict(list)
+    for plot in plots:
+        if plot.crop_key in CROP_DURATIONS and plot.planted_at is not None:
+            by_crop[plot.crop_key].append(plot)
+    if not by_crop:
+        return {}
+
+    now_ms = _ms(now)
+    harvested: dict[str, int] = {}
+    for crop, group in by_crop.items():
+        d = CROP_DURATIONS[crop]
+        seed_key = f"seed_{crop}"
+        inv_q = select(Inventory).where(Inventory.user_id == player.user_id, Inventory.item_key == seed_key)
+        if lock:
+            inv_q = inv_q.with_for_update()
+        inv = db.session.execute(inv_q).scalar_one_or_none()
+        seeds = inv.qty if inv is not None else 0
+
+        starts = [_ms(_naive_utc(p.planted_at)) for p in group]
+        ripe = [(now_ms - s) // d for s in starts]
+        replants = allocate(starts, ripe, d, seeds)
+
+        crops = 0
+        for plot, k, r in zip(group, ripe, replants):
+            crops += min(k, r + 1)
+            if r == k:
+                planted = plot.planted_at.replace(tzinfo=None) + timedelta(milliseconds=k * d)
+                plot.planted_at = planted
+                plot.ready_at = planted + timedelta(milliseconds=d)
+            else:
+                plot.crop_key = None
+                plot.planted_at = None
+                plot.ready_at = None
+            db.session.add(ActionLog(user_id=player.user_id, action=f"auto_harvest:{crop}", created_at=now))
+
+        used = sum(replants)
+        if used:
+            inv.qty -= used
+            progression.award(player, "plant", crop, times=used)
+        add_inventory(player.user_id, f"crop_{crop}", crops)
+        progression.award(player, "harvest", crop, times=crops)
+        harvested[crop] = crops
+    return harvested
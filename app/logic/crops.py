@@ -38,6 +38,19 @@ def to_unix_ms(dt: datetime) -> int:
     # dt должен быть timezone-aware (UTC)
     return int(dt.timestamp() * 1000)
 
+def crop_ready_at(crop_type: str, planted_at: datetime) -> datetime | None:
+    """
+    Момент созревания культуры в naive UTC (как хранится в БД).
+
+    Returns:
+        datetime | None: Время готовности или None для неизвестной культуры
+    """
+    if crop_type not in CROP_DURATIONS or planted_at is None:
+        return None
+    if planted_at.tzinfo is not None:
+        planted_at = planted_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return planted_at + timedelta(milliseconds=CROP_DURATIONS[crop_type])
+
 def crop_stage_info(crop_type: str, planted_at: datetime) -> dict:
     """
     Определяет стадию роста любой культуры.
@@ -0,0 +1,361 @@
+"""Таблицы лидеров по балансу и опыту.
+
+Рейтинг живёт в памяти процесса в индексируемом skip list: вставка,
+удаление, место игрока — O(log n), топ-K — O(log n + K). Чтения
+``/api/leaderboard`` не обращаются к таблице ``players``.
+
+Как рейтинг узнаёт об изменениях:
+    * один раз на процесс он строится проходом по ``players`` — в фоне
+      с первого запроса воркера (``start``); сортировка и сборка skip list
+      за O(n), без n вставок;
+    * события сессии SQLAlchemy ловят изменения ``balance``/``xp``/
+      ``is_blocked``/``display_name`` у ``Player`` и применяют их после
+      коммита — в том же процессе без лишних запросов;
+    * изменения из других воркеров подтягиваются раз в
+      ``LEADERBOARD_RESYNC_SEC`` дельтой: строки с ``updated_at`` новее
+      отметки (индекс ``ix_players_updated_at``) с запасом
+      ``LEADERBOARD_RESYNC_OVERLAP_SEC`` на поздние коммиты и разницу часов;
+    * по желанию топ периодически материализуется в ``leaderboard_snapshots``.
+"""
+
+from __future__ import annotations
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, delete, func, insert, or_, select
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.models import db, Player, LeaderboardSnapshot
+from app.models.sharding import on_shard, shard_names
+
+BOARDS = ("balance", "xp")
+
+# --- индексируемый skip list -------------------------------------------
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: list[_Node | None] = [None] * levels
+        self.width: list[int] = [1] * levels
+
+class _Inf:
+    """Ключ-сторож, больше любого кортежа."""
+    __slots__ = ()
+
+    def __gt__(self, other):
+        return True
+
+    def __lt__(self, other):
+        return False
+
+    def __eq__(self, other):
+        return isinstance(other, _Inf)
+
+    __hash__ = object.__hash__
+
+class RankIndex:
+    """
+    Упорядоченное множество с поиском по позиции (indexable skip list).
+
+    Ключи — кортежи ``(-score, user_id)``: меньший ключ — выше в рейтинге,
+    при равном счёте выше тот, кто раньше зарегистрировался (меньший ID).
+    """
+
+    MAX_LEVELS = 24  # хватает на ~16 млн элементов
+
+    def __init__(self):
+        self._nil = _Node(_Inf(), self.MAX_LEVELS)
+        self._head = _Node(None, self.MAX_LEVELS)
+        self._head.next = [self._nil] * self.MAX_LEVELS
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def from_sorted(cls, keys) -> "RankIndex":
+        """Строит список из отсортированных ключей за O(n) — без поиска места для каждого."""
+        index = cls()
+        last = [index._head] * cls.MAX_LEVELS
+        last_pos = [0] * cls.MAX_LEVELS
+        pos = 0
+        for key in keys:
+            pos += 1
+            d = cls._random_level()
+            node = _Node(key, d)
+            for level in range(d):
+                prev = last[level]
+                prev.next[level] = node
+                prev.width[level] = pos - last_pos[level]
+                last[level], last_pos[level] = node, pos
+        for level in range(cls.MAX_LEVELS):
+            last[level].next[level] = index._nil
+            last[level].width[level] = pos + 1 - last_pos[level]
+        index.size = pos
+        return index
+
+    @classmethod
+    def _random_level(cls) -> int:
+        # Геометрическое распределение: номер младшего единичного бита, P(d) = 2^-d
+        r = random.getrandbits(cls.MAX_LEVELS - 1)
+        return (r & -r).bit_length() or cls.MAX_LEVELS
+
+    def insert(self, key) -> None:
+        chain = [None] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        d = self._random_level()
+        new = _Node(key, d)
+        steps = 0
+        for level in range(d):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(d, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key) -> None:
+        chain = [None] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target.key != key:
+            raise KeyError(key)
+        d = len(target.next)
+        for level in range(d):
+            prev = chain[level]
+            prev.width[level] += prev.next[level].width[level] - 1
+            prev.next[level] = prev.next[level].next[level]
+        for level in range(d, self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key) -> int | None:
+        """Место ключа (с 1) или None, если ключа нет."""
+        node = self._head
+        pos = 0
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level].key < key:
+                pos += node.width[level]
+                node = node.next[level]
+        if node.next[0].key == key:
+            return pos + 1
+        return None
+
+    def top(self, k: int) -> list:
+        out = []
+        node = self._head.next[0]
+        while len(out) < k and node is not self._nil:
+            out.append(node.key)
+            node = node.next[0]
+        return out
+
+# --- рейтинг -----------------------------------------------------------
+
+class Leaderboard:
+    """Набор рейтингов процесса (по одному ``RankIndex`` на доску)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.boards = {name: RankIndex() for name in BOARDS}
+        self.scores: dict[str, dict[int, int]] = {name: {} for name in BOARDS}
+        self.names: dict[int, str] = {}
+        self.built_at: float | None = None
+
+    def _set(self, board: str, uid: int, score: int | None) -> None:
+        scores = self.scores[board]
+        old = scores.get(uid)
+        if old == score:
+            return
+        idx = self.boards[board]
+        if old is not None:
+            idx.remove((-old, uid))
+            del scores[uid]
+        if score is not None:
+            idx.insert((-score, uid))
+            scores[uid] = score
+
+    def apply(self, uid: int, *, balance: int | None, xp: int | None, name: str | None,
+              blocked: bool) -> None:
+        """Применяет состояние игрока; заблокированные из рейтинга убираются."""
+        with self._lock:
+            if blocked:
+                for board in BOARDS:
+                    self._set(board, uid, None)
+                self.names.pop(uid, None)
+                return
+            self._set("balance", uid, balance or 0)
+            self._set("xp", uid, xp or 0)
+            if name is not None:
+                self.names[uid] = name
+
+    def rebuild(self, rows) -> None:
+        """Пересобирает все доски из ``(user_id, balance, xp, display_name)``."""
+        scores = {"balance": {}, "xp": {}}
+        names = {}
+        for uid, balance, xp, name in rows:
+            scores["balance"][uid] = balance or 0
+            scores["xp"][uid] = xp or 0
+            names[uid] = name
+        boards = {
+            board: RankIndex.from_sorted(sorted((-score, uid) for uid, score in scores[board].items()))
+            for board in BOARDS
+        }
+        with self._lock:
+            self.boards, self.scores, self.names = boards, scores, names
+            self.built_at = time.monotonic()
+
+    def top(self, board: str, k: int) -> list[dict]:
+        with self._lock:
+            keys = self.boards[board].top(k)
+            return [
+                {"rank": i + 1, "user_id": uid, "display_name": self.names.get(uid, "Игрок"), "score": -neg}
+                for i, (neg, uid) in enumerate(keys)
+            ]
+
+    def me(self, board: str, uid: int) -> dict:
+        with self._lock:
+            score = self.scores[board].get(uid)
+            rank = self.boards[board].rank((-score, uid)) if score is not None else None
+            return {"rank": rank, "score": score, "total": len(self.boards[board])}
+
+_board = Leaderboard()
+_build_lock = threading.Lock()
+_resync_thread: threading.Thread | None = None
+# Отметки дельты по шардам: максимальный увиденный players.updated_at
+_watermarks: dict[str | None, datetime] = {}
+
+def _load_rows():
+    rows = []
+    for shard in shard_names():
+        with on_shard(shard):
+            _watermarks[shard] = db.session.execute(select(func.max(Player.updated_at))).scalar() or datetime.min
+            rows.extend(db.session.execute(
+                select(Player.user_id, Player.balance, Player.xp, Player.display_name)
+                .where(or_(Player.is_blocked.is_(None), Player.is_blocked == 0))
+            ).all())
+    db.session.rollback()
+    return rows
+
+def _apply_delta(overlap_sec: float) -> int:
+    """Применяет игроков, изменённых после отметки (минус запас); сколько строк прочитано."""
+    n = 0
+    for shard in shard_names():
+        wm = _watermarks.get(shard, datetime.min)
+        since = wm - timedelta(seconds=overlap_sec) if wm > datetime.min + timedelta(seconds=overlap_sec) else wm
+        with on_shard(shard):
+            rows = db.session.execute(
+                select(Player.user_id, Player.balance, Player.xp, Player.display_name,
+                       Player.is_blocked, Player.updated_at)
+                .where(Player.updated_at > since)
+            ).all()
+        for uid, balance, xp, name, blocked, updated_at in rows:
+            _board.apply(uid, balance=balance, xp=xp, name=name, blocked=bool(blocked))
+            if updated_at > wm:
+                wm = updated_at
+        _watermarks[shard] = wm
+        n += len(rows)
+    db.session.rollback()
+    return n
+
+def _build(app) -> None:
+    with _build_lock:
+        if _board.built_at is None:
+            with app.app_context():
+                _board.rebuild(_load_rows())
+
+def _resync_loop(app, interval: float) -> None:
+    try:
+        _build(app)
+    except Exception:
+        app.logger.exception("leaderboard: build failed")
+    while interval:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                if _board.built_at is None:
+                    _build(app)
+                else:
+                    _apply_delta(app.config.get("LEADERBOARD_RESYNC_OVERLAP_SEC", 120))
+                if app.config.get("LEADERBOARD_SNAPSHOT_TOP"):
+                    materialize_snapshot(app.config["LEADERBOARD_SNAPSHOT_TOP"])
+        except Exception:
+            app.logger.exception("leaderboard: resync failed")
+
+def start(app) -> None:
+    """Строит рейтинг и подтягивает дельты в фоновом треде (после fork воркера)."""
+    global _resync_thread
+    with _build_lock:
+        if _resync_thread is not None:
+            return
+        interval = app.config.get("LEADERBOARD_RESYNC_SEC", 0)
+        _resync_thread = threading.Thread(
+            target=_resync_loop, args=(app, interval),
+            name="leaderboard-resync", daemon=True)
+        _resync_thread.start()
+
+def get_leaderboard(app) -> Leaderboard:
+    """Рейтинг процесса; если фоновая сборка ещё не закончилась — дожидается её."""
+    if _board.built_at is None:
+        start(app)
+        _build(app)
+    return _board
+
+def materialize_snapshot(top_k: int) -> None:
+    """Записывает текущий топ каждой доски в ``leaderboard_snapshots``."""
+    now = datetime.utcnow()
+    rows = []
+    for board in BOARDS:
+        for r in _board.top(board, top_k):
+            rows.append({"board": board, "rank": r["rank"], "user_id": r["user_id"],
+                         "score": r["score"], "taken_at": now})
+    db.session.execute(delete(LeaderboardSnapshot))
+    if rows:
+        db.session.execute(insert(LeaderboardSnapshot), rows)
+    db.session.commit()
+
+# --- события сессии ------------------------------------------------------
+
+_TRACKED = ("balance", "xp", "is_blocked", "display_name")
+
+@event.listens_for(Session, "after_flush")
+def _collect_player_changes(session, flush_context):
+    # В after_flush история атрибутов ещё не сброшена — видно, что поменялось
+    changed = session.info.setdefault("leaderboard_changes", {})
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Player):
+            continue
+        attrs = sa_inspect(obj).attrs
+        if obj not in session.new and not any(attrs[a].history.has_changes() for a in _TRACKED):
+            continue
+        changed[obj.user_id] = (obj.balance, obj.xp, obj.display_name, bool(obj.is_blocked))
+
+@event.listens_for(Session, "after_commit")
+def _apply_player_changes(session):
+    changed = session.info.pop("leaderboard_changes", None)
+    if not changed or _board.built_at is None:
+        return  # ещё не построен — при построении прочитает актуальное
+    for uid, (balance, xp, name, blocked) in changed.items():
+        _board.apply(uid, balance=balance, xp=xp, name=name, blocked=blocked)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_player_changes(session):
+    session.info.pop("leaderboard_changes", None)
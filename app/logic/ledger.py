@@ -0,0 +1,133 @@
+"""Журнал баланса игрока.
+
+Баланс меняется только через ``post()``: он правит ``Player.balance``,
+увеличивает ``Player.ledger_seq`` и добавляет в ``balance_ledger`` запись
+``(user_id, seq, delta, reason, ref)`` — UPDATE строки игрока и INSERT
+записи уходят одним flush в одной транзакции. ``(user_id, seq)`` —
+первичный ключ: две транзакции, изменившие баланс по одной и той же
+версии игрока (потерянное обновление), не смогут обе записать журнал.
+
+Новый игрок получает запись ``open`` на начальный баланс (событие
+``before_flush``), поэтому места создания игроков про журнал не знают.
+Игрокам, созданным до журнала, миграция ставит снимок ``seq = 0``.
+
+Каждые ``LEDGER_SNAPSHOT_EVERY`` записей ставится снимок баланса:
+баланс на любой момент — последний снимок до него плюс хвост журнала не
+длиннее ``LEDGER_SNAPSHOT_EVERY`` записей. Сверка всех игроков —
+``python verify_ledger.py``.
+"""
+
+from __future__ import annotations
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, func, select
+from sqlalchemy.orm import Session
+
+from app.models import db, BalanceEntry, BalanceSnapshot, Player
+
+def _snapshot_every() -> int:
+    return current_app.config.get("LEDGER_SNAPSHOT_EVERY", 100) if has_app_context() else 100
+
+def post(player: Player, delta: int, reason: str, ref: str | None = None) -> BalanceEntry:
+    """Меняет баланс игрока на ``delta`` с записью в журнал (без коммита)."""
+    now = datetime.utcnow()
+    player.balance = (player.balance or 0) + delta
+    player.ledger_seq = (player.ledger_seq or 0) + 1
+    entry = BalanceEntry(user_id=player.user_id, seq=player.ledger_seq, delta=delta,
+                         reason=reason, ref=ref, created_at=now)
+    db.session.add(entry)
+    if player.ledger_seq % _snapshot_every() == 0:
+        db.session.add(BalanceSnapshot(user_id=player.user_id, seq=player.ledger_seq,
+                                       balance=player.balance, taken_at=now))
+    return entry
+
+@event.listens_for(Session, "before_flush")
+def _open_new_players(session, flush_context, instances):
+    for obj in list(session.new):
+        if isinstance(obj, Player) and not obj.ledger_seq:
+            if obj.balance is None:
+                obj.balance = Player.__table__.c.balance.default.arg
+            obj.ledger_seq = 1
+            session.add(BalanceEntry(user_id=obj.user_id, seq=1, delta=obj.balance, reason="open",
+                                     created_at=obj.created_at or datetime.utcnow()))
+
+# --- чтение ------------------------------------------------------------------
+
+def balance_at(uid: int, at: datetime | None = None) -> int | None:
+    """
+    Баланс игрока на момент ``at`` (None — сейчас) по журналу.
+
+    Сессия должна быть на шарде игрока (``use_shard``). None — у игрока
+    нет ни снимка, ни записей до ``at``.
+    """
+    snap_q = select(BalanceSnapshot.seq, BalanceSnapshot.balance).where(BalanceSnapshot.user_id == uid)
+    if at is not None:
+        snap_q = snap_q.where(BalanceSnapshot.taken_at <= at)
+    snap = db.session.execute(snap_q.order_by(BalanceSnapshot.seq.desc()).limit(1)).first()
+    base_seq, base = (snap.seq, snap.balance) if snap else (0, None)
+
+    tail_q = select(func.sum(BalanceEntry.delta), func.count()).where(
+        BalanceEntry.user_id == uid, BalanceEntry.seq > base_seq)
+    if at is not None:
+        tail_q = tail_q.where(BalanceEntry.created_at <= at)
+    total, n = db.session.execute(tail_q).one()
+    if base is None and not n:
+        return None
+    return (base or 0) + int(total or 0)
+
+def entries(uid: int, limit: int = 50) -> list[BalanceEntry]:
+    return db.session.execute(
+        select(BalanceEntry).where(BalanceEntry.user_id == uid)
+        .order_by(BalanceEntry.seq.desc()).limit(limit)
+    ).scalars().all()
+
+def verify_chunk(uids: list[int]) -> list[dict]:
+    """
+    Сверяет баланс игроков ``uids`` с журналом; возвращает расхождения.
+
+    Три запроса на пачку: игроки, последние снимки, суммы хвостов.
+    Проверяется, что снимок + хвост = ``balance``, в хвосте нет
+    пропусков и он заканчивается на ``ledger_seq``.
+    """
+    players = db.session.execute(
+        select(Player.user_id, Player.balance, Player.ledger_seq).where(Player.user_id.in_(uids))
+    ).all()
+
+    last = (
+        select(BalanceSnapshot.user_id, func.max(BalanceSnapshot.seq).label("seq"))
+        .where(BalanceSnapshot.user_id.in_(uids)).group_by(BalanceSnapshot.user_id).subquery()
+    )
+    snaps = {
+        uid: (seq, bal) for uid, seq, bal in db.session.execute(
+            select(BalanceSnapshot.user_id, BalanceSnapshot.seq, BalanceSnapshot.balance)
+            .join(last, and_(BalanceSnapshot.user_id == last.c.user_id, BalanceSnapshot.seq == last.c.seq))
+        )
+    }
+    tails = {
+        uid: (int(total or 0), n, top) for uid, total, n, top in db.session.execute(
+            select(BalanceEntry.user_id, func.sum(BalanceEntry.delta), func.count(), func.max(BalanceEntry.seq))
+            .outerjoin(last, BalanceEntry.user_id == last.c.user_id)
+            .where(BalanceEntry.user_id.in_(uids), BalanceEntry.seq > func.coalesce(last.c.seq, 0))
+            .group_by(BalanceEntry.user_id)
+        )
+    }
+
+    problems = []
+    for uid, balance, ledger_seq in players:
+        base_seq, base = snaps.get(uid, (0, 0))
+        total, n, top = tails.get(uid, (0, 0, base_seq))
+        expected = base + total
+        issue = None
+        if uid not in snaps and not n:
+            issue = "no_ledger"
+        elif expected != balance:
+            issue = "balance_mismatch"
+        elif n != top - base_seq:
+            issue = "seq_gap"
+        elif top != (ledger_seq or 0):
+            issue = "seq_mismatch"
+        if issue:
+            problems.append({"user_id": uid, "issue": issue, "balance": balance, "ledger": expected,
+                             "ledger_seq": ledger_seq, "last_seq": top})
+    return problems
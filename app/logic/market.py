@@ -0,0 +1,403 @@
+"""Рынок игроков: заявки на покупку и продажу урожая.
+
+Заявки хранятся в ``market_orders`` (источник правды), а сводятся по
+стакану в памяти процесса: на каждый предмет две кучи — покупки по
+убыванию цены, продажи по возрастанию, при равной цене раньше
+выставленная (меньший ``id``). Поиск встречных заявок — O(k · log n) для
+k затронутых заявок, без обращения к таблице за кандидатами.
+
+Заявка обеспечивается при выставлении: продажа списывает урожай из
+инвентаря, покупка — ``price × qty`` монет с баланса (журнал ``ledger``).
+Сделка идёт по цене стоявшей заявки; покупателю, выставившему цену
+выше, разница возвращается сразу. Свои заявки между собой не сводятся.
+
+Стакан — только указатель на кандидатов. Заявка-кандидат перечитывается
+из БД под блокировкой строки, и остаток берётся оттуда: устаревший
+стакан (другой воркер уже исполнил или отменил заявку) не приводит к
+двойному исполнению.
+
+Порядок блокировок: сначала игроки, потом заявки (как при отмене).
+Игроков-кандидатов пачки блокирует один запрос по возрастанию
+``user_id``. Строка выставляющего уже заблокирована раньше, поэтому
+встречные сделки двух игроков всё ещё могут встать во взаимоблокировку —
+такую транзакцию ``_run_action`` и очередь действий повторяют. Инвентарь и баланс обеих сторон, заявки и сделки
+меняются одной транзакцией; стакан обновляется после её коммита
+(события сессии), при откате — не трогается.
+
+Как стакан узнаёт о заявках:
+    * при первом обращении процесс строит его по открытым заявкам;
+    * свои коммиты применяются сразу после коммита;
+    * новые заявки других воркеров дочитываются перед сведением
+      (``id`` больше последнего известного);
+    * исполнения и отмены других воркеров подтягиваются пересборкой раз
+      в ``MARKET_RESYNC_SEC``.
+
+Рынок работает без шардирования: игроки обеих сторон должны быть в
+одной БД, чтобы сделка шла одной транзакцией.
+"""
+
+from __future__ import annotations
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app.logic import ledger
+from app.logic.action_queue import ActionRejected
+from app.models import db, Inventory, MarketOrder, MarketTrade, Player, add_inventory
+from app.models.sharding import get_router
+
+SIDES = ("buy", "sell")
+# Новые заявки других воркеров дочитываются с запасом: id выдаются при
+# flush, а коммитятся не по порядку
+_CATCH_UP_OVERLAP = 256
+
+# --- стакан ------------------------------------------------------------------
+
+class OrderBook:
+    """
+    Стакан одного предмета.
+
+    ``live`` — открытые заявки ``id -> [side, price, remaining, user_id]``;
+    в кучах лежат ``(ключ цены, id)``, исполненные и отменённые заявки
+    удаляются из куч лениво.
+    """
+    __slots__ = ("bids", "asks", "live", "dead")
+
+    def __init__(self):
+        self.bids: list[tuple[int, int]] = []  # (-price, id)
+        self.asks: list[tuple[int, int]] = []  # (price, id)
+        self.live: dict[int, list] = {}
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def set(self, oid: int, side: str, price: int, remaining: int, uid: int) -> None:
+        """Остаток заявки (0 — убрать); повторное применение безопасно."""
+        cur = self.live.get(oid)
+        if remaining <= 0:
+            if cur is not None:
+                del self.live[oid]
+                self.dead += 1
+                if self.dead > 64 and self.dead > len(self.live):
+                    self._compact()
+            return
+        if cur is not None:
+            cur[2] = remaining
+            return
+        self.live[oid] = [side, price, remaining, uid]
+        if side == "buy":
+            heapq.heappush(self.bids, (-price, oid))
+        else:
+            heapq.heappush(self.asks, (price, oid))
+
+    def _compact(self) -> None:
+        self.bids = [e for e in self.bids if e[1] in self.live]
+        self.asks = [e for e in self.asks if e[1] in self.live]
+        heapq.heapify(self.bids)
+        heapq.heapify(self.asks)
+        self.dead = 0
+
+    def _walk(self, heap: list, stop):
+        """
+        Идёт по куче в порядке приоритета, пока ``stop(order)`` ложно.
+
+        Просмотренное возвращается в кучу; мёртвые записи с вершины
+        выбрасываются.
+        """
+        taken = []
+        try:
+            while heap:
+                oid = heap[0][1]
+                order = self.live.get(oid)
+                if order is None:
+                    heapq.heappop(heap)
+                    self.dead = max(0, self.dead - 1)
+                    continue
+                if stop(order):
+                    break
+                taken.append(heapq.heappop(heap))
+                yield oid, order
+        finally:
+            for entry in taken:
+                heapq.heappush(heap, entry)
+
+    def crossing(self, side: str, limit: int, want: int, skip_uid: int | None = None,
+                 skip_ids=()) -> list[tuple]:
+        """
+        Встречные заявки для заявки ``side`` с ценой ``limit``.
+
+        Заявки игрока ``skip_uid`` и заявки из ``skip_ids`` пропускаются.
+
+        Returns:
+            list: ``(id, price, remaining, user_id)`` в порядке приоритета,
+            пока их остатка не хватит на ``want``
+        """
+        heap = self.asks if side == "buy" else self.bids
+        worse = (lambda o: o[1] > limit) if side == "buy" else (lambda o: o[1] < limit)
+        out, total = [], 0
+        walk = self._walk(heap, lambda o: total >= want or worse(o))
+        for oid, order in walk:
+            if order[3] == skip_uid or oid in skip_ids:
+                continue
+            out.append((oid, order[1], order[2], order[3]))
+            total += order[2]
+        return out
+
+    def depth(self, side: str, levels: int) -> list[dict]:
+        """Лучшие ``levels`` ценовых уровней стороны с суммарным объёмом."""
+        heap = self.bids if side == "buy" else self.asks
+        out: list[dict] = []
+        walk = self._walk(heap, lambda o: len(out) >= levels and out[-1]["price"] != o[1])
+        for _, order in walk:
+            if out and out[-1]["price"] == order[1]:
+                out[-1]["qty"] += order[2]
+                out[-1]["orders"] += 1
+            else:
+                out.append({"price": order[1], "qty": order[2], "orders": 1})
+        return out[:levels]
+
+class Market:
+    """Стаканы процесса по предметам."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.books: dict[str, OrderBook] = {}
+        self.last_id = 0
+        self.built_at: float | None = None
+
+    def apply(self, rows) -> None:
+        """Применяет ``(id, item_key, side, price, remaining, user_id)``."""
+        with self._lock:
+            for oid, item_key, side, price, remaining, uid in rows:
+                book = self.books.get(item_key)
+                if book is None:
+                    book = self.books[item_key] = OrderBook()
+                book.set(oid, side, price, remaining, uid)
+                if oid > self.last_id:
+                    self.last_id = oid
+
+    def rebuild(self, rows) -> None:
+        fresh = Market()
+        fresh.apply(rows)
+        with self._lock:
+            self.books, self.last_id = fresh.books, max(self.last_id, fresh.last_id)
+            self.built_at = time.monotonic()
+
+    def crossing(self, item_key: str, side: str, limit: int, want: int, skip_uid: int | None,
+                 skip_ids=()) -> list[tuple]:
+        with self._lock:
+            book = self.books.get(item_key)
+            return book.crossing(side, limit, want, skip_uid, skip_ids) if book else []
+
+    def depth(self, item_key: str, levels: int) -> dict:
+        with self._lock:
+            book = self.books.get(item_key)
+            if book is None:
+                return {"bids": [], "asks": [], "orders": 0}
+            return {"bids": book.depth("buy", levels), "asks": book.depth("sell", levels), "orders": len(book)}
+
+_market = Market()
+_build_lock = threading.Lock()
+_resync_thread: threading.Thread | None = None
+
+def _open_rows(after_id: int = 0):
+    q = select(MarketOrder.id, MarketOrder.item_key, MarketOrder.side, MarketOrder.price,
+               MarketOrder.remaining, MarketOrder.user_id).where(MarketOrder.status == "open")
+    if after_id:
+        q = q.where(MarketOrder.id > after_id)
+    return db.session.execute(q.order_by(MarketOrder.id)).all()
+
+def _resync_loop(app, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                _market.rebuild(_open_rows())
+        except Exception:
+            app.logger.exception("market: resync failed")
+
+def get_market(app) -> Market:
+    """Стаканы процесса; строятся при первом обращении (после fork воркера)."""
+    global _resync_thread
+    if _market.built_at is None:
+        with _build_lock:
+            if _market.built_at is None:
+                _market.rebuild(_open_rows())
+                interval = app.config.get("MARKET_RESYNC_SEC", 0)
+                if interval and _resync_thread is None:
+                    _resync_thread = threading.Thread(
+                        target=_resync_loop, args=(app, interval),
+                        name="market-resync", daemon=True)
+                    _resync_thread.start()
+    return _market
+
+def catch_up(market: Market) -> None:
+    """Дочитывает открытые заявки, выставленные другими воркерами."""
+    market.apply(_open_rows(max(0, market.last_id - _CATCH_UP_OVERLAP)))
+
+# --- заявки ------------------------------------------------------------------
+
+def _note(order: MarketOrder) -> None:
+    """Состояние заявки для стакана — применится после коммита."""
+    remaining = order.remaining if order.status == "open" else 0
+    db.session.info.setdefault("market_ops", []).append(
+        (order.id, order.item_key, order.side, order.price, remaining, order.user_id))
+
+def _load_order(oid: int, lock: bool) -> MarketOrder | None:
+    q = select(MarketOrder).where(MarketOrder.id == oid).execution_options(populate_existing=True)
+    if lock:
+        q = q.with_for_update()
+    return db.session.execute(q).scalar_one_or_none()
+
+def _load_counterparty(uid: int, lock: bool) -> Player:
+    q = select(Player).where(Player.user_id == uid)
+    if lock:
+        q = q.with_for_update()
+    return db.session.execute(q).scalar_one()
+
+def _lock_players(uids) -> None:
+    """Блокирует строки игроков одним запросом по возрастанию ``user_id``."""
+    db.session.execute(
+        select(Player.user_id).where(Player.user_id.in_(sorted(uids))).order_by(Player.user_id).with_for_update()
+    ).all()
+
+def check_available() -> None:
+    if get_router() is not None:
+        raise ActionRejected("market_unavailable", 503)
+
+def open_orders(uid: int) -> int:
+    return db.session.execute(
+        select(func.count()).select_from(MarketOrder)
+        .where(MarketOrder.user_id == uid, MarketOrder.status == "open")
+    ).scalar_one()
+
+def place(app, player: Player, item_key: str, side: str, price: int, qty: int, *, lock: bool) -> dict:
+    """
+    Выставляет заявку игрока и сводит её со стаканом (без коммита).
+
+    Args:
+        app: Приложение (стакан процесса)
+        player: ``Player`` выставляющего, уже заблокированный
+        item_key: ``crop_*``
+        side: 'buy' | 'sell'
+        price: Цена за штуку (для покупки — максимальная)
+        qty: Количество
+        lock: Блокировать строки
+
+    Returns:
+        dict: ``{"order": ..., "trades": [...]}``
+    """
+    uid = player.user_id
+    now = datetime.utcnow()
+    market = get_market(app)
+    # До flush своей заявки: дочитать нужно только чужие, уже закоммиченные
+    catch_up(market)
+    if side == "sell":
+        q = select(Inventory).where(Inventory.user_id == uid, Inventory.item_key == item_key)
+        if lock:
+            q = q.with_for_update()
+        inv = db.session.execute(q).scalar_one_or_none()
+        if inv is None or inv.qty < qty:
+            raise ActionRejected("no_items")
+    elif (player.balance or 0) < price * qty:
+        raise ActionRejected("not_enough_money")
+
+    order = MarketOrder(user_id=uid, item_key=item_key, side=side, price=price, qty=qty,
+                        remaining=qty, status="open", created_at=now, updated_at=now)
+    db.session.add(order)
+    db.session.flush()
+    # Обеспечение заявки
+    if side == "sell":
+        inv.qty -= qty
+    else:
+        ledger.post(player, -price * qty, "market_escrow", f"order:{order.id}")
+
+    trades = []
+    seen: set[int] = set()
+    while order.remaining:
+        # Остатки в стакане могут быть устаревшими — добираем кандидатов, пока есть
+        candidates = market.crossing(item_key, side, price, order.remaining, uid, seen)
+        if not candidates:
+            break
+        if lock:
+            _lock_players({maker_uid for *_, maker_uid in candidates})
+        for oid, maker_price, _, maker_uid in candidates:
+            seen.add(oid)
+            if not order.remaining:
+                break
+            maker = _load_order(oid, lock)
+            if maker is None or maker.status != "open" or maker.remaining <= 0:
+                # Исполнена или отменена в другом воркере — убрать из стакана
+                db.session.info.setdefault("market_ops", []).append(
+                    (oid, item_key, "sell" if side == "buy" else "buy", maker_price, 0, maker_uid))
+                continue
+            fill = min(order.remaining, maker.remaining)
+            counterparty = _load_counterparty(maker.user_id, lock)
+            buy, sell = (order, maker) if side == "buy" else (maker, order)
+            buyer, seller = (player, counterparty) if side == "buy" else (counterparty, player)
+
+            add_inventory(buyer.user_id, item_key, fill)
+            ledger.post(seller, maker.price * fill, "market_sale", f"order:{sell.id}")
+            if side == "buy" and price > maker.price:
+                # Обеспечено по цене заявки, куплено дешевле — разницу назад
+                ledger.post(buyer, (price - maker.price) * fill, "market_refund", f"order:{order.id}")
+
+            for o in (order, maker):
+                o.remaining -= fill
+                o.updated_at = now
+                if not o.remaining:
+                    o.status = "filled"
+            db.session.add(MarketTrade(item_key=item_key, price=maker.price, qty=fill, buy_order_id=buy.id,
+                                       sell_order_id=sell.id, buyer_id=buyer.user_id, seller_id=seller.user_id,
+                                       created_at=now))
+            _note(maker)
+            trades.append({"price": maker.price, "qty": fill, "order_id": maker.id})
+    _note(order)
+    return {"order": order_public(order), "trades": trades}
+
+def cancel(player: Player, oid: int, *, lock: bool) -> dict:
+    """Отменяет открытую заявку игрока и возвращает обеспечение (без коммита)."""
+    order = _load_order(oid, lock)
+    if order is None or order.user_id != player.user_id:
+        raise ActionRejected("order_not_found", 404)
+    if order.status != "open":
+        raise ActionRejected("order_closed")
+    if order.side == "sell":
+        add_inventory(player.user_id, order.item_key, order.remaining)
+    else:
+        ledger.post(player, order.price * order.remaining, "market_cancel", f"order:{order.id}")
+    order.status = "cancelled"
+    order.updated_at = datetime.utcnow()
+    _note(order)
+    return {"order": order_public(order)}
+
+def order_public(order: MarketOrder) -> dict:
+    return {
+        "id": order.id, "item_key": order.item_key, "side": order.side, "price": order.price,
+        "qty": order.qty, "remaining": order.remaining, "status": order.status,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+    }
+
+def recent_trades(item_key: str, limit: int = 20) -> list[dict]:
+    rows = db.session.execute(
+        select(MarketTrade.price, MarketTrade.qty, MarketTrade.created_at)
+        .where(MarketTrade.item_key == item_key).order_by(MarketTrade.id.desc()).limit(limit)
+    ).all()
+    return [{"price": r.price, "qty": r.qty, "at": r.created_at.isoformat()} for r in rows]
+
+# --- события сессии ------------------------------------------------------
+
+@event.listens_for(Session, "after_commit")
+def _apply_book_changes(session):
+    ops = session.info.pop("market_ops", None)
+    if ops and _market.built_at is not None:
+        _market.apply(ops)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_book_changes(session):
+    session.info.pop("market_ops", None)
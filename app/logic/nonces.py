@@ -0,0 +1,72 @@
+"""Одноразовые nonce действий в общем хранилище.
+
+У игрока один действующий nonce: ``/api/state`` выдаёт новый, каждое
+принятое действие заменяет его следующим. Хранится в ``SharedState``
+(ключ ``nonce:<uid>``), поэтому запросы одного игрока могут попадать
+на разные узлы. Замена — ``compare_and_set``: из двух параллельных
+запросов с одним nonce пройдёт только один.
+"""
+
+from __future__ import annotations
+import secrets
+import time
+from datetime import datetime, timezone
+
+from app.utils.shared_state import SharedState, get_shared_state
+
+NONCE_TTL_SEC = 60
+
+class Nonce:
+    """Значение nonce и срок действия (naive UTC)."""
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: str, expires_at: datetime):
+        self.value = value
+        self.expires_at = expires_at
+
+    def encode(self) -> bytes:
+        return f"{self.value}|{self.expires_at.timestamp():.3f}".encode()
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "Nonce":
+        value, _, ts = raw.decode().partition("|")
+        return cls(value, _utc(float(ts)))
+
+def _utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+def _new(ttl_sec: int) -> Nonce:
+    return Nonce(secrets.token_hex(16), _utc(time.time() + ttl_sec))
+
+def issue(user_id: int, ttl_sec: int = NONCE_TTL_SEC, state: SharedState | None = None) -> Nonce:
+    """Выдаёт новый nonce (старый перестаёт действовать)."""
+    state = state or get_shared_state()
+    nonce = _new(ttl_sec)
+    state.set(f"nonce:{user_id}", nonce.encode(), ttl=ttl_sec)
+    return nonce
+
+def current(user_id: int, state: SharedState | None = None) -> Nonce | None:
+    raw = (state or get_shared_state()).get(f"nonce:{user_id}")
+    return Nonce.decode(raw) if raw else None
+
+def verify_and_rotate(user_id: int, presented: str | None, ttl_sec: int = NONCE_TTL_SEC,
+                      state: SharedState | None = None) -> Nonce | None:
+    """
+    Проверяет предъявленный nonce и заменяет его новым.
+
+    Returns:
+        Nonce | None: Новый nonce или None, если предъявлен неверный/просроченный
+    """
+    if not presented:
+        return None
+    state = state or get_shared_state()
+    key = f"nonce:{user_id}"
+    raw = state.get(key)
+    if not raw:
+        return None
+    if not secrets.compare_digest(Nonce.decode(raw).value, presented):
+        return None
+    nonce = _new(ttl_sec)
+    if not state.compare_and_set(key, raw, nonce.encode(), ttl=ttl_sec):
+        return None  # параллельный запрос успел раньше
+    return nonce
@@ -0,0 +1,221 @@
+"""Цены продажи урожая от предложения.
+
+Базовые цены — ``SELL_PRICES``. Текущая цена предмета падает, когда его
+продают больше обычного: на каждый предмет в памяти процесса ведётся
+счётчик продаж с экспоненциальным затуханием (вес продажи вдвое меньше
+каждые ``PRICE_HALF_LIFE_SEC``). При ровном потоке ``r`` продаж в секунду
+счётчик стремится к ``r · half_life / ln 2``.
+
+    цена = база · clamp((PRICE_TARGET_VOLUME / объём) ^ PRICE_ELASTICITY,
+                        PRICE_FLOOR, PRICE_CAP)
+
+При объёме не больше целевого и ``PRICE_CAP = 1`` цена равна базовой.
+
+Таблица цен пересчитывается не чаще раза в ``PRICE_CACHE_SEC`` и
+отдаётся готовым JSON (``/api/prices``); продажа берёт цену из той же
+таблицы — без запросов к БД, игрок видит ту цену, по которой продаст.
+Цена каждой продажи остаётся в журнале баланса (``balance_entries``:
+``reason = "sell"``, ``ref`` — предмет, ``delta`` — цена).
+
+Как счётчики узнают о продажах:
+    * свои продажи учитываются сразу после коммита (события сессии);
+    * общие счётчики — в ``SharedState``: продажи всех воркеров по
+      корзинам в ``PRICE_BUCKET_SEC`` (``price_sales:<предмет>:<корзина>``).
+      Фоновый тред раз в ``PRICE_RESYNC_SEC`` добавляет туда накопленные
+      свои продажи и пересобирает счётчики процесса по корзинам за
+      ``PRICE_WINDOW_SEC`` (старше — вклад пренебрежимо мал). Закрытые
+      корзины не меняются и читаются один раз, дальше — только текущая
+      и предыдущая.
+
+Тред запускается с первого запроса воркера (или при старте ASGI);
+пока корзины не прочитаны, продажа идёт по базовым ценам.
+"""
+
+from __future__ import annotations
+import json
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.utils.shared_state import get_shared_state
+
+_KEY = "price_sales:{item_key}:{bucket}"
+
+def dynamic_price(base: int, volume: float, cfg) -> int:
+    """Цена при данном объёме продаж; не меньше 1 монеты."""
+    if not cfg.get("PRICE_DYNAMIC", True):
+        return int(base)
+    target = float(cfg["PRICE_TARGET_VOLUME"])
+    if volume <= 0:
+        factor = float(cfg["PRICE_CAP"])
+    else:
+        factor = (target / volume) ** float(cfg["PRICE_ELASTICITY"])
+    factor = min(max(factor, float(cfg["PRICE_FLOOR"])), float(cfg["PRICE_CAP"]))
+    return max(1, int(round(base * factor)))
+
+class Prices:
+    """Затухающие счётчики продаж и кэш таблицы цен процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # item_key -> [значение счётчика, time.time() последнего обновления]
+        self.counters: dict[str, list[float]] = {}
+        # свои продажи, ещё не добавленные в общие счётчики: item_key -> шт.
+        self.pending: dict[str, int] = {}
+        # прочитанные корзины общих счётчиков: (item_key, корзина) -> шт.
+        self.buckets: dict[tuple[str, int], int] = {}
+        self.half_life = 3600.0
+        self.built_at: float | None = None
+        self._table: dict | None = None
+        self._body: bytes | None = None
+        self._table_at = float("-inf")
+
+    def _decayed(self, item_key: str, now: float) -> float:
+        c = self.counters.get(item_key)
+        if c is None:
+            return 0.0
+        return c[0] * 0.5 ** (max(0.0, now - c[1]) / self.half_life)
+
+    def add(self, item_key: str, n: int = 1, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self.counters[item_key] = [self._decayed(item_key, now) + n, now]
+            self.pending[item_key] = self.pending.get(item_key, 0) + n
+
+    def take_pending(self) -> dict[str, int]:
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def put_back(self, pending: dict[str, int]) -> None:
+        """Возвращает продажи, которые не удалось добавить в общие счётчики."""
+        with self._lock:
+            for item_key, n in pending.items():
+                self.pending[item_key] = self.pending.get(item_key, 0) + n
+
+    def volume(self, item_key: str, now: float | None = None) -> float:
+        with self._lock:
+            return self._decayed(item_key, time.time() if now is None else now)
+
+    def rebuild(self, step: float, half_life: float) -> None:
+        """Счётчики заново по корзинам ``buckets`` шириной ``step`` секунд."""
+        now = time.time()
+        with self._lock:
+            counters: dict[str, list[float]] = {}
+            for (item_key, bucket), n in self.buckets.items():
+                age = max(0.0, now - (bucket + 0.5) * step)
+                c = counters.setdefault(item_key, [0.0, now])
+                c[0] += n * 0.5 ** (age / half_life)
+            # Продажи после выгрузки в общие счётчики в корзинах ещё не видны
+            for item_key, n in self.pending.items():
+                counters.setdefault(item_key, [0.0, now])[0] += n
+            self.counters = counters
+            self.half_life = half_life
+            self.built_at = now
+            self._table_at = float("-inf")
+
+    def table(self, cfg) -> tuple[dict, bytes]:
+        """Таблица цен и её JSON; пересчёт не чаще раза в ``PRICE_CACHE_SEC``."""
+        mono = time.monotonic()
+        if self._table is not None and mono - self._table_at < cfg["PRICE_CACHE_SEC"]:
+            return self._table, self._body
+        now = time.time()
+        with self._lock:
+            table = {}
+            for item_key, base in cfg["SELL_PRICES"].items():
+                volume = self._decayed(item_key, now)
+                # Пока общие счётчики не прочитаны — базовая цена
+                price = dynamic_price(base, volume, cfg) if self.built_at is not None else int(base)
+                table[item_key] = {"base": int(base), "price": price, "volume": round(volume, 2)}
+            body = json.dumps({"ok": True, "prices": table, "updated_at_unix_ms": int(now * 1000)},
+                              ensure_ascii=False, separators=(",", ":")).encode()
+            self._table, self._body, self._table_at = table, body, mono
+        return table, body
+
+    def price(self, cfg, item_key: str) -> int:
+        return self.table(cfg)[0][item_key]["price"]
+
+_prices = Prices()
+_start_lock = threading.Lock()
+_resync_thread: threading.Thread | None = None
+
+def _flush(state, step: float, window: float) -> None:
+    """Свои продажи — в текущую корзину общих счётчиков."""
+    pending = _prices.take_pending()
+    bucket = int(time.time() // step)
+    try:
+        while pending:
+            item_key, n = next(iter(pending.items()))
+            state.incr(_KEY.format(item_key=item_key, bucket=bucket), ttl=window + 2 * step, amount=n)
+            del pending[item_key]
+    finally:
+        _prices.put_back(pending)
+
+def _sync(app) -> None:
+    """Выгрузка своих продаж и пересборка счётчиков по общим корзинам."""
+    cfg = app.config
+    state = get_shared_state(app)
+    step, window = float(cfg["PRICE_BUCKET_SEC"]), float(cfg["PRICE_WINDOW_SEC"])
+    _flush(state, step, window)
+
+    current = int(time.time() // step)
+    first = current - int(window // step)
+    known = {k: n for k, n in _prices.buckets.items() if k[1] >= first}
+    for item_key in cfg["SELL_PRICES"]:
+        for bucket in range(first, current + 1):
+            # Закрытая корзина уже не меняется; предыдущую перечитываем —
+            # в неё могла попасть выгрузка, начатая до смены корзины
+            if bucket >= current - 1 or (item_key, bucket) not in known:
+                known[(item_key, bucket)] = state.counter(_KEY.format(item_key=item_key, bucket=bucket))
+    _prices.buckets = {k: n for k, n in known.items() if n}
+    _prices.rebuild(step, float(cfg["PRICE_HALF_LIFE_SEC"]))
+
+def _resync_loop(app, interval: float) -> None:
+    while True:
+        try:
+            _sync(app)
+        except Exception:
+            app.logger.exception("pricing: resync failed")
+        if not interval:
+            return
+        time.sleep(interval)
+
+def start(app) -> None:
+    """Читает общие счётчики и держит их свежими в фоновом треде (после fork воркера)."""
+    global _resync_thread
+    with _start_lock:
+        if _resync_thread is not None:
+            return
+        _resync_thread = threading.Thread(
+            target=_resync_loop, args=(app, app.config.get("PRICE_RESYNC_SEC", 0)),
+            name="pricing-resync", daemon=True)
+        _resync_thread.start()
+
+def get_prices(app) -> Prices:
+    """Цены процесса; до первого чтения общих счётчиков — базовые."""
+    if _resync_thread is None:
+        start(app)
+    return _prices
+
+def quote(cfg, item_key: str) -> int:
+    """Цена из уже собранных счётчиков (для кода без Flask-приложения под рукой)."""
+    return _prices.price(cfg, item_key)
+
+def note_sale(session, item_key: str, qty: int = 1) -> None:
+    """Продажа для счётчика — учтётся после коммита."""
+    session.info.setdefault("price_sales", []).append((item_key, qty))
+
+# --- события сессии ------------------------------------------------------
+
+@event.listens_for(Session, "after_commit")
+def _apply_sales(session):
+    sales = session.info.pop("price_sales", None)
+    if sales:
+        for item_key, qty in sales:
+            _prices.add(item_key, qty)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_sales(session):
+    session.info.pop("price_sales", None)
@@ -0,0 +1,78 @@
+"""Опыт и уровни игрока.
+
+Опыт начисляется за посадку, сбор и продажу урожая. Кривая уровней
+рассчитана заранее в таблицу порогов ``LEVEL_THRESHOLDS``: уровень по
+опыту ищется бинарным поиском (``bisect``), без цикла по уровням.
+
+``award`` только меняет атрибуты уже заблокированного в транзакции
+``Player``. Если действие и так меняет строку игрока (продажа — баланс),
+опыт уходит тем же UPDATE; посадке и сбору он стоит одного UPDATE
+players (проверяет ``bench_progression.py``).
+"""
+
+from __future__ import annotations
+from bisect import bisect_right
+
+MAX_LEVEL = 100
+
+def _xp_for_level(level: int) -> int:
+    """Суммарный опыт, нужный для уровня: 20·(L−1)^1.5, округлён вверх до 5."""
+    raw = 20 * (level - 1) ** 1.5
+    return int(-(-raw // 5) * 5)
+
+# LEVEL_THRESHOLDS[i] — опыт, с которого начинается уровень i + 1
+LEVEL_THRESHOLDS: tuple[int, ...] = tuple(_xp_for_level(lvl) for lvl in range(1, MAX_LEVEL + 1))
+
+# Базовый опыт за действие; умножается на ранг культуры (пшеница 1 ... лук 5)
+XP_PER_ACTION = {
+    "plant": 1,
+    "harvest": 3,
+    "sell": 2,
+}
+
+CROP_TIERS = {
+    "wheat": 1,
+    "carrot": 2,
+    "watermelon": 3,
+    "pumpkin": 4,
+    "onion": 5,
+}
+
+def level_for_xp(xp: int) -> int:
+    """Уровень по суммарному опыту (O(log MAX_LEVEL))."""
+    return max(1, bisect_right(LEVEL_THRESHOLDS, xp))
+
+def xp_reward(action: str, crop_type: str) -> int:
+    """Опыт за действие с культурой (``crop_type`` — 'wheat', не 'crop_wheat')."""
+    return XP_PER_ACTION.get(action, 0) * CROP_TIERS.get(crop_type, 1)
+
+def award(player, action: str, crop_type: str, times: int = 1) -> dict:
+    """
+    Начисляет опыт игроку и пересчитывает уровень.
+
+    Args:
+        player: ``Player``, уже заблокированный ``with_for_update``
+        action: 'plant' | 'harvest' | 'sell'
+        crop_type: Тип культуры
+        times: Сколько раз выполнено действие (автопосадка — пачкой)
+
+    Returns:
+        dict: Блок ``progress`` для ответа действия
+    """
+    gained = xp_reward(action, crop_type) * times
+    old_level = player.level or 1
+    player.xp = (player.xp or 0) + gained
+    level = level_for_xp(player.xp)
+    if level != old_level:
+        player.level = level
+
+    next_xp = LEVEL_THRESHOLDS[level] if level < MAX_LEVEL else None
+    return {
+        "xp_gained": gained,
+        "xp": player.xp,
+        "level": level,
+        "level_up": level > old_level,
+        "levels_gained": max(0, level - old_level),
+        "level_xp": LEVEL_THRESHOLDS[level - 1],
+        "next_level_xp": next_xp,
+    }
@@ -0,0 +1,207 @@
+"""Почасовые агрегаты экономики из ``action_logs``.
+
+Действие в логе — строка ``действие[:предмет[:монеты]]``
+(``sell:crop_pumpkin:37``, ``plant:onion``, ``buy_field``). Свёртка превращает её в строку
+``economy_rollups``: ``(час, действие, предмет) -> count, coins``. Вопросы
+вида «сколько тыкв продали вчера» читают только агрегаты — сотни строк
+вместо сканирования лога.
+
+Инкрементально, по водяной отметке: для каждого источника (шарда)
+в ``rollup_watermarks`` хранится последний учтённый ``action_logs.id``.
+Проход читает следующие ``batch`` строк по первичному ключу, прибавляет
+их к агрегатам и сдвигает отметку — одной транзакцией в основной БД,
+поэтому строка лога учитывается ровно один раз. Отметка сдвигается
+сравнением со старым значением: параллельный проход (второй воркер)
+откатится, а не посчитает строки дважды.
+
+Строки моложе ``settle_sec`` не берутся: id выдаётся при вставке, а
+коммит — позже, и строка с меньшим id может стать видна после строки с
+большим. Транзакции действий должны укладываться в ``settle_sec``.
+
+Продажа идёт по динамической цене (``app/logic/pricing.py``), и цена
+пишется в лог третьей частью строки — монеты продаж берутся из неё.
+Для остальных действий (и продаж, записанных до этого без цены) монеты
+считаются по текущим ценам конфигурации (``SELL_PRICES``, ``SHOP_ITEMS``,
+``FIELD_COST``). После смены цен или переноса игроков между шардами
+(``reshard.py`` переносит строки лога с новыми id) агрегаты
+пересобираются: ``python rollup_stats.py --rebuild``.
+
+Фоновый проход — ``python rollup_stats.py --loop``; он же догоняет
+историю пачками при первом запуске.
+"""
+
+from __future__ import annotations
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, ActionLog, EconomyRollup, RollupWatermark
+from app.models.sharding import MAIN, on_shard, shard_names
+
+# Действия, приносящие монеты игроку; остальные с ценой — траты
+INCOME_ACTIONS = frozenset({"sell"})
+
+def parse_action(action: str) -> tuple[str, str, int | None]:
+    """
+    ``"sell:crop_pumpkin:37"`` -> ``("sell", "crop_pumpkin", 37)``.
+
+    Без предмета — ``""``, без монет — ``None``.
+    """
+    name, _, rest = action.partition(":")
+    item, _, coins = rest.partition(":")
+    return name, item, int(coins) if coins.isdigit() else None
+
+def coins_for(action: str, item_key: str, cfg) -> int:
+    """Монеты одного действия по ценам конфигурации; 0 — без денег."""
+    if action == "sell":
+        return int(cfg["SELL_PRICES"].get(item_key, 0))
+    if action == "shop_buy":
+        item = cfg["SHOP_ITEMS"].get(item_key)
+        return int(item["price"]) if item else 0
+    if action == "buy_field":
+        return int(cfg.get("FIELD_COST", 5))
+    return 0
+
+def hour_of(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+# --- свёртка ---------------------------------------------------------------
+
+def _watermark(source: str) -> int:
+    last = db.session.execute(
+        select(RollupWatermark.last_id).where(RollupWatermark.source == source)
+    ).scalar_one_or_none()
+    if last is not None:
+        return last
+    try:
+        db.session.add(RollupWatermark(source=source, last_id=0, updated_at=datetime.utcnow()))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # создал параллельный проход
+    return 0
+
+def _add(agg: dict) -> None:
+    for (hour, action, item_key), (count, coins) in agg.items():
+        key = (EconomyRollup.hour == hour, EconomyRollup.action == action, EconomyRollup.item_key == item_key)
+        res = db.session.execute(
+            update(EconomyRollup).where(*key)
+            .values(count=EconomyRollup.count + count, coins=EconomyRollup.coins + coins)
+        )
+        if res.rowcount == 0:
+            db.session.execute(insert(EconomyRollup).values(
+                hour=hour, action=action, item_key=item_key, count=count, coins=coins))
+
+def roll_source(shard: str | None, *, batch: int, settle_sec: float) -> tuple[int, bool]:
+    """
+    Одна пачка одного источника.
+
+    Returns:
+        tuple: (сколько строк лога учтено, догнали ли конец лога)
+    """
+    source = shard or MAIN
+    cfg = current_app.config
+    last = _watermark(source)
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_sec)
+
+    with on_shard(shard):
+        rows = db.session.execute(
+            select(ActionLog.id, ActionLog.action, ActionLog.created_at)
+            .where(ActionLog.id > last).order_by(ActionLog.id).limit(batch)
+        ).all()
+
+    agg: dict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+    new_last = last
+    for row_id, action, created_at in rows:
+        if created_at is None or created_at > cutoff:
+            break
+        name, item_key, coins = parse_action(action)
+        acc = agg[(hour_of(created_at), name, item_key)]
+        acc[0] += 1
+        acc[1] += coins if coins is not None else coins_for(name, item_key, cfg)
+        new_last = row_id
+    if new_last == last:
+        db.session.rollback()
+        return 0, True
+    caught_up = len(rows) < batch or new_last != rows[-1][0]
+
+    try:
+        # Сначала отметка: второй проход по тому же источнику ждёт здесь и откатывается
+        moved = db.session.execute(
+            update(RollupWatermark)
+            .where(RollupWatermark.source == source, RollupWatermark.last_id == last)
+            .values(last_id=new_last, updated_at=datetime.utcnow())
+        ).rowcount
+        if not moved:
+            db.session.rollback()
+            return 0, False
+        _add(agg)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # гонка вставки агрегата с другим источником — следующий проход
+        return 0, False
+    return sum(c for c, _ in agg.values()), caught_up
+
+def run_pass(*, batch: int = 5000, settle_sec: float = 10.0, throttle_sec: float = 0.0,
+             max_batches: int | None = None) -> int:
+    """
+    Догоняет лог всех источников пачками по ``batch`` строк.
+
+    ``throttle_sec`` — пауза между пачками (догон истории без нагрузки на
+    БД), ``max_batches`` — предел пачек на источник за проход.
+    """
+    total = 0
+    for shard in shard_names():
+        n_batches = 0
+        while max_batches is None or n_batches < max_batches:
+            n, caught_up = roll_source(shard, batch=batch, settle_sec=settle_sec)
+            total += n
+            n_batches += 1
+            if caught_up:
+                break
+            if throttle_sec:
+                time.sleep(throttle_sec)
+    return total
+
+def reset() -> None:
+    """Удаляет агрегаты и отметки — следующий проход пересоберёт всё с начала."""
+    db.session.execute(delete(EconomyRollup))
+    db.session.execute(delete(RollupWatermark))
+    db.session.commit()
+
+# --- чтение ------------------------------------------------------------------
+
+def totals(since: datetime, until: datetime, *, action: str | None = None,
+           item_key: str | None = None, by_hour: bool = False) -> list[dict]:
+    """Суммы по ``(действие, предмет)`` (и часу при ``by_hour``) за ``[since, until)``."""
+    cols = [EconomyRollup.action, EconomyRollup.item_key]
+    if by_hour:
+        cols.insert(0, EconomyRollup.hour)
+    q = (
+        select(*cols, func.sum(EconomyRollup.count), func.sum(EconomyRollup.coins))
+        .where(EconomyRollup.hour >= hour_of(since), EconomyRollup.hour < until)
+        .group_by(*cols).order_by(*cols)
+    )
+    if action:
+        q = q.where(EconomyRollup.action == action)
+    if item_key is not None:
+        q = q.where(EconomyRollup.item_key == item_key)
+    out = []
+    for row in db.session.execute(q):
+        *key, count, coins = row
+        rec = {"action": key[-2], "item_key": key[-1] or None, "count": int(count), "coins": int(coins)}
+        if by_hour:
+            rec["hour"] = key[0].isoformat()
+        out.append(rec)
+    return out
+
+def watermarks() -> list[dict]:
+    rows = db.session.execute(select(RollupWatermark).order_by(RollupWatermark.source)).scalars()
+    return [
+        {"source": w.source, "last_id": w.last_id,
+         "updated_at": w.updated_at.isoformat() if w.updated_at else None}
+        for w in rows
+    ]
@@ -0,0 +1,208 @@
+"""Версионные миграции схемы.
+
+Каждая миграция — модуль ``vNNNN_<имя>.py`` в этом пакете с функцией
+``upgrade(m)``, где ``m`` — ``MigrationContext``. Применённые версии
+записываются в таблицу ``schema_migrations``. Шаги миграций обязаны
+быть идемпотентными: упавшую на середине миграцию запускают повторно.
+
+Контекст знает диалект (SQLite/PostgreSQL) и умеет:
+    * ``add_column`` — ALTER TABLE ... ADD COLUMN, если столбца нет;
+    * ``create_index`` — на PostgreSQL ``CREATE INDEX CONCURRENTLY``
+      вне транзакции, без блокировки записи;
+    * ``backfill`` — UPDATE пачками по N строк с паузой между ними,
+      каждая пачка в своей транзакции.
+
+Запуск: ``python migrate_db.py``.
+"""
+
+from __future__ import annotations
+import importlib
+import logging
+import pkgutil
+import re
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+log = logging.getLogger(__name__)
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+_MODULE_RE = re.compile(r"^v(\d{4})_(\w+)$")
+
+class Migration:
+    """Одна миграция из пакета."""
+    __slots__ = ("version", "name", "upgrade")
+
+    def __init__(self, version: int, name: str, upgrade):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+
+def discover() -> list[Migration]:
+    """Находит все ``vNNNN_*`` модули пакета, по возрастанию версии."""
+    out = []
+    for info in pkgutil.iter_modules(__path__):
+        m = _MODULE_RE.match(info.name)
+        if not m:
+            continue
+        mod = importlib.import_module(f"{__name__}.{info.name}")
+        out.append(Migration(int(m.group(1)), m.group(2), mod.upgrade))
+    out.sort(key=lambda x: x.version)
+    versions = [x.version for x in out]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration versions: {versions}")
+    return out
+
+class MigrationContext:
+    """
+    Операции над схемой с учётом диалекта.
+
+    Args:
+        engine: SQLAlchemy Engine
+        batch_size: Размер пачки для ``backfill`` по умолчанию
+        throttle_sec: Пауза между пачками ``backfill`` по умолчанию
+    """
+
+    def __init__(self, engine, *, batch_size: int = 1000, throttle_sec: float = 0.05, echo=print):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.batch_size = batch_size
+        self.throttle_sec = throttle_sec
+        self.echo = echo
+
+    @property
+    def is_postgres(self) -> bool:
+        return self.dialect == "postgresql"
+
+    def execute(self, sql: str, params: dict | None = None) -> None:
+        """Выполняет SQL в отдельной транзакции."""
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), params or {})
+
+    def has_table(self, table: str) -> bool:
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return any(c["name"] == column for c in inspect(self.engine).get_columns(table))
+
+    def has_index(self, table: str, name: str) -> bool:
+        return any(ix["name"] == name for ix in inspect(self.engine).get_indexes(table))
+
+    def add_column(self, table: str, column: str, ddl: str) -> bool:
+        """Добавляет столбец, если его нет. ``ddl`` — тип и умолчание."""
+        if self.has_column(table, column):
+            return False
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        self.echo(f"   + {table}.{column}")
+        return True
+
+    def create_index(self, name: str, table: str, columns: str, *, unique: bool = False) -> bool:
+        """
+        Создаёт индекс, если его нет.
+
+        На PostgreSQL — ``CONCURRENTLY`` в autocommit: таблица не
+        блокируется на запись, но команда не может идти в транзакции.
+        """
+        if self.has_index(table, name):
+            return False
+        uq = "UNIQUE " if unique else ""
+        if self.is_postgres:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"CREATE {uq}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+        else:
+            self.execute(f"CREATE {uq}INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        self.echo(f"   + index {name}")
+        return True
+
+    def drop_index(self, name: str, table: str) -> bool:
+        """Удаляет индекс, если он есть (на PostgreSQL — CONCURRENTLY)."""
+        if not self.has_index(table, name):
+            return False
+        if self.is_postgres:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        else:
+            self.execute(f"DROP INDEX IF EXISTS {name}")
+        self.echo(f"   - index {name}")
+        return True
+
+    def backfill(self, table: str, set_sql: str, where_sql: str, params: dict | None = None, *,
+                 key: str = "id", batch_size: int | None = None, throttle_sec: float | None = None) -> int:
+        """
+        Обновляет строки пачками, не держа долгих блокировок.
+
+        ``where_sql`` должно перестать выполняться для обновлённой
+        строки (например, ``new_col IS NULL``), иначе цикл не закончится.
+
+        Returns:
+            int: Сколько строк обновлено
+        """
+        n = batch_size or self.batch_size
+        pause = self.throttle_sec if throttle_sec is None else throttle_sec
+        sql = text(
+            f"UPDATE {table} SET {set_sql} WHERE {key} IN "
+            f"(SELECT {key} FROM {table} WHERE {where_sql} LIMIT :_batch)"
+        )
+        total = 0
+        while True:
+            with self.engine.begin() as conn:
+                cnt = conn.execute(sql, {**(params or {}), "_batch": n}).rowcount
+            total += cnt
+            if cnt < n:
+                break
+            if pause:
+                time.sleep(pause)
+        if total:
+            self.echo(f"   ~ {table}: {total} строк")
+        return total
+
+# --- учёт версий -----------------------------------------------------
+
+def applied_versions(engine) -> set[int]:
+    _meta.create_all(engine, tables=[schema_migrations])
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def _record(engine, mig: Migration) -> None:
+    with engine.begin() as conn:
+        conn.execute(schema_migrations.insert().values(
+            version=mig.version, name=mig.name, applied_at=datetime.utcnow()))
+
+def pending(engine) -> list[Migration]:
+    done = applied_versions(engine)
+    return [m for m in discover() if m.version not in done]
+
+def stamp_all(engine) -> None:
+    """Отмечает все миграции применёнными (для свежей БД из ``db.create_all``)."""
+    for mig in pending(engine):
+        _record(engine, mig)
+
+def upgrade(engine, *, target: int | None = None, echo=print, **ctx_options) -> list[Migration]:
+    """
+    Применяет ожидающие миграции по порядку.
+
+    Args:
+        engine: SQLAlchemy Engine
+        target: Последняя версия, которую применить (None — все)
+
+    Returns:
+        list[Migration]: Применённые миграции
+    """
+    ctx = MigrationContext(engine, echo=echo, **ctx_options)
+    done = []
+    for mig in pending(engine):
+        if target is not None and mig.version > target:
+            break
+        echo(f"🔄 {mig.version:04d} {mig.name}")
+        mig.upgrade(ctx)
+        _record(engine, mig)
+        done.append(mig)
+    return done
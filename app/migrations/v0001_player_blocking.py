@@ -0,0 +1,5 @@
+"""Поля блокировки игрока (бывший migrate_db.py)."""
+
+def upgrade(m):
+    m.add_column("players", "is_blocked", "INTEGER DEFAULT 0")
+    m.add_column("players", "blocked_reason", "VARCHAR(255)")
@@ -0,0 +1,19 @@
+"""plots.ready_at с индексом для уведомлений о созревании."""
+
+from app.logic.crops import CROP_DURATIONS
+
+def upgrade(m):
+    m.add_column("plots", "ready_at", "TIMESTAMP")
+    m.create_index("ix_plots_ready_at", "plots", "ready_at")
+
+    # ready_at = planted_at + время роста культуры
+    if m.is_postgres:
+        set_sql = "ready_at = planted_at + make_interval(secs => :sec)"
+    else:
+        set_sql = "ready_at = strftime('%Y-%m-%d %H:%M:%f', planted_at, '+' || :sec || ' seconds')"
+    for crop, ms in CROP_DURATIONS.items():
+        m.backfill(
+            "plots", set_sql,
+            "crop_key = :crop AND planted_at IS NOT NULL AND ready_at IS NULL",
+            {"crop": crop, "sec": ms / 1000},
+        )
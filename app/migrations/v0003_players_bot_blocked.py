@@ -0,0 +1,4 @@
+"""players.bot_blocked — пользователь заблокировал бота."""
+
+def upgrade(m):
+    m.add_column("players", "bot_blocked", "INTEGER DEFAULT 0")
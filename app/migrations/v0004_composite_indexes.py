@@ -0,0 +1,18 @@
+"""Составные индексы под горячие запросы, удаление избыточных.
+
+* action_logs(user_id, created_at) — покрывающий для check_rate_limit;
+  одиночный ix_action_logs_user_id становится его префиксом.
+* ix_inventories_user_id и ix_plots_user_id — префиксы уникальных
+  ограничений (user_id, item_key) и (user_id, idx).
+* uq_action_logs_id дублирует первичный ключ. На PostgreSQL снимаем
+  ограничение; в SQLite это потребовало бы пересоздания таблицы
+  (не онлайн), поэтому там оно остаётся.
+"""
+
+def upgrade(m):
+    m.create_index("ix_action_logs_user_created", "action_logs", "user_id, created_at")
+    m.drop_index("ix_action_logs_user_id", "action_logs")
+    m.drop_index("ix_inventories_user_id", "inventories")
+    m.drop_index("ix_plots_user_id", "plots")
+    if m.is_postgres:
+        m.execute("ALTER TABLE action_logs DROP CONSTRAINT IF EXISTS uq_action_logs_id")
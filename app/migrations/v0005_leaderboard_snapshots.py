@@ -0,0 +1,7 @@
+"""leaderboard_snapshots — материализованный топ рейтинга."""
+
+def upgrade(m):
+    from app.models import LeaderboardSnapshot
+    if not m.has_table("leaderboard_snapshots"):
+        LeaderboardSnapshot.__table__.create(m.engine, checkfirst=True)
+        m.echo("   + table leaderboard_snapshots")
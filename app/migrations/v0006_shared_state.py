@@ -0,0 +1,7 @@
+"""shared_state — общее KV узлов (nonce, лимиты, идемпотентность)."""
+
+def upgrade(m):
+    from app.models import SharedStateEntry
+    if not m.has_table("shared_state"):
+        SharedStateEntry.__table__.create(m.engine, checkfirst=True)
+        m.echo("   + table shared_state")
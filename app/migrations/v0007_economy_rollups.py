@@ -0,0 +1,9 @@
+"""economy_rollups, rollup_watermarks — почасовые агрегаты экономики."""
+
+def upgrade(m):
+    from app.models import EconomyRollup, RollupWatermark
+    for model in (EconomyRollup, RollupWatermark):
+        name = model.__tablename__
+        if not m.has_table(name):
+            model.__table__.create(m.engine, checkfirst=True)
+            m.echo(f"   + table {name}")
@@ -0,0 +1,34 @@
+"""balance_ledger, balance_snapshots, players.ledger_seq — журнал баланса.
+
+Игрокам, созданным до журнала, ставится снимок ``seq = 0`` с текущим
+балансом — от него журнал и считается.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import text
+
+def upgrade(m):
+    from app.models import BalanceEntry, BalanceSnapshot
+    m.add_column("players", "ledger_seq", "INTEGER DEFAULT 0")
+    for model in (BalanceEntry, BalanceSnapshot):
+        name = model.__tablename__
+        if not m.has_table(name):
+            model.__table__.create(m.engine, checkfirst=True)
+            m.echo(f"   + table {name}")
+
+    sql = text(
+        "INSERT INTO balance_snapshots (user_id, seq, balance, taken_at) "
+        "SELECT p.user_id, 0, COALESCE(p.balance, 0), :now FROM players p "
+        "WHERE NOT EXISTS (SELECT 1 FROM balance_snapshots s WHERE s.user_id = p.user_id) "
+        "ORDER BY p.user_id LIMIT :batch"
+    )
+    total = 0
+    while True:
+        with m.engine.begin() as conn:
+            n = conn.execute(sql, {"now": datetime.utcnow(), "batch": m.batch_size}).rowcount
+        total += n
+        if n < m.batch_size:
+            break
+    if total:
+        m.echo(f"   ~ balance_snapshots: {total} начальных снимков")
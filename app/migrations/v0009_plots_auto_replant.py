@@ -0,0 +1,4 @@
+"""plots.auto_replant — автопосадка на грядке."""
+
+def upgrade(m):
+    m.add_column("plots", "auto_replant", "INTEGER DEFAULT 0")
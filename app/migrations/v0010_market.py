@@ -0,0 +1,9 @@
+"""market_orders, market_trades — рынок игроков."""
+
+def upgrade(m):
+    from app.models import MarketOrder, MarketTrade
+    for model in (MarketOrder, MarketTrade):
+        name = model.__tablename__
+        if not m.has_table(name):
+            model.__table__.create(m.engine, checkfirst=True)
+            m.echo(f"   + table {name}")
@@ -0,0 +1,4 @@
+"""players.updated_at — индекс под дельту рейтинга (app/logic/leaderboard.py)."""
+
+def upgrade(m):
+    m.create_index("ix_players_updated_at", "players", "updated_at")
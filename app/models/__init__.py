@@ -8,10 +8,13 @@ from datetime import datetime, timedelta
 import secrets
 
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Integer, String, DateTime, UniqueConstraint
+from sqlalchemy import Integer, String, DateTime, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
-db = SQLAlchemy()
+from app.models.replicas import RoutingSession
+from app.utils.shared_state import get_shared_state, hit_rate_limit
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class Player(db.Model):
     """
@@ -29,6 +32,8 @@ class Player(db.Model):
     display_name: Mapped[str] = mapped_column(String(64), default="Игрок")
 
     balance: Mapped[int] = mapped_column(Integer, default=100)
+    # Номер последней записи игрока в balance_ledger (см. app/logic/ledger.py)
+    ledger_seq: Mapped[int] = mapped_column(Integer, default=0)
     fields_owned: Mapped[int] = mapped_column(Integer, default=2)
 
     level: Mapped[int] = mapped_column(Integer, default=1)
@@ -39,9 +44,13 @@ class Player(db.Model):
     
     is_blocked: Mapped[bool] = mapped_column(Integer, default=False)
     blocked_reason: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # Пользователь заблокировал бота — рассылки и уведомления ему не шлём
+    bot_blocked: Mapped[bool] = mapped_column(Integer, default=False)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Ставится при любом UPDATE строки — по нему рейтинг дочитывает дельту
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                                                 index=True)
 
     def touch(self) -> None:
         """Обновляет время последнего обновления."""
@@ -67,6 +76,81 @@ class Player(db.Model):
             "updated_at": self.updated_at.isoformat(),
         }
 
+class Broadcast(db.Model):
+    """
+    Рассылка всем игрокам.
+    
+    Хранит текст, счётчики и контрольную точку: все игроки
+    с user_id <= cursor_user_id уже обработаны.
+    """
+    __tablename__ = "broadcasts"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(String(4096), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending | running | done
+    cursor_user_id: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LeaderboardSnapshot(db.Model):
+    """
+    Материализованный топ рейтинга.
+    
+    Периодически перезаписывается из рейтинга в памяти
+    (см. ``app/logic/leaderboard.py``) — для отчётов и внешних читателей.
+    """
+    __tablename__ = "leaderboard_snapshots"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    board: Mapped[str] = mapped_column(String(16), nullable=False)  # balance | xp
+    rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (UniqueConstraint("board", "rank", name="uq_leaderboard_board_rank"),)
+
+class SharedStateEntry(db.Model):
+    """
+    Запись общего KV для ``SHARED_STATE_BACKEND=sql``.
+    
+    Nonce, счётчики лимитов, ключи идемпотентности и версии кэшей
+    всех узлов (см. ``app/utils/shared_state.py``).
+    """
+    __tablename__ = "shared_state"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    value: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, default=b"")
+    counter: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, index=True, nullable=True)
+
+class EconomyRollup(db.Model):
+    """
+    Почасовой агрегат действий из ``action_logs``.
+    
+    Ключ — ``(час, действие, предмет)``: ``sell:crop_pumpkin`` за час
+    13:00 — одна строка с числом продаж и суммой монет. Пополняется
+    инкрементально (см. ``app/logic/rollups.py``), читается ``/api/dev/stats``.
+    """
+    __tablename__ = "economy_rollups"
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)  # начало часа, UTC
+    action: Mapped[str] = mapped_column(String(32), primary_key=True)
+    item_key: Mapped[str] = mapped_column(String(64), primary_key=True, default="")  # "" — без предмета
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    coins: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class RollupWatermark(db.Model):
+    """
+    Докуда ``action_logs`` источника уже свёрнуты в ``economy_rollups``.
+    
+    Источник — шард (``main`` без шардирования), ``last_id`` — последний
+    учтённый ``action_logs.id`` на нём.
+    """
+    __tablename__ = "rollup_watermarks"
+    source: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
 class ActionNonce(db.Model):
     """
     Модель для защиты от CSRF-атак.
@@ -108,19 +192,84 @@ class ActionLog(db.Model):
     """
     __tablename__ = "action_logs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     action: Mapped[str] = mapped_column(String(50), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
-    __table_args__ = (UniqueConstraint("id", name="uq_action_logs_id"),)
+    # Покрывающий индекс для check_rate_limit: (user_id, created_at >= ...)
+    __table_args__ = (Index("ix_action_logs_user_created", "user_id", "created_at"),)
+
+class BalanceEntry(db.Model):
+    """
+    Запись журнала баланса: изменение ``Player.balance`` на ``delta``.
+    
+    Журнал только дописывается; ``seq`` — номер изменения у игрока без
+    пропусков, пишется тем же flush, что и баланс (``app/logic/ledger.py``).
+    """
+    __tablename__ = "balance_ledger"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    delta: Mapped[int] = mapped_column(Integer, nullable=False)
+    reason: Mapped[str] = mapped_column(String(32), nullable=False)  # open | buy_field | shop_buy | sell | ...
+    ref: Mapped[str | None] = mapped_column(String(64), nullable=True)  # предмет, поле и т.п.
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+class BalanceSnapshot(db.Model):
+    """
+    Баланс игрока после записи журнала ``seq``.
+    
+    Ставится каждые ``LEDGER_SNAPSHOT_EVERY`` записей: баланс на момент
+    времени — снимок плюс короткий хвост журнала после него.
+    """
+    __tablename__ = "balance_snapshots"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    balance: Mapped[int] = mapped_column(Integer, nullable=False)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+class MarketOrder(db.Model):
+    """
+    Заявка рынка игроков на покупку или продажу урожая.
+    
+    Таблица — источник правды для стакана в памяти (``app/logic/market.py``).
+    Заявка обеспечена сразу при выставлении: у продажи ``remaining``
+    урожая списан из инвентаря, у покупки ``price × remaining`` монет —
+    с баланса. Живёт в основной БД.
+    """
+    __tablename__ = "market_orders"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)  # и приоритет по времени
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    item_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    side: Mapped[str] = mapped_column(String(4), nullable=False)  # buy | sell
+    price: Mapped[int] = mapped_column(Integer, nullable=False)  # монет за штуку
+    qty: Mapped[int] = mapped_column(Integer, nullable=False)
+    remaining: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="open")  # open | filled | cancelled
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    # Сборка стакана при старте читает только открытые заявки
+    __table_args__ = (Index("ix_market_orders_status_item", "status", "item_key"),)
+
+class MarketTrade(db.Model):
+    """Сделка рынка: ``qty`` урожая по цене ``price`` между двумя заявками."""
+    __tablename__ = "market_trades"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    item_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    price: Mapped[int] = mapped_column(Integer, nullable=False)
+    qty: Mapped[int] = mapped_column(Integer, nullable=False)
+    buy_order_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    sell_order_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    buyer_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    seller_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_market_trades_item_id", "item_key", "id"),)
 
 def check_rate_limit(user_id: int, action: str, max_per_window: int = 10, window_sec: int = 5) -> bool:
-    cutoff = datetime.utcnow() - timedelta(seconds=window_sec)
-    cnt = db.session.query(ActionLog).filter(
-        ActionLog.user_id == user_id,
-        ActionLog.created_at >= cutoff,
-    ).count()
-    return cnt < max_per_window
+    # Скользящее окно в общем хранилище (SHARED_STATE_BACKEND) — одинаково на всех узлах
+    return hit_rate_limit(get_shared_state(), user_id, max_per_window, window_sec)
+
 
 class Inventory(db.Model):
     """
@@ -130,7 +279,8 @@ class Inventory(db.Model):
     """
     __tablename__ = "inventories"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    # Отдельный индекс по user_id не нужен: его покрывает uq_inventory_user_item
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     item_key: Mapped[str] = mapped_column(String(64), nullable=False)
     qty: Mapped[int] = mapped_column(Integer, default=0)
     __table_args__ = (UniqueConstraint("user_id", "item_key", name="uq_inventory_user_item"),)
@@ -152,9 +302,14 @@ class Plot(db.Model):
     """
     __tablename__ = "plots"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    # Отдельный индекс по user_id не нужен: его покрывает uq_plot_user_idx
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     idx: Mapped[int] = mapped_column(Integer, nullable=False)  # 0..15
     crop_key: Mapped[str | None] = mapped_column(String(64), nullable=True)  # "wheat"
     planted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Момент созревания (naive UTC) — для уведомлений по индексу времени
+    ready_at: Mapped[datetime | None] = mapped_column(DateTime, index=True, nullable=True)
+    # Автопосадка: после созревания урожай собирается и грядка засевается снова (app/logic/autofarm.py)
+    auto_replant: Mapped[bool] = mapped_column(Integer, default=False)
 
     __table_args__ = (UniqueConstraint("user_id", "idx", name="uq_plot_user_idx"),)
@@ -0,0 +1,266 @@
+"""Чтение с реплик БД для маршрутов только на чтение.
+
+Маршрут, помеченный ``@read_only``, выполняет запросы сессии на одной
+из реплик (``DATABASE_REPLICA_URLS``, через запятую). Запись и всё вне
+таких маршрутов идут на основную БД.
+
+Отставание реплики прячется окном «читаю свои записи»: после коммита,
+изменившего строки игрока, ключ ``ryw:<uid>`` в общем хранилище живёт
+``REPLICA_RYW_SEC`` секунд, и пока он есть, чтения этого игрока идут на
+основную БД. Коммиты без игрока в сессии (админские ``/dev/*``) ставят
+общий ключ ``ryw:-`` — его проверяют запросы без игрока.
+
+Ключи ``ryw:*`` и nonce действий читаются и пишутся на каждом запросе,
+поэтому общее хранилище не должно быть основной БД: с репликами
+``SHARED_STATE_BACKEND`` — ``redis`` (или ``memory`` в одном процессе).
+
+Реплика выводится из ротации, если не отвечает или (PostgreSQL)
+отстаёт больше ``REPLICA_MAX_LAG_SEC``; проверка — не чаще раза в
+``REPLICA_CHECK_SEC``. Если реплик нет или все недоступны — читаем с
+основной БД.
+"""
+
+from __future__ import annotations
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_app_context, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, text
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from app.models.sharding import SHARDED_TABLES, get_router
+
+log = logging.getLogger(__name__)
+
+# Отставание реплики PostgreSQL; 0, если всё полученное уже применено
+_PG_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class RoutingSession(FlaskSession):
+    """
+    Сессия Flask-SQLAlchemy с маршрутизацией запросов.
+
+    Таблицы игрока при шардировании идут на шард из ``info["shard"]``
+    (см. ``app/models/sharding.py``), остальное внутри ``@read_only`` —
+    на реплику.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and mapper is not None and get_router() is not None:
+            if sa_inspect(mapper).local_table.name in SHARDED_TABLES:
+                shard = self.info.get("shard")
+                if shard is None:
+                    raise RuntimeError("player table access without a shard: wrap it in use_shard(uid)")
+                return shard
+        replica = self.info.get("replica")
+        # flush всегда на основную БД, даже внутри @read_only
+        if replica is not None and bind is None and not self._flushing:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class _Replica:
+    __slots__ = ("url", "engine", "down_until", "checked_at")
+
+    def __init__(self, url: str, engine):
+        self.url = url
+        self.engine = engine
+        self.down_until = 0.0
+        self.checked_at = 0.0
+
+class ReplicaPool:
+    """
+    Реплики, их здоровье и окно «читаю свои записи».
+
+    Args:
+        urls: Адреса реплик
+        state: Общее хранилище (``SharedState``) для ключей ``ryw:*``
+        ryw_sec: Сколько секунд после записи игрок читает с основной БД
+        retry_sec: На сколько выводить недоступную реплику из ротации
+        check_sec: Как часто проверять реплику
+        max_lag_sec: Допустимое отставание (только PostgreSQL)
+    """
+
+    def __init__(self, urls: list[str], state, *, ryw_sec: float = 5.0, retry_sec: float = 30.0,
+                 check_sec: float = 5.0, max_lag_sec: float = 10.0, engine_options: dict | None = None):
+        self.replicas = [
+            _Replica(url, create_engine(url, pool_pre_ping=True, **(engine_options or {})))
+            for url in urls
+        ]
+        self.state = state
+        self.ryw_sec = ryw_sec
+        self.retry_sec = retry_sec
+        self.check_sec = check_sec
+        self.max_lag_sec = max_lag_sec
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {"replica": 0, "primary_ryw": 0, "primary_down": 0, "failovers": 0}
+
+    # --- здоровье ----------------------------------------------------------
+
+    def _probe(self, r: _Replica) -> bool:
+        try:
+            with r.engine.connect() as conn:
+                if r.engine.dialect.name == "postgresql":
+                    lag = float(conn.execute(_PG_LAG_SQL).scalar() or 0)
+                    if lag > self.max_lag_sec:
+                        log.warning("replica %s lags %.1fs, using primary", r.engine.url, lag)
+                        return False
+                else:
+                    conn.execute(text("SELECT 1"))
+            return True
+        except DBAPIError:
+            log.warning("replica %s is unavailable", r.engine.url, exc_info=True)
+            return False
+
+    def _healthy(self, r: _Replica, now: float) -> bool:
+        if r.down_until > now:
+            return False
+        if now - r.checked_at >= self.check_sec:
+            with self._lock:
+                if now - r.checked_at >= self.check_sec:
+                    r.checked_at = now
+                    if not self._probe(r):
+                        r.down_until = now + self.retry_sec
+                        return False
+        return True
+
+    def mark_down(self, engine) -> None:
+        for r in self.replicas:
+            if r.engine is engine:
+                r.down_until = time.monotonic() + self.retry_sec
+                r.engine.dispose()
+
+    # --- выбор ---------------------------------------------------------------
+
+    def recently_wrote(self, uid: int | None) -> bool:
+        return self.state.get(f"ryw:{uid or '-'}") is not None
+
+    def pick(self, uid: int | None):
+        """Движок реплики для чтения или None — читать с основной БД."""
+        if self.recently_wrote(uid):
+            self.stats["primary_ryw"] += 1
+            return None
+        now = time.monotonic()
+        n = len(self.replicas)
+        start = next(self._rr)
+        for i in range(n):
+            r = self.replicas[(start + i) % n]
+            if self._healthy(r, now):
+                self.stats["replica"] += 1
+                return r.engine
+        self.stats["primary_down"] += 1
+        return None
+
+    def wrote(self, uids) -> None:
+        for uid in uids:
+            self.state.set(f"ryw:{uid or '-'}", b"1", ttl=self.ryw_sec)
+
+    def dispose(self) -> None:
+        for r in self.replicas:
+            r.engine.dispose()
+
+def init_replicas(app, state) -> ReplicaPool | None:
+    urls = [u.strip() for u in app.config.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    if not urls:
+        return None
+    from app.utils.shared_state import SqlBackend
+
+    if isinstance(state, SqlBackend):
+        # Окно RYW и nonce на основной БД съели бы всю разгрузку
+        raise RuntimeError("DATABASE_REPLICA_URLS needs SHARED_STATE_BACKEND=redis (or memory for one process), not sql")
+    pool = ReplicaPool(
+        urls, state,
+        ryw_sec=app.config.get("REPLICA_RYW_SEC", 5),
+        retry_sec=app.config.get("REPLICA_RETRY_SEC", 30),
+        check_sec=app.config.get("REPLICA_CHECK_SEC", 5),
+        max_lag_sec=app.config.get("REPLICA_MAX_LAG_SEC", 10),
+        engine_options=app.config.get("SQLALCHEMY_ENGINE_OPTIONS"),
+    )
+    app.extensions["replicas"] = pool
+    return pool
+
+def _pool() -> ReplicaPool | None:
+    return current_app.extensions.get("replicas") if has_app_context() else None
+
+def _request_uid() -> int | None:
+    return flask_session.get("uid") if has_request_context() else None
+
+def read_only(view):
+    """
+    Маршрут только на чтение: запросы сессии идут на реплику.
+
+    Маршрут не должен писать через ``db.session``: flush уйдёт на основную
+    БД, но всё прочитанное до него — с реплики. Ошибка соединения с
+    репликой выводит её из ротации, и маршрут выполняется заново на
+    основной БД.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        pool = _pool()
+        engine = pool.pick(_request_uid()) if pool is not None else None
+        if engine is None:
+            return view(*args, **kwargs)
+
+        from app.models import db
+
+        db.session.info["replica"] = engine
+        try:
+            return view(*args, **kwargs)
+        except OperationalError:
+            log.warning("replica read failed, retrying on primary", exc_info=True)
+            pool.mark_down(engine)
+            pool.stats["failovers"] += 1
+            db.session.info.pop("replica", None)
+            db.session.rollback()
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop("replica", None)
+
+    return wrapper
+
+def use_primary() -> None:
+    """
+    Остаток маршрута ``@read_only`` — на основной БД.
+
+    Для маршрута, которому по прочитанному понадобилось записать:
+    прочитанное с реплики сбрасывается, дальше чтения и запись идут на
+    основную БД.
+    """
+    from app.models import db
+
+    if db.session.info.pop("replica", None) is not None:
+        db.session.rollback()
+
+# --- окно «читаю свои записи» -----------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_users(session, flush_context):
+    if _pool() is None:
+        return
+    uids = session.info.setdefault("written_uids", set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        uid = getattr(obj, "user_id", None)
+        if uid is not None:
+            uids.add(uid)
+    if has_request_context():
+        uids.add(flask_session.get("uid"))  # None — ключ ryw:- (админские /dev/*)
+
+@event.listens_for(Session, "after_commit")
+def _mark_written_users(session):
+    uids = session.info.pop("written_uids", None)
+    pool = _pool()
+    if uids and pool is not None:
+        pool.wrote(uids)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_written_users(session):
+    session.info.pop("written_uids", None)
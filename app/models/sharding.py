@@ -0,0 +1,204 @@
+"""Шардирование игроков по user_id между несколькими БД.
+
+Таблицы игрока (``SHARDED_TABLES``) живут на шарде, который выбирает
+кольцо консистентного хеширования по ``user_id``; общие таблицы
+(рассылки, снимки рейтинга, агрегаты экономики, ``shared_state``,
+``schema_migrations``) остаются в основной БД.
+
+Шарды — бинды Flask-SQLAlchemy из ``SHARD_URLS``
+(``имя=url,имя=url``) плюс основная БД под именем ``main``; в кольце —
+те, что перечислены в ``SHARDS`` (по умолчанию только ``main``). Без
+``SHARD_URLS`` шардирование выключено.
+
+Шард выбирается на единицу работы: ``use_shard(uid)`` (или
+``on_shard(имя)``) привязывает таблицы игрока в ``db.session`` к движку
+шарда. HTTP-запрос с игроком в сессии привязывается сам
+(``before_request``). Обращение к таблице игрока без выбранного шарда —
+ошибка, а не тихое чтение из основной БД. Обход всех игроков —
+``shard_names()`` + ``on_shard`` (scatter-gather).
+
+Перенос игроков при добавлении шарда — ``reshard.py``. Пока он идёт
+(ключ ``shard:resharding`` в общем хранилище), узлы сверяются с
+переопределениями ``shard:<uid>``: ``-`` — игрок переносится (ответ 503),
+имя шарда — игрок уже перенесён.
+"""
+
+from __future__ import annotations
+import bisect
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context, jsonify, session as flask_session
+
+MAIN = "main"
+SHARDED_TABLES = frozenset({"players", "plots", "inventories", "action_nonces", "action_logs",
+                            "balance_ledger", "balance_snapshots"})
+MOVING = b"-"
+
+class ShardMoving(Exception):
+    """Строки игрока сейчас переносятся на другой шард."""
+
+    def __init__(self, uid: int):
+        super().__init__(f"player {uid} is being moved between shards")
+        self.uid = uid
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования.
+
+    У каждого шарда ``vnodes`` точек на кольце; ``user_id`` принадлежит
+    шарду первой точки по часовой стрелке. При добавлении шарда
+    переезжает в среднем ``1/N`` игроков, остальные остаются на месте.
+    """
+
+    def __init__(self, shards: list[str], vnodes: int = 64):
+        if not shards:
+            raise ValueError("hash ring needs at least one shard")
+        self.shards = list(shards)
+        self.vnodes = vnodes
+        points = sorted((self._hash(f"{name}#{i}"), name) for name in self.shards for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._owners = [name for _, name in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def shard_for(self, uid: int) -> str:
+        i = bisect.bisect(self._keys, self._hash(str(uid)))
+        return self._owners[i % len(self._owners)]
+
+class ShardRouter:
+    """
+    Выбор шарда для игрока.
+
+    Args:
+        db: Экземпляр ``SQLAlchemy``
+        ring: Кольцо текущей конфигурации
+        state: Общее хранилище (переопределения на время переноса)
+        check_sec: Как часто узел проверяет, идёт ли перенос
+    """
+
+    def __init__(self, db, ring: HashRing, state, check_sec: float = 2.0):
+        self.db = db
+        self.ring = ring
+        self.state = state
+        self.check_sec = check_sec
+        self._resharding = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def names(self) -> list[str]:
+        """Все шарды: из кольца и подключённые для переноса."""
+        return [MAIN] + [k for k in self.db.engines if k is not None]
+
+    def engine(self, name: str):
+        return self.db.engines[None if name == MAIN else name]
+
+    def resharding(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_sec:
+            with self._lock:
+                if now - self._checked_at >= self.check_sec:
+                    self._resharding = self.state.get("shard:resharding") is not None
+                    self._checked_at = now
+        return self._resharding
+
+    def shard_for(self, uid: int) -> str:
+        if self.resharding():
+            moved = self.state.get(f"shard:{uid}")
+            if moved == MOVING:
+                raise ShardMoving(uid)
+            if moved:
+                return moved.decode()
+        return self.ring.shard_for(uid)
+
+def get_router(app=None) -> ShardRouter | None:
+    if app is None:
+        if not has_app_context():
+            return None
+        app = current_app
+    return app.extensions.get("shards")
+
+# --- привязка сессии к шарду ----------------------------------------------
+
+@contextmanager
+def on_shard(name: str | None):
+    """Таблицы игрока в ``db.session`` — на шарде ``name`` (None — без шардирования)."""
+    router = get_router()
+    if router is None or name is None:
+        yield
+        return
+    from app.models import db
+
+    info = db.session.info
+    prev = info.get("shard")
+    info["shard"] = router.engine(name)
+    try:
+        yield
+    finally:
+        if prev is None:
+            info.pop("shard", None)
+        else:
+            info["shard"] = prev
+
+def shard_of(uid: int) -> str | None:
+    router = get_router()
+    return router.shard_for(uid) if router is not None else None
+
+def use_shard(uid: int):
+    """
+    Привязывает сессию к шарду игрока ``uid``.
+
+    ``commit`` — внутри блока: flush выбирает движок в момент записи.
+    """
+    return on_shard(shard_of(uid))
+
+def shard_names() -> list[str | None]:
+    """Шарды для обхода всех игроков; ``[None]`` без шардирования."""
+    router = get_router()
+    return router.names() if router is not None else [None]
+
+def group_by_shard(uids) -> dict[str | None, list[int]]:
+    groups = defaultdict(list)
+    for uid in uids:
+        groups[shard_of(uid)].append(uid)
+    return groups
+
+# --- подключение к приложению -----------------------------------------------
+
+def init_sharding(app, db, state) -> ShardRouter | None:
+    """Включает шардирование, если подключены шарды (``SHARD_URLS``)."""
+    shards = [s.strip() for s in app.config.get("SHARDS", MAIN).split(",") if s.strip()]
+    if shards == [MAIN] and not app.config.get("SQLALCHEMY_BINDS"):
+        return None
+    unknown = [s for s in shards if s != MAIN and s not in app.config.get("SQLALCHEMY_BINDS", {})]
+    if unknown:
+        raise RuntimeError(f"SHARDS lists shards without SHARD_URLS entry: {unknown}")
+
+    from app.utils.shared_state import MemoryBackend
+
+    if isinstance(state, MemoryBackend):
+        # Переопределения reshard.py должны видеть все узлы
+        raise RuntimeError("sharding needs a shared SHARED_STATE_BACKEND (redis or sql), not memory")
+
+    router = ShardRouter(db, HashRing(shards, vnodes=app.config.get("SHARD_VNODES", 64)), state,
+                         check_sec=app.config.get("SHARD_CHECK_SEC", 2))
+    app.extensions["shards"] = router
+
+    @app.before_request
+    def _bind_player_shard():
+        uid = flask_session.get("uid")
+        if uid:
+            db.session.info["shard"] = router.engine(router.shard_for(uid))
+
+    @app.errorhandler(ShardMoving)
+    def _shard_moving(e):
+        resp = jsonify(ok=False, error="shard_moving")
+        resp.headers["Retry-After"] = "1"
+        return resp, 503
+
+    return router
@@ -1,16 +1,35 @@
 from __future__ import annotations
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime, timedelta, timezone
-from flask import Blueprint, request, jsonify, session, current_app
-from sqlalchemy import select
+from flask import Blueprint, Response, request, jsonify, session, current_app, stream_with_context
+from sqlalchemy import select, update
 
 from app.models import (
-    db, Player, ActionNonce, ActionLog,
+    db, Player, ActionLog,
     check_rate_limit, Plot, add_inventory, Inventory
 )
-from app.logic.crops import wheat_stage_info, crop_stage_info
+from app.models.replicas import read_only
+from app.models.sharding import on_shard, shard_names, use_shard
+from app.logic.crops import wheat_stage_info, crop_stage_info, crop_ready_at
+from app.logic import anticheat, autofarm, ledger, market, nonces, pricing, progression, rollups
+from app.logic.action_queue import DEADLOCK_RETRIES, ActionRejected, get_action_queue, is_deadlock
+from app.utils import export
+from app.utils.admin import admin_required
+from app.utils.idempotency import idempotent
 
 bp_actions = Blueprint("actions", __name__)
 
+# Лимиты действий: (запросов, за секунд)
+RATE_LIMITS = {
+    "buy_field": (6, 5),
+    "shop_buy": (8, 5),
+    "plant": (8, 5),
+    "harvest": (10, 5),
+    "sell": (8, 5),
+    "auto_replant": (8, 5),
+    "market": (8, 5),
+}
+
 # --- helpers ---------------------------------------------------------
 
 def _need_auth():
@@ -27,13 +46,7 @@ def _need_auth():
 
 def _verify_nonce(uid: int, req) -> bool:
     presented = req.headers.get("X-Action-Nonce")
-    nonce = db.session.get(ActionNonce, uid)
-    if not nonce:
-        return False
-    ok = nonce.verify_and_rotate(ttl_sec=60, presented=presented)
-    if ok:
-        db.session.commit()
-    return ok
+    return nonces.verify_and_rotate(uid, presented, ttl_sec=60) is not None
 
 def _server_now():
     return datetime.now(timezone.utc)
@@ -66,64 +79,265 @@ def _plots_payload(uid: int):
             "remaining_ms": info.get("remaining_ms"),
             "planted_at_iso": planted_utc.isoformat() if planted_utc else None,
             "planted_at_unix_ms": int(planted_utc.timestamp() * 1000) if planted_utc else None,
+            "auto_replant": bool(r.auto_replant),
         })
     return out
 
 def _state_payload(player: Player, now_ms: int):
-    nonce = db.session.get(ActionNonce, player.user_id)
+    nonce = nonces.current(player.user_id) or nonces.issue(player.user_id)
     st = player.to_public_dict()
     st["action_nonce"] = nonce.value
     st["nonce_expiry"] = nonce.expires_at.isoformat()
     st["server_time_unix_ms"] = now_ms
     return st
 
+# --- транзакции действий ---------------------------------------------
+# Каждое действие — функция fn(uid, *args, lock) -> dict: проверки,
+# затем изменения, без коммита. Коммитит _run_action: сразу в треде
+# запроса или пачкой в очереди действий (см. app/logic/action_queue.py).
+
+def _load_player(uid: int, lock: bool) -> Player:
+    q = select(Player).where(Player.user_id == uid)
+    if lock and db.session.get_bind(Player).dialect.name == "sqlite":
+        # SQLite не знает FOR UPDATE: пустой UPDATE сразу берёт блокировку
+        # записи, и всё дальнейшее в транзакции читается уже под ней
+        db.session.execute(update(Player).where(Player.user_id == uid).values(ledger_seq=Player.ledger_seq))
+    if lock:
+        q = q.with_for_update()
+    player = db.session.execute(q).scalar_one_or_none()
+    if not player:
+        raise ActionRejected("player_not_found", 404)
+    # Сначала досчитываем автопосадку: действие видит грядки и инвентарь
+    # на текущий момент, а купленные сейчас семена не уходят в прошлое
+    autofarm.settle(player, _server_now(), lock=lock)
+    return player
+
+def _load_inventory(uid: int, item_key: str, lock: bool) -> Inventory | None:
+    q = select(Inventory).where(Inventory.user_id == uid, Inventory.item_key == item_key)
+    if lock:
+        q = q.with_for_update()
+    return db.session.execute(q).scalar_one_or_none()
+
+def _load_plot(uid: int, idx: int, lock: bool) -> Plot | None:
+    q = select(Plot).where(Plot.user_id == uid, Plot.idx == idx)
+    if lock:
+        q = q.with_for_update()
+    return db.session.execute(q).scalar_one_or_none()
+
+def _check_field_access(player: Player, idx: int) -> None:
+    max_idx = min(player.fields_owned, current_app.config.get("FIELD_MAX", 16))
+    if idx < 0 or idx >= max_idx:
+        raise ActionRejected("no_field_access", 403)
+
+def _buy_field_tx(uid: int, *, lock: bool) -> dict:
+    cost = current_app.config.get("FIELD_COST", 5)
+    max_fields = current_app.config.get("FIELD_MAX", 16)
+
+    player = _load_player(uid, lock)
+    if player.fields_owned >= max_fields:
+        raise ActionRejected("max_fields")
+    if player.balance < cost:
+        raise ActionRejected("not_enough_money")
+
+    ledger.post(player, -cost, "buy_field", f"field:{player.fields_owned}")
+    player.fields_owned += 1
+    db.session.add(ActionLog(user_id=uid, action="buy_field"))
+    anticheat.note(db.session, uid, "buy_field")
+    return {"bought_index": player.fields_owned - 1}
+
+def _shop_buy_tx(uid: int, item_key: str, price: int, *, lock: bool) -> dict:
+    player = _load_player(uid, lock)
+    if player.balance < price:
+        raise ActionRejected("not_enough_money")
+
+    ledger.post(player, -price, "shop_buy", item_key)
+    add_inventory(uid, item_key, +1)
+    db.session.add(ActionLog(user_id=uid, action=f"shop_buy:{item_key}"))
+    anticheat.note(db.session, uid, "shop_buy")
+    return {}
+
+def _plant_tx(uid: int, idx: int, item_key: str, crop_type: str, now: datetime, *, lock: bool) -> dict:
+    player = _load_player(uid, lock)
+    _check_field_access(player, idx)
+
+    inv_row = _load_inventory(uid, item_key, lock)
+    if not inv_row or inv_row.qty <= 0:
+        raise ActionRejected("no_seeds")
+
+    plot = _load_plot(uid, idx, lock)
+    if plot and plot.crop_key:
+        raise ActionRejected("plot_busy")
+
+    inv_row.qty -= 1
+    if plot is None:
+        plot = Plot(user_id=uid, idx=idx, crop_key=crop_type, planted_at=now)  # aware UTC
+        db.session.add(plot)
+    else:
+        plot.crop_key = crop_type
+        plot.planted_at = now  # aware UTC
+    plot.ready_at = crop_ready_at(crop_type, now)
+    progress = progression.award(player, "plant", crop_type)
+
+    db.session.add(ActionLog(user_id=uid, action=f"plant:{crop_type}"))
+    anticheat.note(db.session, uid, "plant")
+    return {"progress": progress}
+
+def _harvest_tx(uid: int, idx: int, *, lock: bool) -> dict:
+    player = _load_player(uid, lock)
+    _check_field_access(player, idx)
+
+    plot = _load_plot(uid, idx, lock)
+    if not plot or not plot.crop_key:
+        raise ActionRejected("nothing_to_harvest")
+
+    planted_utc = _as_utc(plot.planted_at)
+    if not planted_utc:
+        raise ActionRejected("nothing_to_harvest")
+
+    # Проверяем готовность через crop_stage_info
+    crop_info = crop_stage_info(plot.crop_key, planted_utc)
+    if crop_info.get("stage") != "ready":
+        raise ActionRejected("not_ready")
+
+    # Добавляем урожай в инвентарь
+    crop_item_key = f"crop_{plot.crop_key}"
+    add_inventory(uid, crop_item_key, +1)
+
+    # Очищаем грядку
+    harvested_crop = plot.crop_key
+    plot.crop_key = None
+    plot.planted_at = None
+    plot.ready_at = None
+    progress = progression.award(player, "harvest", harvested_crop)
+    db.session.add(ActionLog(user_id=uid, action=f"harvest:{harvested_crop}"))
+    anticheat.note(db.session, uid, "harvest", ready_at_ms=crop_info.get("ready_at_unix_ms"),
+                   coins=int(current_app.config["SELL_PRICES"].get(crop_item_key, 0)))
+    return {"crop": harvested_crop, "progress": progress}
+
+def _sell_tx(uid: int, item_key: str, price: int, *, lock: bool) -> dict:
+    player = _load_player(uid, lock)
+
+    inv_row = _load_inventory(uid, item_key, lock)
+    if not inv_row or inv_row.qty <= 0:
+        raise ActionRejected("no_items")
+
+    inv_row.qty -= 1
+    ledger.post(player, price, "sell", item_key)
+    progress = progression.award(player, "sell", item_key.replace("crop_", ""))
+    db.session.add(ActionLog(user_id=uid, action=f"sell:{item_key}:{price}"))
+    anticheat.note(db.session, uid, "sell")
+    pricing.note_sale(db.session, item_key)
+    return {"progress": progress}
+
+def _settle_tx(uid: int, *, lock: bool) -> dict:
+    """Только досчёт автопосадки (его делает ``_load_player``)."""
+    _load_player(uid, lock)
+    return {}
+
+def _auto_replant_tx(uid: int, idx: int, enabled: bool, now: datetime, *, lock: bool) -> dict:
+    player = _load_player(uid, lock)
+    _check_field_access(player, idx)
+
+    plot = _load_plot(uid, idx, lock)
+    if plot is None:
+        plot = Plot(user_id=uid, idx=idx)
+        db.session.add(plot)
+    ready_at = _as_utc(plot.ready_at)
+    if enabled and not plot.auto_replant and plot.crop_key and ready_at and ready_at <= now:
+        # Урожай, созревший до включения, — один сбор, а не пропущенные циклы
+        planted = now - (ready_at - _as_utc(plot.planted_at))
+        plot.planted_at = planted
+        plot.ready_at = crop_ready_at(plot.crop_key, planted)
+    plot.auto_replant = enabled
+    db.session.add(ActionLog(user_id=uid, action=f"auto_replant:{'on' if enabled else 'off'}"))
+    # Включили на созревшей грядке — она собирается и засевается сразу
+    autofarm.settle(player, now, lock=lock)
+    return {}
+
+def _market_order_tx(uid: int, item_key: str, side: str, price: int, qty: int, *, lock: bool) -> dict:
+    market.check_available()
+    player = _load_player(uid, lock)
+    if market.open_orders(uid) >= current_app.config.get("MARKET_MAX_OPEN_ORDERS", 20):
+        raise ActionRejected("too_many_orders")
+
+    result = market.place(current_app._get_current_object(), player, item_key, side, price, qty, lock=lock)
+    db.session.add(ActionLog(user_id=uid, action=f"market_{side}:{item_key}"))
+    anticheat.note(db.session, uid, "market")
+    return result
+
+def _market_cancel_tx(uid: int, order_id: int, *, lock: bool) -> dict:
+    market.check_available()
+    player = _load_player(uid, lock)
+    result = market.cancel(player, order_id, lock=lock)
+    db.session.add(ActionLog(user_id=uid, action=f"market_cancel:{result['order']['item_key']}"))
+    return result
+
+def _run_action(uid: int, fn, *args):
+    """
+    Выполняет транзакцию действия.
+
+    Returns:
+        tuple: (результат fn, None) или (None, ответ с ошибкой)
+    """
+    if current_app.config.get("ACTION_QUEUE"):
+        fut = get_action_queue(current_app._get_current_object()).submit(uid, fn, *args)
+        try:
+            result = fut.result(timeout=current_app.config.get("ACTION_QUEUE_TIMEOUT_SEC", 30))
+        except ActionRejected as e:
+            return None, e.response()
+        except FutureTimeout:
+            return None, (jsonify(ok=False, error="queue_timeout"), 503)
+        # Коммит был в другой сессии — всё, что загружено в этой, устарело
+        db.session.expire_all()
+        return result, None
+
+    for attempt in range(DEADLOCK_RETRIES + 1):
+        try:
+            result = fn(uid, *args, lock=True)
+            db.session.commit()
+        except ActionRejected as e:
+            db.session.rollback()
+            return None, e.response()
+        except Exception as e:
+            db.session.rollback()
+            # Взаимоблокировка (встречные сделки на рынке) — повторяем транзакцию
+            if is_deadlock(e) and attempt < DEADLOCK_RETRIES:
+                continue
+            raise
+        return result, None
+
 # --- actions ---------------------------------------------------------
 
 @bp_actions.post("/action/buy_field")
+@idempotent
 def buy_field():
     uid, err = _need_auth()
     if err:
         return err
     if not _verify_nonce(uid, request):
         return jsonify(ok=False, error="bad_or_expired_nonce"), 409
-    if not check_rate_limit(uid, "buy_field", max_per_window=6, window_sec=5):
+    if not check_rate_limit(uid, "buy_field", *RATE_LIMITS["buy_field"]):
         return jsonify(ok=False, error="rate_limited"), 429
 
-    cost = current_app.config.get("FIELD_COST", 5)
-    max_fields = current_app.config.get("FIELD_MAX", 16)
-
-    try:
-        player = db.session.execute(
-            select(Player).where(Player.user_id == uid).with_for_update()
-        ).scalar_one_or_none()
-        if not player:
-            return jsonify(ok=False, error="player_not_found"), 404
-        if player.fields_owned >= max_fields:
-            return jsonify(ok=False, error="max_fields"), 400
-        if player.balance < cost:
-            return jsonify(ok=False, error="not_enough_money"), 400
-
-        player.balance -= cost
-        player.fields_owned += 1
-        db.session.add(ActionLog(user_id=uid, action="buy_field"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        raise
+    result, err = _run_action(uid, _buy_field_tx)
+    if err:
+        return err
 
     now_ms = int(_server_now().timestamp() * 1000)
+    player = db.session.get(Player, uid)
     st = _state_payload(player, now_ms)
     st["plots"] = _plots_payload(uid)
-    return jsonify(ok=True, state=st, bought_index=player.fields_owned - 1)
+    return jsonify(ok=True, state=st, bought_index=result["bought_index"])
 
 @bp_actions.post("/action/shop/buy")
+@idempotent
 def shop_buy():
     uid, err = _need_auth()
     if err:
         return err
     if not _verify_nonce(uid, request):
         return jsonify(ok=False, error="bad_or_expired_nonce"), 409
-    if not check_rate_limit(uid, "shop_buy", max_per_window=8, window_sec=5):
+    if not check_rate_limit(uid, "shop_buy", *RATE_LIMITS["shop_buy"]):
         return jsonify(ok=False, error="rate_limited"), 429
 
     data = request.get_json(silent=True) or {}
@@ -134,35 +348,24 @@ def shop_buy():
 
     price = int(catalog[item_key]["price"])
 
-    try:
-        player = db.session.execute(
-            select(Player).where(Player.user_id == uid).with_for_update()
-        ).scalar_one_or_none()
-        if not player:
-            return jsonify(ok=False, error="player_not_found"), 404
-        if player.balance < price:
-            return jsonify(ok=False, error="not_enough_money"), 400
-
-        player.balance -= price
-        add_inventory(uid, item_key, +1)
-        db.session.add(ActionLog(user_id=uid, action=f"shop_buy:{item_key}"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        raise
+    result, err = _run_action(uid, _shop_buy_tx, item_key, price)
+    if err:
+        return err
 
     now_ms = int(_server_now().timestamp() * 1000)
+    player = db.session.get(Player, uid)
     st = _state_payload(player, now_ms)
     return jsonify(ok=True, state=st, bought={"item_key": item_key, "title": catalog[item_key]["title"], "qty": 1})
 
 @bp_actions.post("/action/plant")
+@idempotent
 def plant():
     uid, err = _need_auth()
     if err:
         return err
     if not _verify_nonce(uid, request):
         return jsonify(ok=False, error="bad_or_expired_nonce"), 409
-    if not check_rate_limit(uid, "plant", max_per_window=8, window_sec=5):
+    if not check_rate_limit(uid, "plant", *RATE_LIMITS["plant"]):
         return jsonify(ok=False, error="rate_limited"), 429
 
     data = request.get_json(silent=True) or {}
@@ -185,58 +388,26 @@ def plant():
 
     now = _server_now()
 
-    try:
-        player = db.session.execute(
-            select(Player).where(Player.user_id == uid).with_for_update()
-        ).scalar_one_or_none()
-        if not player:
-            return jsonify(ok=False, error="player_not_found"), 404
-
-        max_idx = min(player.fields_owned, current_app.config.get("FIELD_MAX", 16))
-        if idx < 0 or idx >= max_idx:
-            return jsonify(ok=False, error="no_field_access"), 403
-
-        inv_row = db.session.execute(
-            select(Inventory).where(Inventory.user_id == uid, Inventory.item_key == item_key).with_for_update()
-        ).scalar_one_or_none()
-        if not inv_row or inv_row.qty <= 0:
-            return jsonify(ok=False, error="no_seeds"), 400
-
-        plot = db.session.execute(
-            select(Plot).where(Plot.user_id == uid, Plot.idx == idx).with_for_update()
-        ).scalar_one_or_none()
-        if plot and plot.crop_key:
-            return jsonify(ok=False, error="plot_busy"), 400
-
-        inv_row.qty -= 1
-        if plot is None:
-            plot = Plot(user_id=uid, idx=idx, crop_key=crop_type, planted_at=now)  # aware UTC
-            db.session.add(plot)
-        else:
-            plot.crop_key = crop_type
-            plot.planted_at = now  # aware UTC
-
-        db.session.add(ActionLog(user_id=uid, action=f"plant:{crop_type}"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        raise
+    result, err = _run_action(uid, _plant_tx, idx, item_key, crop_type, now)
+    if err:
+        return err
 
     now_ms = int(now.timestamp() * 1000)
     player = db.session.get(Player, uid)
     st = _state_payload(player, now_ms)
     st["plots"] = _plots_payload(uid)
 
-    return jsonify(ok=True, state=st, planted={"idx": idx, "crop_key": crop_type})
+    return jsonify(ok=True, state=st, planted={"idx": idx, "crop_key": crop_type}, progress=result["progress"])
 
 @bp_actions.post("/action/harvest")
+@idempotent
 def harvest():
     uid, err = _need_auth()
     if err:
         return err
     if not _verify_nonce(uid, request):
         return jsonify(ok=False, error="bad_or_expired_nonce"), 409
-    if not check_rate_limit(uid, "harvest", max_per_window=10, window_sec=5):
+    if not check_rate_limit(uid, "harvest", *RATE_LIMITS["harvest"]):
         return jsonify(ok=False, error="rate_limited"), 429
 
     data = request.get_json(silent=True) or {}
@@ -247,94 +418,143 @@ def harvest():
 
     now = _server_now()
 
-    try:
-        player = db.session.execute(
-            select(Player).where(Player.user_id == uid).with_for_update()
-        ).scalar_one_or_none()
-        if not player:
-            return jsonify(ok=False, error="player_not_found"), 404
-
-        max_idx = min(player.fields_owned, current_app.config.get("FIELD_MAX", 16))
-        if idx < 0 or idx >= max_idx:
-            return jsonify(ok=False, error="no_field_access"), 403
-
-        plot = db.session.execute(
-            select(Plot).where(Plot.user_id == uid, Plot.idx == idx).with_for_update()
-        ).scalar_one_or_none()
-        if not plot or not plot.crop_key:
-            return jsonify(ok=False, error="nothing_to_harvest"), 400
-
-        planted_utc = _as_utc(plot.planted_at)
-        if not planted_utc:
-            return jsonify(ok=False, error="nothing_to_harvest"), 400
-
-        # Проверяем готовность через crop_stage_info
-        crop_info = crop_stage_info(plot.crop_key, planted_utc)
-        if crop_info.get("stage") != "ready":
-            return jsonify(ok=False, error="not_ready"), 400
-
-        # Добавляем урожай в инвентарь
-        crop_item_key = f"crop_{plot.crop_key}"
-        add_inventory(uid, crop_item_key, +1)
-        
-        # Очищаем грядку
-        harvested_crop = plot.crop_key
-        plot.crop_key = None
-        plot.planted_at = None
-        db.session.add(ActionLog(user_id=uid, action=f"harvest:{harvested_crop}"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        raise
+    result, err = _run_action(uid, _harvest_tx, idx)
+    if err:
+        return err
 
+    harvested_crop = result["crop"]
     now_ms = int(now.timestamp() * 1000)
     player = db.session.get(Player, uid)
     st = _state_payload(player, now_ms)
     st["plots"] = _plots_payload(uid)
-    return jsonify(ok=True, state=st, harvested={"idx": idx, "item_key": f"crop_{harvested_crop}", "qty": 1})
+    return jsonify(ok=True, state=st, harvested={"idx": idx, "item_key": f"crop_{harvested_crop}", "qty": 1},
+                   progress=result["progress"])
 
 @bp_actions.post("/action/sell")
+@idempotent
 def sell():
     uid, err = _need_auth()
     if err:
         return err
     if not _verify_nonce(uid, request):
         return jsonify(ok=False, error="bad_or_expired_nonce"), 409
-    if not check_rate_limit(uid, "sell", max_per_window=8, window_sec=5):
+    if not check_rate_limit(uid, "sell", *RATE_LIMITS["sell"]):
         return jsonify(ok=False, error="rate_limited"), 429
 
     data = request.get_json(silent=True) or {}
     item_key = data.get("item_key")
-    sell_prices = current_app.config["SELL_PRICES"]
-    if item_key not in sell_prices:
+    cfg = current_app.config
+    if item_key not in cfg["SELL_PRICES"]:
         return jsonify(ok=False, error="cannot_sell_item"), 400
 
-    price = int(sell_prices[item_key])
+    # Текущая цена из памяти процесса; в журнал баланса попадёт она же
+    price = pricing.get_prices(current_app._get_current_object()).price(cfg, item_key)
+
+    result, err = _run_action(uid, _sell_tx, item_key, price)
+    if err:
+        return err
+
+    now_ms = int(_server_now().timestamp() * 1000)
+    player = db.session.get(Player, uid)
+    st = _state_payload(player, now_ms)
+    return jsonify(ok=True, state=st, sold={"item_key": item_key, "price": price, "qty": 1}, progress=result["progress"])
+
+@bp_actions.post("/action/auto_replant")
+@idempotent
+def auto_replant():
+    uid, err = _need_auth()
+    if err:
+        return err
+    if not _verify_nonce(uid, request):
+        return jsonify(ok=False, error="bad_or_expired_nonce"), 409
+    if not check_rate_limit(uid, "auto_replant", *RATE_LIMITS["auto_replant"]):
+        return jsonify(ok=False, error="rate_limited"), 429
 
+    data = request.get_json(silent=True) or {}
     try:
-        player = db.session.execute(
-            select(Player).where(Player.user_id == uid).with_for_update()
-        ).scalar_one_or_none()
-        if not player:
-            return jsonify(ok=False, error="player_not_found"), 404
-
-        inv_row = db.session.execute(
-            select(Inventory).where(Inventory.user_id == uid, Inventory.item_key == item_key).with_for_update()
-        ).scalar_one_or_none()
-        if not inv_row or inv_row.qty <= 0:
-            return jsonify(ok=False, error="no_items"), 400
-
-        inv_row.qty -= 1
-        player.balance += price
-        db.session.add(ActionLog(user_id=uid, action=f"sell:{item_key}"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        raise
+        idx = int(data.get("idx"))
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error="bad_index"), 400
+    enabled = bool(data.get("enabled", True))
+
+    now = _server_now()
+
+    result, err = _run_action(uid, _auto_replant_tx, idx, enabled, now)
+    if err:
+        return err
+
+    now_ms = int(now.timestamp() * 1000)
+    player = db.session.get(Player, uid)
+    st = _state_payload(player, now_ms)
+    st["plots"] = _plots_payload(uid)
+    return jsonify(ok=True, state=st, auto_replant={"idx": idx, "enabled": enabled})
+
+def _market_order_args(data, cfg):
+    """Проверка заявки рынка: (item_key, side, price, qty) или ActionRejected."""
+    item_key = data.get("item_key")
+    if not isinstance(item_key, str) or not item_key.startswith("crop_") or item_key not in cfg["SELL_PRICES"]:
+        raise ActionRejected("unknown_item")
+    side = data.get("side")
+    if side not in market.SIDES:
+        raise ActionRejected("bad_side")
+    try:
+        price, qty = int(data.get("price")), int(data.get("qty", 1))
+    except (TypeError, ValueError):
+        raise ActionRejected("bad_order")
+    if not 1 <= price <= cfg["MARKET_MAX_PRICE"] or not 1 <= qty <= cfg["MARKET_MAX_QTY"]:
+        raise ActionRejected("bad_order")
+    return item_key, side, price, qty
+
+@bp_actions.post("/action/market/order")
+@idempotent
+def market_order():
+    uid, err = _need_auth()
+    if err:
+        return err
+    if not _verify_nonce(uid, request):
+        return jsonify(ok=False, error="bad_or_expired_nonce"), 409
+    if not check_rate_limit(uid, "market", *RATE_LIMITS["market"]):
+        return jsonify(ok=False, error="rate_limited"), 429
+
+    try:
+        args = _market_order_args(request.get_json(silent=True) or {}, current_app.config)
+    except ActionRejected as e:
+        return e.response()
+
+    result, err = _run_action(uid, _market_order_tx, *args)
+    if err:
+        return err
 
     now_ms = int(_server_now().timestamp() * 1000)
+    player = db.session.get(Player, uid)
     st = _state_payload(player, now_ms)
-    return jsonify(ok=True, state=st, sold={"item_key": item_key, "price": price, "qty": 1})
+    return jsonify(ok=True, state=st, order=result["order"], trades=result["trades"])
+
+@bp_actions.post("/action/market/cancel")
+@idempotent
+def market_cancel():
+    uid, err = _need_auth()
+    if err:
+        return err
+    if not _verify_nonce(uid, request):
+        return jsonify(ok=False, error="bad_or_expired_nonce"), 409
+    if not check_rate_limit(uid, "market", *RATE_LIMITS["market"]):
+        return jsonify(ok=False, error="rate_limited"), 429
+
+    data = request.get_json(silent=True) or {}
+    try:
+        order_id = int(data.get("order_id"))
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error="bad_order"), 400
+
+    result, err = _run_action(uid, _market_cancel_tx, order_id)
+    if err:
+        return err
+
+    now_ms = int(_server_now().timestamp() * 1000)
+    player = db.session.get(Player, uid)
+    st = _state_payload(player, now_ms)
+    return jsonify(ok=True, state=st, order=result["order"])
 
 @bp_actions.post("/action/dev/add_wheat")
 def dev_add_wheat():
@@ -343,61 +563,207 @@ def dev_add_wheat():
     quantity = int(data.get("quantity", 100))
     user_id = int(data.get("user_id", 1))  # По умолчанию первый игрок
     
-    try:
-        player = db.session.get(Player, user_id)
-        if not player:
-            # Создаем тестового игрока если не существует
-            player = Player(
-                user_id=user_id,
-                username="test_player",
-                display_name="Тестовый игрок",
-                balance=1000
-            )
-            db.session.add(player)
+    with use_shard(user_id):
+        try:
+            player = db.session.get(Player, user_id)
+            if not player:
+                # Создаем тестового игрока если не существует
+                player = Player(
+                    user_id=user_id,
+                    username="test_player",
+                    display_name="Тестовый игрок",
+                    balance=1000
+                )
+                db.session.add(player)
             
-        add_inventory(user_id, "crop_wheat", quantity)
-        db.session.commit()
+            add_inventory(user_id, "crop_wheat", quantity)
+            db.session.commit()
         
-        return jsonify(ok=True, message=f"Добавлено {quantity} пшеницы игроку {player.display_name}")
-    except Exception as e:
-        db.session.rollback()
-        return jsonify(ok=False, error=str(e)), 500
+            return jsonify(ok=True, message=f"Добавлено {quantity} пшеницы игроку {player.display_name}")
+        except Exception as e:
+            db.session.rollback()
+            return jsonify(ok=False, error=str(e)), 500
 
 @bp_actions.get("/dev/players")
+@read_only
 def dev_get_players():
     """Получает список всех игроков для админ панели"""
     try:
-        players = db.session.query(Player).all()
+        # Scatter-gather: игроки со всех шардов
         players_data = []
+        for shard in shard_names():
+            with on_shard(shard):
+                players = db.session.query(Player).all()
         
-        for player in players:
-            # Получаем инвентарь игрока
-            inventory = db.session.query(Inventory).filter_by(user_id=player.user_id).all()
-            inventory_data = {}
-            for item in inventory:
-                item_name = {
-                    "seed_wheat": "Семена",
-                    "crop_wheat": "Пшеница"
-                }.get(item.item_key, item.item_key)
-                inventory_data[item_name] = item.qty
+                for player in players:
+                    # Получаем инвентарь игрока
+                    inventory = db.session.query(Inventory).filter_by(user_id=player.user_id).all()
+                    inventory_data = {}
+                    for item in inventory:
+                        item_name = {
+                            "seed_wheat": "Семена",
+                            "crop_wheat": "Пшеница"
+                        }.get(item.item_key, item.item_key)
+                        inventory_data[item_name] = item.qty
             
-            players_data.append({
-                "user_id": player.user_id,
-                "display_name": player.display_name,
-                "username": player.username,
-                "balance": player.balance,
-                "fields_owned": player.fields_owned,
-                "level": player.level,
-                "inventory": inventory_data,
-                "is_blocked": bool(player.is_blocked),
-                "blocked_reason": player.blocked_reason,
-                "created_at": player.created_at.strftime("%d.%m.%Y %H:%M") if player.created_at else "Неизвестно"
-            })
+                    players_data.append({
+                        "user_id": player.user_id,
+                        "display_name": player.display_name,
+                        "username": player.username,
+                        "balance": player.balance,
+                        "fields_owned": player.fields_owned,
+                        "level": player.level,
+                        "inventory": inventory_data,
+                        "is_blocked": bool(player.is_blocked),
+                        "blocked_reason": player.blocked_reason,
+                        "created_at": player.created_at.strftime("%d.%m.%Y %H:%M") if player.created_at else "Неизвестно"
+                    })
         
+        players_data.sort(key=lambda p: p["user_id"])
         return jsonify(ok=True, players=players_data)
     except Exception as e:
         return jsonify(ok=False, error=str(e)), 500
 
+@bp_actions.get("/dev/export/<table>")
+@admin_required
+def dev_export(table):
+    """Потоковая выгрузка action_logs / players / inventories для админ панели"""
+    args = request.args
+    fmt = args.get("format", "ndjson")
+    try:
+        user_id = int(args["user_id"]) if args.get("user_id") else None
+        batch = max(1, min(int(args.get("batch", export.DEFAULT_BATCH)), 10_000))
+    except ValueError:
+        return jsonify(ok=False, error="bad_params"), 400
+    try:
+        chunks = export.stream(table, fmt, user_id=user_id, since=args.get("since"),
+                               until=args.get("until"), batch=batch)
+    except export.ExportError as e:
+        return jsonify(ok=False, error=str(e)), 400
+
+    return Response(
+        stream_with_context(chunks),
+        content_type=export.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
+    )
+
+def _stats_window(args):
+    """Окно ``[since, until)`` из ``hours`` (по умолчанию сутки) или ``since``/``until`` (ISO)."""
+    max_hours = current_app.config.get("ROLLUP_MAX_HOURS", 24 * 90)
+    until = datetime.fromisoformat(args["until"]) if args.get("until") else datetime.utcnow()
+    if args.get("since"):
+        since = datetime.fromisoformat(args["since"])
+    else:
+        since = until - timedelta(hours=int(args.get("hours", 24)))
+    until, since = until.replace(tzinfo=None), since.replace(tzinfo=None)
+    if since >= until or until - since > timedelta(hours=max_hours):
+        raise ValueError("bad window")
+    return since, until
+
+@bp_actions.get("/dev/stats")
+@admin_required
+@read_only
+def dev_stats():
+    """Экономика за окно из почасовых агрегатов: сколько и на сколько монет по действиям и предметам"""
+    args = request.args
+    try:
+        since, until = _stats_window(args)
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error="bad_params"), 400
+
+    rows = rollups.totals(since, until, action=args.get("action"), item_key=args.get("item_key"))
+    coins_in = sum(r["coins"] for r in rows if r["action"] in rollups.INCOME_ACTIONS)
+    coins_out = sum(r["coins"] for r in rows if r["action"] not in rollups.INCOME_ACTIONS)
+    return jsonify(ok=True, since=since.isoformat(), until=until.isoformat(), rows=rows,
+                   coins_in=coins_in, coins_out=coins_out, watermarks=rollups.watermarks())
+
+@bp_actions.get("/dev/stats/hourly")
+@admin_required
+@read_only
+def dev_stats_hourly():
+    """Почасовой ряд по агрегатам (для графиков); фильтры action / item_key"""
+    args = request.args
+    try:
+        since, until = _stats_window(args)
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error="bad_params"), 400
+
+    rows = rollups.totals(since, until, action=args.get("action"), item_key=args.get("item_key"),
+                          by_hour=True)
+    return jsonify(ok=True, since=since.isoformat(), until=until.isoformat(), rows=rows)
+
+@bp_actions.get("/dev/ledger/<int:user_id>")
+@admin_required
+def dev_ledger(user_id):
+    """Журнал баланса игрока: последние записи и баланс на момент ?at= (ISO, UTC)"""
+    try:
+        at = datetime.fromisoformat(request.args["at"]).replace(tzinfo=None) if request.args.get("at") else None
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        return jsonify(ok=False, error="bad_params"), 400
+
+    with use_shard(user_id):
+        player = db.session.get(Player, user_id)
+        if not player:
+            return jsonify(ok=False, error="Игрок не найден"), 404
+        rows = [
+            {"seq": e.seq, "delta": e.delta, "reason": e.reason, "ref": e.ref,
+             "created_at": e.created_at.isoformat()}
+            for e in ledger.entries(user_id, limit)
+        ]
+        return jsonify(ok=True, user_id=user_id, balance=player.balance,
+                       balance_at=ledger.balance_at(user_id, at), at=at.isoformat() if at else None,
+                       entries=rows)
+
+@bp_actions.get("/dev/anticheat")
+@admin_required
+def dev_anticheat():
+    """Последние срабатывания анти-чита этого процесса"""
+    return jsonify(ok=True, flags=anticheat.recent_flags()[::-1])
+
+@bp_actions.get("/dev/profiler")
+@admin_required
+def dev_profiler():
+    """Настройки профилирования и последние профили этого процесса"""
+    profiler = current_app.extensions["profiler"]
+    return jsonify(ok=True, settings=profiler.current(),
+                   profiles=[p.summary() for p in reversed(profiler.profiles)])
+
+@bp_actions.post("/dev/profiler")
+@admin_required
+def dev_profiler_configure():
+    """Включает/выключает профилирование на всех узлах: sample_pct, endpoint, user_id, duration_min"""
+    data = request.get_json(silent=True) or {}
+    profiler = current_app.extensions["profiler"]
+    if not data.get("enabled"):
+        profiler.configure(None)
+        return jsonify(ok=True, settings=None)
+    try:
+        settings = {
+            "sample_pct": max(0.0, min(float(data.get("sample_pct") or 0), 100.0)),
+            "endpoint": (data.get("endpoint") or "").strip() or None,
+            "user_id": int(data["user_id"]) if data.get("user_id") else None,
+        }
+        duration_min = max(1.0, min(float(data.get("duration_min") or 10), 24 * 60))
+    except (TypeError, ValueError):
+        return jsonify(ok=False, error="bad_params"), 400
+    if not (settings["sample_pct"] or settings["endpoint"] or settings["user_id"]):
+        return jsonify(ok=False, error="nothing_to_profile"), 400
+    profiler.configure(settings, duration_sec=duration_min * 60)
+    return jsonify(ok=True, settings=settings)
+
+@bp_actions.get("/dev/profiler/<int:pid>")
+@admin_required
+def dev_profile(pid):
+    """Профиль запроса: стеки и SQL; ?format=collapsed — стеки для flamegraph.pl / speedscope"""
+    profile = current_app.extensions["profiler"].get(pid)
+    if profile is None:
+        return jsonify(ok=False, error="not_found"), 404
+    if request.args.get("format") == "collapsed":
+        return Response(profile.collapsed(), content_type="text/plain; charset=utf-8",
+                        headers={"Content-Disposition": f'attachment; filename="profile-{pid}.txt"'})
+    return jsonify(ok=True, profile=profile.to_dict())
+
 @bp_actions.post("/dev/block_user")
 def dev_block_user():
     """Блокирует пользователя"""
@@ -405,20 +771,21 @@ def dev_block_user():
     user_id = int(data.get("user_id"))
     reason = data.get("reason", "Заблокирован администратором")
     
-    try:
-        player = db.session.get(Player, user_id)
-        if not player:
-            return jsonify(ok=False, error="Игрок не найден"), 404
+    with use_shard(user_id):
+        try:
+            player = db.session.get(Player, user_id)
+            if not player:
+                return jsonify(ok=False, error="Игрок не найден"), 404
             
-        player.is_blocked = True
-        player.blocked_reason = reason
-        player.touch()
-        db.session.commit()
+            player.is_blocked = True
+            player.blocked_reason = reason
+            player.touch()
+            db.session.commit()
         
-        return jsonify(ok=True, message=f"Игрок {player.display_name} заблокирован")
-    except Exception as e:
-        db.session.rollback()
-        return jsonify(ok=False, error=str(e)), 500
+            return jsonify(ok=True, message=f"Игрок {player.display_name} заблокирован")
+        except Exception as e:
+            db.session.rollback()
+            return jsonify(ok=False, error=str(e)), 500
 
 @bp_actions.post("/dev/unblock_user")
 def dev_unblock_user():
@@ -426,17 +793,19 @@ def dev_unblock_user():
     data = request.get_json(silent=True) or {}
     user_id = int(data.get("user_id"))
     
-    try:
-        player = db.session.get(Player, user_id)
-        if not player:
-            return jsonify(ok=False, error="Игрок не найден"), 404
+    with use_shard(user_id):
+        try:
+            player = db.session.get(Player, user_id)
+            if not player:
+                return jsonify(ok=False, error="Игрок не найден"), 404
             
-        player.is_blocked = False
-        player.blocked_reason = None
-        player.touch()
-        db.session.commit()
+            player.is_blocked = False
+            player.blocked_reason = None
+            player.touch()
+            db.session.commit()
+            anticheat.forget(user_id)
         
-        return jsonify(ok=True, message=f"Игрок {player.display_name} разблокирован")
-    except Exception as e:
-        db.session.rollback()
-        return jsonify(ok=False, error=str(e)), 500
+            return jsonify(ok=True, message=f"Игрок {player.display_name} разблокирован")
+        except Exception as e:
+            db.session.rollback()
+            return jsonify(ok=False, error=str(e)), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, session, current_app
 from app.utils.tg_auth import verify_init_data_ed25519, TgAuthError
 from app.models import db, Player
+from app.models.sharding import use_shard
 
 bp_auth = Blueprint("auth", __name__)
 
@@ -25,32 +26,33 @@ def validate():
     uid = int(u["id"])
     display_name = u.get("first_name") or u.get("username") or "Игрок"
 
-    player = db.session.get(Player, uid)
-    if player is None:
-        player = Player(
-            user_id=uid,
-            username=u.get("username"),
-            first_name=u.get("first_name"),
-            last_name=u.get("last_name"),
-            display_name=display_name,
-            balance=100,
-            fields_owned=2,
-        )
-        db.session.add(player)
-    else:
-        player.username = u.get("username")
-        player.first_name = u.get("first_name")
-        player.last_name = u.get("last_name")
-        player.display_name = display_name
-        player.touch()
-    db.session.commit()
-
-    # Проверяем, не заблокирован ли игрок
-    if player.is_blocked:
-        return jsonify(ok=False, error="user_blocked", blocked_reason=player.blocked_reason or "Аккаунт заблокирован"), 403
-
-    session.clear()
-    session.permanent = True
-    session["uid"] = uid
-
-    return jsonify(ok=True, player=player.to_public_dict())
+    with use_shard(uid):
+        player = db.session.get(Player, uid)
+        if player is None:
+            player = Player(
+                user_id=uid,
+                username=u.get("username"),
+                first_name=u.get("first_name"),
+                last_name=u.get("last_name"),
+                display_name=display_name,
+                balance=100,
+                fields_owned=2,
+            )
+            db.session.add(player)
+        else:
+            player.username = u.get("username")
+            player.first_name = u.get("first_name")
+            player.last_name = u.get("last_name")
+            player.display_name = display_name
+            player.touch()
+        db.session.commit()
+
+        # Проверяем, не заблокирован ли игрок
+        if player.is_blocked:
+            return jsonify(ok=False, error="user_blocked", blocked_reason=player.blocked_reason or "Аккаунт заблокирован"), 403
+
+        session.clear()
+        session.permanent = True
+        session["uid"] = uid
+
+        return jsonify(ok=True, player=player.to_public_dict())
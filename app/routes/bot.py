@@ -0,0 +1,51 @@
+import hmac
+import threading
+from flask import Blueprint, request, jsonify, current_app
+
+from app.bot.webhook import WebhookDispatcher, BUSY
+from app.utils.shared_state import get_shared_state
+
+bp_bot = Blueprint("bot", __name__)
+
+_lock = threading.Lock()
+
+def _dispatcher() -> WebhookDispatcher:
+    # Создаём лениво: у каждого воркера gunicorn (после fork) свой тред с loop
+    disp = current_app.extensions.get("bot_webhook")
+    if disp is None:
+        with _lock:
+            disp = current_app.extensions.get("bot_webhook")
+            if disp is None:
+                from app.bot.handlers import build_application
+                cfg = current_app.config
+                application = build_application(cfg["BOT_TOKEN"], cfg["WEBAPP_URL"], polling=False,
+                                                base_url=cfg.get("BOT_API_BASE_URL") or None)
+                disp = WebhookDispatcher(application, workers=cfg["BOT_WEBHOOK_WORKERS"],
+                                         queue_size=cfg["BOT_WEBHOOK_QUEUE"], state=get_shared_state(),
+                                         dedup_ttl=cfg["BOT_WEBHOOK_DEDUP_SEC"])
+                disp.start(timeout=cfg["BOT_WEBHOOK_START_TIMEOUT_SEC"])
+                current_app.extensions["bot_webhook"] = disp
+    return disp
+
+@bp_bot.post("/webhook")
+def webhook():
+    secret = current_app.config.get("BOT_WEBHOOK_SECRET", "")
+    presented = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not hmac.compare_digest(presented, secret):
+        return jsonify(ok=False, error="forbidden"), 403
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "update_id" not in data:
+        return jsonify(ok=False, error="bad_update"), 400
+
+    try:
+        disp = _dispatcher()
+    except Exception:
+        # Бот не поднялся (токен, сеть) — Telegram повторит доставку, а мы попробуем снова
+        current_app.logger.exception("bot webhook: dispatcher failed to start")
+        return jsonify(ok=False, error="bot_unavailable"), 503
+
+    res = disp.submit(data)
+    if res == BUSY:
+        return jsonify(ok=False, error="busy"), 503
+    return jsonify(ok=True, status=res)
@@ -1,14 +1,15 @@
 from flask import Blueprint, render_template, current_app as app
+from app.utils.page_cache import render_cached
 
 bp_main = Blueprint("main", __name__)
 
 @bp_main.route("/")
 def index():
-    return render_template("index.html", v=app.config.get("START_TIME", "dev"))
+    return render_cached("index.html", v=app.config.get("START_TIME", "dev"))
 
 @bp_main.route("/farm")
 def farm():
-    return render_template("farm.html", v=app.config.get("START_TIME", "dev"))
+    return render_cached("farm.html", v=app.config.get("START_TIME", "dev"))
 
 @bp_main.route("/admin/testing/tools")
 def dev_tools():
@@ -16,4 +17,4 @@ def dev_tools():
 
 @bp_main.route("/blocked")
 def blocked():
-    return render_template("blocked.html", v=app.config.get("START_TIME", "dev"))
+    return render_cached("blocked.html", v=app.config.get("START_TIME", "dev"))
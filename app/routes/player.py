@@ -1,10 +1,16 @@
 # app/routes/player.py
 from __future__ import annotations
 from datetime import datetime, timezone
-from flask import Blueprint, jsonify, session
+from flask import Blueprint, Response, current_app, jsonify, request, session
 
-from app.models import db, Player, ActionNonce, Plot, Inventory
+from sqlalchemy import select
+
+from app.models import db, MarketOrder, Player, Plot, Inventory
+from app.models.replicas import read_only, use_primary
+from app.logic import market, nonces, pricing
 from app.logic.crops import wheat_stage_info, crop_stage_info
+from app.logic.leaderboard import BOARDS, get_leaderboard
+from app.routes.actions import _run_action, _settle_tx
 
 bp_player = Blueprint("player", __name__)
 
@@ -18,6 +24,7 @@ def _as_utc(dt):
     return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
 
 @bp_player.get("/state")
+@read_only
 def state():
     uid = session.get("uid")
     if not uid:
@@ -28,10 +35,20 @@ def state():
         return jsonify(ok=False, error="player_not_found"), 404
 
     # выдаём/обновляем nonce
-    nonce = ActionNonce.issue_for(uid, ttl_sec=60)
+    nonce = nonces.issue(uid, ttl_sec=60)
 
     # собираем грядки с таймерами
     rows = db.session.query(Plot).filter_by(user_id=uid).all()
+    now = datetime.now(timezone.utc)
+    if any(r.auto_replant and r.ready_at and _as_utc(r.ready_at) <= now for r in rows):
+        # Автопосадка созрела — досчитываем как действие (блокировка строки
+        # игрока, очередь действий при ACTION_QUEUE) и читаем заново
+        use_primary()
+        _, err = _run_action(uid, _settle_tx)
+        if err:
+            return err
+        player = db.session.get(Player, uid)
+        rows = db.session.query(Plot).filter_by(user_id=uid).all()
     plots = []
     for r in rows:
         planted_utc = _as_utc(r.planted_at)
@@ -48,11 +65,9 @@ def state():
             "remaining_ms": info.get("remaining_ms"),
             "planted_at_iso": planted_utc.isoformat() if planted_utc else None,
             "planted_at_unix_ms": int(planted_utc.timestamp() * 1000) if planted_utc else None,
+            "auto_replant": bool(r.auto_replant),
         })
 
-    # фиксируем потенциальные изменения от issue_for
-    db.session.commit()
-
     st = player.to_public_dict()
     st["action_nonce"] = nonce.value
     st["nonce_expiry"] = nonce.expires_at.isoformat()
@@ -62,6 +77,7 @@ def state():
     return jsonify(ok=True, state=st)
 
 @bp_player.get("/inventory")
+@read_only
 def inventory():
     uid = session.get("uid")
     if not uid:
@@ -70,3 +86,64 @@ def inventory():
     rows = db.session.query(Inventory).filter_by(user_id=uid).all()
     items = [{"item_key": r.item_key, "qty": r.qty} for r in rows]
     return jsonify(ok=True, inventory=items)
+
+def _board_arg():
+    board = request.args.get("board", "balance")
+    return board if board in BOARDS else None
+
+@bp_player.get("/leaderboard")
+def leaderboard():
+    """Топ игроков из рейтинга в памяти — без запросов к players."""
+    board = _board_arg()
+    if board is None:
+        return jsonify(ok=False, error="bad_board"), 400
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return jsonify(ok=False, error="bad_limit"), 400
+    limit = max(1, min(limit, current_app.config["LEADERBOARD_MAX_LIMIT"]))
+
+    lb = get_leaderboard(current_app._get_current_object())
+    return jsonify(ok=True, board=board, top=lb.top(board, limit))
+
+@bp_player.get("/leaderboard/me")
+def leaderboard_me():
+    """Место текущего игрока: O(log n) по skip list."""
+    uid = session.get("uid")
+    if not uid:
+        return jsonify(ok=False, error="unauthorized"), 401
+    board = _board_arg()
+    if board is None:
+        return jsonify(ok=False, error="bad_board"), 400
+
+    lb = get_leaderboard(current_app._get_current_object())
+    return jsonify(ok=True, board=board, **lb.me(board, uid))
+
+@bp_player.get("/prices")
+def prices():
+    """Текущие цены продажи: готовый JSON из памяти, пересчёт раз в PRICE_CACHE_SEC."""
+    _, body = pricing.get_prices(current_app._get_current_object()).table(current_app.config)
+    return Response(body, mimetype="application/json")
+
+@bp_player.get("/market/<item_key>")
+@read_only
+def market_book(item_key):
+    """Стакан предмета из памяти и последние сделки."""
+    if item_key not in current_app.config["SELL_PRICES"] or not item_key.startswith("crop_"):
+        return jsonify(ok=False, error="unknown_item"), 400
+    book = market.get_market(current_app._get_current_object())
+    depth = book.depth(item_key, current_app.config["MARKET_DEPTH_LEVELS"])
+    return jsonify(ok=True, item_key=item_key, **depth, trades=market.recent_trades(item_key))
+
+@bp_player.get("/market/orders")
+@read_only
+def market_my_orders():
+    """Открытые заявки текущего игрока."""
+    uid = session.get("uid")
+    if not uid:
+        return jsonify(ok=False, error="unauthorized"), 401
+    rows = db.session.execute(
+        select(MarketOrder).where(MarketOrder.user_id == uid, MarketOrder.status == "open")
+        .order_by(MarketOrder.id)
+    ).scalars().all()
+    return jsonify(ok=True, orders=[market.order_public(o) for o in rows])
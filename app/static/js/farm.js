@@ -84,6 +84,10 @@
   // ===== Toasts
   const toastQueue = [];
   let toastShowing = false;
+  function showLevelUp(progress) {
+    if (progress && progress.level_up) showToast(`Новый уровень: ${progress.level}!`, "success", 2000);
+  }
+
   function showToast(text, type = "info", duration = 1200) {
     toastQueue.push({ text, type, duration });
     if (!toastShowing) pumpToast();
@@ -221,11 +225,29 @@
   // визуал тайла, таймер, и кнопка «Собрать»
   function applyPlotVisual(tileEl, plotObj) {
     tileEl.innerHTML = "";
+    tileEl.dataset.auto = plotObj && plotObj.auto_replant ? "1" : "0";
     if (plotObj && plotObj.crop_key) {
       tileEl.classList.add(`planted-${plotObj.crop_key}`);
       if (plotObj.stage) tileEl.classList.add(`stage-${plotObj.stage}`);
 
+      const auto = document.createElement("button");
+      auto.className = plotObj.auto_replant ? "auto-btn on" : "auto-btn";
+      auto.textContent = "🔁";
+      auto.title = plotObj.auto_replant ? "Автопосадка включена" : "Автопосадка выключена";
+      auto.addEventListener("click", (e) => {
+        e.stopPropagation();
+        toggleAutoReplant(tileEl.dataset.index|0, !plotObj.auto_replant);
+      });
+      tileEl.appendChild(auto);
+
       const remain = computeRemainMs(plotObj);
+      if (remain !== null && remain <= 0 && plotObj.auto_replant) {
+        // созревшую автопосадку досчитывает сервер при чтении состояния
+        tileEl.classList.remove("stage-sprout","stage-young","stage-mature");
+        tileEl.classList.add("stage-ready");
+        setTimeout(() => fetchState(true), 1000);
+        return;
+      }
       if (remain !== null && remain <= 0) {
         const btn = document.createElement("button");
         btn.className = "harvest-btn";
@@ -298,6 +320,7 @@
         const tile = badge.closest(".tile");
         if (!tile) return;
         badge.remove();
+        if (tile.dataset.auto === "1") { setTimeout(() => fetchState(true), 1000); return; }
 
         const btn = document.createElement("button");
         btn.className = "harvest-btn";
@@ -315,6 +338,19 @@
   }, 300);
 
   // ===== Inventory
+  // Цены продажи меняются от предложения — берём текущие с сервера
+  let sellPrices = {};
+  async function loadSellPrices(){
+    try {
+      const r = await fetch("/api/prices", { credentials:"same-origin" });
+      const j = await r.json();
+      if (j.ok) {
+        sellPrices = {};
+        Object.entries(j.prices).forEach(([key, p])=>{ sellPrices[key] = p.price; });
+      }
+    } catch (e) { /* остаются прежние цены */ }
+  }
+
   function inventoryRow({item_key, qty}){
     const row = document.createElement("div");
     row.className = "menu-row";
@@ -344,14 +380,6 @@
     sub.className = "menu-sub";
     
     // Показываем цену продажи только для продаваемых предметов
-    const sellPrices = { 
-      "crop_wheat": 10,
-      "crop_carrot": 20,
-      "crop_watermelon": 40,
-      "crop_pumpkin": 80,
-      "crop_onion": 160
-    };
-    
     if (sellPrices[item_key]) {
       sub.textContent = `Цена: ${sellPrices[item_key]} монет`;
     } else {
@@ -390,7 +418,7 @@
     const wrap = document.createElement("div");
     wrap.className = "menu-list";
 
-    const r = await fetch("/api/inventory", { credentials:"same-origin" });
+    const [r] = await Promise.all([fetch("/api/inventory", { credentials:"same-origin" }), loadSellPrices()]);
     const j = await r.json();
 
     if (!j.ok){
@@ -422,7 +450,7 @@
     const wrap = document.createElement("div");
     wrap.className = "menu-list";
 
-    const r = await fetch("/api/inventory", { credentials:"same-origin" });
+    const [r] = await Promise.all([fetch("/api/inventory", { credentials:"same-origin" }), loadSellPrices()]);
     const j = await r.json();
 
     if (!j.ok){
@@ -482,6 +510,35 @@
     openModal("Магазин", list);
   }
 
+  // Повторы при сетевой ошибке идут с тем же Idempotency-Key: сервер
+  // вернёт сохранённый ответ вместо повторного выполнения действия
+  function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  }
+
+  async function postAction(url, body, attempts = 3) {
+    const headers = { "X-Action-Nonce": lastNonce, "Idempotency-Key": newIdempotencyKey() };
+    if (body !== undefined) headers["Content-Type"] = "application/json";
+    for (let i = 1; ; i++) {
+      try {
+        const r = await fetch(url, {
+          method: "POST",
+          headers,
+          body: body !== undefined ? JSON.stringify(body) : undefined,
+          credentials: "same-origin",
+        });
+        return await r.json();
+      } catch (e) {
+        if (i >= attempts) {
+          showToast("Нет связи с сервером", "error");
+          return { ok: false, error: "network_error" };
+        }
+        await new Promise(res => setTimeout(res, 300 * i));
+      }
+    }
+  }
+
   // ===== Actions
   async function buyField() {
     if (isBuyingField) return;
@@ -489,12 +546,7 @@
 
     if (!lastNonce) await fetchState(true);
 
-    const r = await fetch("/api/action/buy_field", {
-      method: "POST",
-      headers: { "X-Action-Nonce": lastNonce },
-      credentials: "same-origin",
-    });
-    const j = await r.json();
+    const j = await postAction("/api/action/buy_field");
 
     isBuyingField = false;
 
@@ -531,13 +583,7 @@
     const oldText = btnEl.textContent;
     btnEl.disabled = true; btnEl.textContent = "…";
 
-    const r = await fetch("/api/action/shop/buy", {
-      method: "POST",
-      headers: { "Content-Type": "application/json", "X-Action-Nonce": lastNonce },
-      body: JSON.stringify({ item_key }),
-      credentials: "same-origin",
-    });
-    const j = await r.json();
+    const j = await postAction("/api/action/shop/buy", { item_key });
 
     isBuyingItem = false;
     btnEl.disabled = false; btnEl.textContent = oldText;
@@ -563,13 +609,7 @@
     const oldText = btnEl.textContent;
     btnEl.disabled = true; btnEl.textContent = "…";
 
-    const r = await fetch("/api/action/sell", {
-      method: "POST",
-      headers: { "Content-Type": "application/json", "X-Action-Nonce": lastNonce },
-      body: JSON.stringify({ item_key }),
-      credentials: "same-origin",
-    });
-    const j = await r.json();
+    const j = await postAction("/api/action/sell", { item_key });
 
     isSellingItem = false;
     btnEl.disabled = false; btnEl.textContent = oldText;
@@ -595,6 +635,7 @@
     };
     const itemName = itemNames[item_key] || item_key;
     showToast(`Продано: ${itemName} (+${j.sold.price} монет)`, "success");
+    showLevelUp(j.progress);
     
     // Обновляем содержимое инвентаря без закрытия модального окна
     await updateInventoryModal();
@@ -681,13 +722,7 @@
   async function plantSeed(idx, seedKey) {
     if (!lastNonce) await fetchState(true);
 
-    const r = await fetch("/api/action/plant", {
-      method: "POST",
-      headers: { "Content-Type": "application/json", "X-Action-Nonce": lastNonce },
-      body: JSON.stringify({ idx, item_key: seedKey }),
-      credentials: "same-origin",
-    });
-    const j = await r.json();
+    const j = await postAction("/api/action/plant", { idx, item_key: seedKey });
 
     if (!j.ok) {
       if (j.error === "bad_or_expired_nonce") await fetchState(true);
@@ -718,6 +753,7 @@
     };
     const cropName = cropNames[seedKey] || "культура";
     showToast(`Посажено: ${cropName}`, "success");
+    showLevelUp(j.progress);
     closeModal();
   }
 
@@ -728,13 +764,7 @@
 
     if (!lastNonce) await fetchState(true);
 
-    const r = await fetch("/api/action/harvest", {
-      method: "POST",
-      headers: { "Content-Type": "application/json", "X-Action-Nonce": lastNonce },
-      body: JSON.stringify({ idx }),
-      credentials: "same-origin",
-    });
-    const j = await r.json();
+    const j = await postAction("/api/action/harvest", { idx });
 
     isHarvesting = false;
 
@@ -760,6 +790,26 @@
     }
 
     showToast("Собрано: пшеница ×1", "success");
+    showLevelUp(j.progress);
+  }
+
+  // ===== Auto replant
+  async function toggleAutoReplant(idx, enabled){
+    if (!lastNonce) await fetchState(true);
+
+    const j = await postAction("/api/action/auto_replant", { idx, enabled });
+    if (!j.ok) {
+      if (j.error === "bad_or_expired_nonce") await fetchState(true);
+      else showToast("Не удалось переключить автопосадку", "error");
+      return;
+    }
+
+    state = j.state;
+    lastNonce = state.action_nonce;
+    applyServerTimeDelta(state);
+    renderHeader();
+    buildFullGrid();
+    showToast(enabled ? "Автопосадка включена" : "Автопосадка выключена", "success");
   }
 
   // ===== Listeners & start
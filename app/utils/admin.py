@@ -0,0 +1,30 @@
+"""Доступ к админским эндпоинтам.
+
+Админы — игроки из ``ADMIN_USER_IDS`` (Telegram ID через запятую),
+вошедшие обычным путём через ``/auth/validate``. В ``DEV_MODE`` доступ
+открыт всем.
+"""
+
+from __future__ import annotations
+from functools import wraps
+
+from flask import current_app, jsonify, session
+
+def admin_ids() -> frozenset[int]:
+    raw = current_app.config.get("ADMIN_USER_IDS", "")
+    return frozenset(int(x) for x in raw.split(",") if x.strip())
+
+def is_admin() -> bool:
+    if current_app.config.get("DEV_MODE"):
+        return True
+    uid = session.get("uid")
+    return uid is not None and uid in admin_ids()
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return jsonify(ok=False, error="forbidden"), 403
+        return view(*args, **kwargs)
+
+    return wrapper
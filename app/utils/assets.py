@@ -0,0 +1,200 @@
+"""Сборка и раздача статики с отпечатками содержимого.
+
+Сборка (``build_assets.py``) кладёт в ``static/dist`` копии ассетов
+с хэшем содержимого в имени, минифицирует CSS/JS, конвертирует
+картинки в WebP (если установлен Pillow) и пишет ``manifest.json``.
+Шаблоны получают ссылки через ``asset_url()``; если манифеста нет
+(дев-режим без сборки), отдаётся исходный файл с ``?v=START_TIME``.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from flask import current_app, url_for
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Год — для файлов с хэшем в имени, они никогда не меняются
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+_MIME = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON_RE = re.compile(r":\s+")
+_CSS_DECL_RE = re.compile(r"([\w-]+)\s*:\s*([^;{}]*?)url\(\"?/static/([^\")]+)\"?\)([^;{}]*);")
+
+# --- minify ----------------------------------------------------------
+
+def minify_css(src: str) -> str:
+    """Убирает комментарии и лишние пробелы из CSS."""
+    out = _CSS_COMMENT_RE.sub("", src)
+    out = _CSS_SPACE_RE.sub(" ", out)
+    out = _CSS_PUNCT_RE.sub(r"\1", out)
+    # пробел перед ":" значим в селекторах (".a :hover"), после — нет
+    out = _CSS_COLON_RE.sub(":", out)
+    return out.replace(";}", "}").strip()
+
+def minify_js(src: str) -> str:
+    """
+    Консервативная минификация JS.
+
+    Удаляет только строки-комментарии, отступы и пустые строки —
+    без разбора синтаксиса, чтобы не сломать шаблонные строки и regex.
+    """
+    lines = []
+    for line in src.splitlines():
+        s = line.strip()
+        if not s or s.startswith("//"):
+            continue
+        lines.append(s)
+    return "\n".join(lines) + "\n"
+
+# --- build -----------------------------------------------------------
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+def _hashed_name(rel_path: str, data: bytes, ext: str | None = None) -> str:
+    base, orig_ext = os.path.splitext(rel_path)
+    return f"{base}.{_digest(data)}{ext or orig_ext}"
+
+def _write(dist_root: str, rel_path: str, data: bytes) -> None:
+    dst = os.path.join(dist_root, rel_path)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with open(dst, "wb") as f:
+        f.write(data)
+
+def _to_webp(src_path: str, quality: int = 82) -> bytes | None:
+    """Конвертирует картинку в WebP. Без Pillow возвращает None."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    import io
+    with Image.open(src_path) as im:
+        buf = io.BytesIO()
+        im.save(buf, format="WEBP", quality=quality, method=6)
+        return buf.getvalue()
+
+def _rewrite_css_urls(css: str, manifest: dict) -> str:
+    """
+    Заменяет ``url("/static/...")`` на хэшированные пути.
+
+    Для картинок с WebP-вариантом добавляет вторую декларацию
+    с ``image-set()``: браузеры без поддержки просто её пропустят
+    и останутся на исходном PNG/JPG.
+    """
+    def repl(m: re.Match) -> str:
+        prop, before, rel, after = m.group(1), m.group(2), m.group(3), m.group(4)
+        if rel not in manifest:
+            return m.group(0)
+        orig_url = f"/static/{manifest[rel]}"
+        decl = f'{prop}: {before}url("{orig_url}"){after};'
+        webp_key = os.path.splitext(rel)[0] + ".webp"
+        if webp_key in manifest:
+            mime = _MIME.get(os.path.splitext(rel)[1].lower(), "image/png")
+            image_set = (
+                f'image-set(url("/static/{manifest[webp_key]}") type("image/webp"), '
+                f'url("{orig_url}") type("{mime}"))'
+            )
+            decl += f" {prop}: {before}{image_set}{after};"
+        return decl
+
+    return _CSS_DECL_RE.sub(repl, css)
+
+def build(static_root: str, log=print) -> dict:
+    """
+    Собирает ``static/dist`` и возвращает манифест.
+
+    Порядок важен: сначала картинки, потом CSS (в нём переписываются
+    ссылки на картинки, и хэш CSS зависит от хэшей картинок), затем JS.
+    """
+    dist_root = os.path.join(static_root, DIST_DIR)
+    if os.path.isdir(dist_root):
+        shutil.rmtree(dist_root)
+    os.makedirs(dist_root)
+
+    manifest: dict[str, str] = {}
+
+    images_dir = os.path.join(static_root, "images")
+    for name in sorted(os.listdir(images_dir)):
+        if not name.lower().endswith(IMAGE_EXTS):
+            continue
+        rel = f"images/{name}"
+        src_path = os.path.join(images_dir, name)
+        with open(src_path, "rb") as f:
+            data = f.read()
+        out = _hashed_name(rel, data)
+        _write(dist_root, out, data)
+        manifest[rel] = f"{DIST_DIR}/{out}"
+
+        webp = _to_webp(src_path)
+        if webp is not None and len(webp) < len(data):
+            webp_rel = os.path.splitext(rel)[0] + ".webp"
+            out = _hashed_name(webp_rel, webp)
+            _write(dist_root, out, webp)
+            manifest[webp_rel] = f"{DIST_DIR}/{out}"
+            log(f"  {rel}: {len(data)} -> {len(webp)} байт (webp)")
+    if not any(k.endswith(".webp") for k in manifest):
+        log("  Pillow не установлен — WebP-варианты пропущены")
+
+    css_dir = os.path.join(static_root, "css")
+    for name in sorted(os.listdir(css_dir)):
+        if not name.endswith(".css"):
+            continue
+        rel = f"css/{name}"
+        with open(os.path.join(css_dir, name), encoding="utf-8") as f:
+            src = f.read()
+        data = minify_css(_rewrite_css_urls(src, manifest)).encode("utf-8")
+        out = _hashed_name(rel, data)
+        _write(dist_root, out, data)
+        manifest[rel] = f"{DIST_DIR}/{out}"
+        log(f"  {rel}: {len(src.encode('utf-8'))} -> {len(data)} байт")
+
+    js_dir = os.path.join(static_root, "js")
+    for name in sorted(os.listdir(js_dir)):
+        if not name.endswith(".js"):
+            continue
+        rel = f"js/{name}"
+        with open(os.path.join(js_dir, name), encoding="utf-8") as f:
+            src = f.read()
+        data = minify_js(src).encode("utf-8")
+        out = _hashed_name(rel, data)
+        _write(dist_root, out, data)
+        manifest[rel] = f"{DIST_DIR}/{out}"
+        log(f"  {rel}: {len(src.encode('utf-8'))} -> {len(data)} байт")
+
+    with open(os.path.join(dist_root, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return manifest
+
+# --- runtime ---------------------------------------------------------
+
+def load_manifest(static_root: str) -> dict:
+    """Читает манифест сборки; пустой словарь, если сборки нет."""
+    path = os.path.join(static_root, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def asset_url(filename: str) -> str:
+    """URL ассета для шаблонов: хэшированный из манифеста или исходный с ?v=."""
+    manifest = current_app.config.get("ASSET_MANIFEST") or {}
+    hashed = manifest.get(filename)
+    if hashed:
+        return url_for("static", filename=hashed)
+    return url_for("static", filename=filename, v=current_app.config.get("START_TIME", "dev"))
+
+def is_immutable_asset(path: str) -> bool:
+    """Файлы из ``/static/dist/`` неизменяемы: хэш содержимого в имени."""
+    return path.startswith(f"/static/{DIST_DIR}/")
@@ -0,0 +1,298 @@
+"""Горячие резервные копии БД без остановки игры.
+
+SQLite копируется онлайн-API бэкапа (``sqlite3.Connection.backup``)
+порциями по ``BACKUP_PAGES`` страниц с паузой ``BACKUP_SLEEP_SEC`` между
+ними: файл блокируется только на время одной порции, запись игроков идёт
+между порциями. Если за время копии БД изменил другой процесс, SQLite
+начинает копию заново; после ``BACKUP_MAX_RESTARTS`` перезапусков
+остаток копируется одним шагом (снимок на момент его начала).
+
+Копия сжимается потоком в ``<имя>-<время>.sqlite.gz`` в ``BACKUP_DIR``;
+рядом — ``.json`` с контрольной суммой и числом строк по таблицам,
+посчитанными по самой копии. PostgreSQL — логический дамп ``pg_dump -Fc``
+(``.dump``), проверка — ``pg_restore --list``. Каждая БД (основная,
+шарды) — отдельный файл. Хранится ``BACKUP_KEEP`` последних копий каждой.
+
+Проверка SQLite-копии (``verify``) распаковывает её во временный файл и
+сверяет контрольную сумму, ``PRAGMA integrity_check`` и число строк.
+Запуск — ``python backup_db.py``.
+"""
+
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+SQLITE_EXT = ".sqlite.gz"
+PG_EXT = ".dump"
+_CHUNK = 1 << 20
+
+class BackupError(Exception):
+    """Копию не удалось снять или она не прошла проверку."""
+
+class _TooManyRestarts(Exception):
+    pass
+
+def _stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _table_counts(conn: sqlite3.Connection) -> dict[str, int]:
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return {n: conn.execute(f'SELECT COUNT(*) FROM "{n}"').fetchone()[0] for n in names}
+
+def _write_manifest(path: str, meta: dict) -> None:
+    tmp = path + ".json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path + ".json")
+
+def read_manifest(path: str) -> dict:
+    with open(path + ".json", encoding="utf-8") as f:
+        return json.load(f)
+
+# --- SQLite ---------------------------------------------------------------------
+
+def _copy_online(src_path: str, dst_path: str, *, pages: int, sleep_sec: float,
+                 max_restarts: int) -> tuple[int, int]:
+    """Онлайн-копия порциями; возвращает (страниц, перезапусков)."""
+    src = sqlite3.connect(src_path, timeout=30)
+    restarts = 0
+    total = 0
+    try:
+        while True:
+            left = None
+
+            def progress(status, remaining, count):
+                nonlocal left, restarts, total
+                total = count
+                if left is not None and remaining > left:
+                    # БД изменили снаружи — SQLite начал копию сначала
+                    restarts += 1
+                    if restarts > max_restarts:
+                        raise _TooManyRestarts
+                left = remaining
+                if remaining and sleep_sec:
+                    time.sleep(sleep_sec)
+
+            dst = sqlite3.connect(dst_path)
+            try:
+                if restarts > max_restarts:
+                    src.backup(dst)
+                else:
+                    src.backup(dst, pages=pages, progress=progress)
+                return total, restarts
+            except _TooManyRestarts:
+                log.warning("backup of %s restarted %d times, finishing in one step", src_path, restarts)
+            finally:
+                dst.close()
+    finally:
+        src.close()
+
+def backup_sqlite(src_path: str, out_dir: str, name: str, *, pages: int = 1024, sleep_sec: float = 0.05,
+                  max_restarts: int = 5) -> str:
+    """
+    Снимает сжатую копию файла SQLite.
+
+    Args:
+        src_path: Путь к файлу БД
+        out_dir: Каталог копий
+        name: Имя БД в имени файла (``main``, имя шарда)
+        pages: Страниц за порцию; -1 — всё одним шагом
+        sleep_sec: Пауза между порциями
+        max_restarts: Перезапусков копии до перехода на один шаг
+
+    Returns:
+        str: Путь к ``.sqlite.gz``
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.monotonic()
+    out = os.path.join(out_dir, f"{name}-{_stamp()}{SQLITE_EXT}")
+    fd, raw = tempfile.mkstemp(suffix=".sqlite", dir=out_dir)
+    os.close(fd)
+    try:
+        total, restarts = _copy_online(src_path, raw, pages=pages, sleep_sec=sleep_sec,
+                                       max_restarts=max_restarts)
+        conn = sqlite3.connect(raw)
+        try:
+            counts = _table_counts(conn)
+        finally:
+            conn.close()
+        with open(raw, "rb") as f, gzip.open(out + ".tmp", "wb", compresslevel=6) as gz:
+            shutil.copyfileobj(f, gz, _CHUNK)
+        os.replace(out + ".tmp", out)
+        raw_size = os.path.getsize(raw)
+    finally:
+        for p in (raw, out + ".tmp"):
+            if os.path.exists(p):
+                os.remove(p)
+    _write_manifest(out, {
+        "name": name, "dialect": "sqlite", "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": src_path, "pages": total, "restarts": restarts, "raw_bytes": raw_size,
+        "bytes": os.path.getsize(out), "sha256": _sha256(out), "tables": counts,
+        "seconds": round(time.monotonic() - started, 3),
+    })
+    return out
+
+def _unpack(path: str, dst: str) -> None:
+    with gzip.open(path, "rb") as gz, open(dst, "wb") as f:
+        shutil.copyfileobj(gz, f, _CHUNK)
+
+def verify_sqlite(path: str) -> dict:
+    """Распаковывает копию во временный файл и проверяет её; BackupError — не прошла."""
+    meta = read_manifest(path)
+    if _sha256(path) != meta["sha256"]:
+        raise BackupError("checksum mismatch")
+    fd, raw = tempfile.mkstemp(suffix=".sqlite", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        _unpack(path, raw)
+        conn = sqlite3.connect(raw)
+        try:
+            check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if check != "ok":
+                raise BackupError(f"integrity_check: {check}")
+            counts = _table_counts(conn)
+        finally:
+            conn.close()
+    finally:
+        os.remove(raw)
+    if counts != meta["tables"]:
+        diff = {t: (meta["tables"].get(t), counts.get(t)) for t in set(counts) | set(meta["tables"])
+                if counts.get(t) != meta["tables"].get(t)}
+        raise BackupError(f"row counts differ: {diff}")
+    return meta
+
+def restore_sqlite(path: str, target: str) -> None:
+    """
+    Восстанавливает копию в ``target`` (приложение должно быть остановлено).
+
+    Копия проверяется до замены; прежний файл остаётся рядом как
+    ``<target>.before-restore``.
+    """
+    verify_sqlite(path)
+    tmp = target + ".restore"
+    _unpack(path, tmp)
+    if os.path.exists(target):
+        os.replace(target, target + ".before-restore")
+    for suffix in ("-wal", "-shm", "-journal"):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    os.replace(tmp, target)
+
+# --- PostgreSQL -----------------------------------------------------------------
+
+def _pg_env_and_url(url) -> tuple[str, dict]:
+    """URL для pg_dump (без драйвера SQLAlchemy) и окружение с паролем."""
+    env = os.environ.copy()
+    if url.password:
+        env["PGPASSWORD"] = url.password
+    plain = url.set(drivername="postgresql", password=None)
+    return plain.render_as_string(hide_password=False), env
+
+def backup_postgres(url, out_dir: str, name: str) -> str:
+    """
+    Логический дамп ``pg_dump -Fc`` — снимок на момент начала, запись не блокирует.
+
+    Args:
+        url: ``sqlalchemy.engine.URL`` базы
+        out_dir: Каталог копий
+        name: Имя БД в имени файла
+
+    Returns:
+        str: Путь к ``.dump``
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.monotonic()
+    out = os.path.join(out_dir, f"{name}-{_stamp()}{PG_EXT}")
+    dsn, env = _pg_env_and_url(url)
+    try:
+        subprocess.run(["pg_dump", "--format=custom", "--no-owner", f"--file={out}.tmp", dsn],
+                       env=env, check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        if os.path.exists(out + ".tmp"):
+            os.remove(out + ".tmp")
+        raise BackupError(f"pg_dump failed: {getattr(e, 'stderr', b'').decode(errors='replace') or e}")
+    os.replace(out + ".tmp", out)
+    _write_manifest(out, {
+        "name": name, "dialect": "postgresql", "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": url.render_as_string(hide_password=True), "bytes": os.path.getsize(out),
+        "sha256": _sha256(out), "seconds": round(time.monotonic() - started, 3),
+    })
+    return out
+
+def verify_postgres(path: str) -> dict:
+    """Контрольная сумма и читаемость оглавления дампа (``pg_restore --list``)."""
+    meta = read_manifest(path)
+    if _sha256(path) != meta["sha256"]:
+        raise BackupError("checksum mismatch")
+    try:
+        toc = subprocess.run(["pg_restore", "--list", path], check=True, capture_output=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise BackupError(f"pg_restore --list failed: {e}")
+    meta["toc_entries"] = sum(1 for line in toc.splitlines() if line and not line.startswith(b";"))
+    return meta
+
+def restore_postgres(path: str, url) -> None:
+    """``pg_restore --clean`` дампа в базу ``url`` (приложение должно быть остановлено)."""
+    verify_postgres(path)
+    dsn, env = _pg_env_and_url(url)
+    try:
+        subprocess.run(["pg_restore", "--clean", "--if-exists", "--no-owner", f"--dbname={dsn}", path],
+                       env=env, check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise BackupError(f"pg_restore failed: {getattr(e, 'stderr', b'').decode(errors='replace') or e}")
+
+# --- общее ----------------------------------------------------------------------
+
+def backup_engine(engine, out_dir: str, name: str, cfg) -> str:
+    """Копия БД движка ``engine`` способом по диалекту."""
+    if engine.dialect.name == "sqlite":
+        if not engine.url.database or engine.url.database == ":memory:":
+            raise BackupError("in-memory SQLite cannot be backed up")
+        return backup_sqlite(engine.url.database, out_dir, name,
+                             pages=cfg.get("BACKUP_PAGES", 1024), sleep_sec=cfg.get("BACKUP_SLEEP_SEC", 0.05),
+                             max_restarts=cfg.get("BACKUP_MAX_RESTARTS", 5))
+    if engine.dialect.name == "postgresql":
+        return backup_postgres(engine.url, out_dir, name)
+    raise BackupError(f"unsupported dialect: {engine.dialect.name}")
+
+def verify(path: str) -> dict:
+    return verify_sqlite(path) if path.endswith(SQLITE_EXT) else verify_postgres(path)
+
+def list_backups(out_dir: str, name: str | None = None) -> list[str]:
+    """Копии в каталоге (с манифестом), от старых к новым."""
+    if not os.path.isdir(out_dir):
+        return []
+    found = [
+        os.path.join(out_dir, f) for f in os.listdir(out_dir)
+        if f.endswith((SQLITE_EXT, PG_EXT)) and os.path.exists(os.path.join(out_dir, f + ".json"))
+        and (name is None or f.rsplit("-", 1)[0] == name)
+    ]
+    return sorted(found, key=os.path.basename)
+
+def rotate(out_dir: str, name: str, keep: int) -> list[str]:
+    """Удаляет копии ``name`` сверх ``keep`` последних; возвращает удалённые."""
+    old = list_backups(out_dir, name)[:-keep] if keep > 0 else []
+    for path in old:
+        for p in (path, path + ".json"):
+            if os.path.exists(p):
+                os.remove(p)
+    return old
@@ -0,0 +1,192 @@
+"""Потоковая выгрузка таблиц: action_logs, players, inventories.
+
+Строки читаются серверным курсором (``yield_per``) пачками и сразу
+кодируются в куски вывода — в памяти одновременно одна пачка, сколько бы
+строк ни было в выгрузке. Используется эндпоинтами ``/api/dev/export/*``
+(ответ-генератор, chunked transfer) и скриптом ``export_data.py``.
+
+Форматы:
+    * ``ndjson`` — строка JSON на запись;
+    * ``csv`` — с заголовком;
+    * ``parquet`` — колоночный файл, row group на пачку. Нужен пакет
+      ``pyarrow`` (необязательная зависимость).
+
+Фильтры идут по индексам: ``user_id`` — по ``ix_action_logs_user_created``
+и уникальным индексам ``(user_id, ...)``, ``since``/``until`` (только
+action_logs) — по ``created_at``. При шардировании шарды выгружаются
+по очереди.
+"""
+
+from __future__ import annotations
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Integer, select
+
+from app.models import db, ActionLog, Inventory, Player
+from app.models.sharding import on_shard, shard_names
+
+try:  # pyarrow — необязательная зависимость (формат parquet)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+TABLES = {
+    "action_logs": ActionLog,
+    "players": Player,
+    "inventories": Inventory,
+}
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+DEFAULT_BATCH = 1000
+
+class ExportError(ValueError):
+    """Неверные параметры выгрузки."""
+
+def _parse_time(value: str | None, name: str) -> datetime | None:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"bad_{name}")
+    return dt.replace(tzinfo=None)  # в БД naive UTC
+
+def build_query(table: str, *, user_id: int | None = None, since: str | None = None,
+                until: str | None = None):
+    """SELECT по таблице с фильтрами; порядок — по индексу фильтра."""
+    model = TABLES.get(table)
+    if model is None:
+        raise ExportError("unknown_table")
+    cols = model.__table__.c
+    q = select(*cols)
+    if user_id is not None:
+        q = q.where(cols.user_id == user_id)
+
+    lo, hi = _parse_time(since, "since"), _parse_time(until, "until")
+    if model is ActionLog:
+        if lo is not None:
+            q = q.where(cols.created_at >= lo)
+        if hi is not None:
+            q = q.where(cols.created_at < hi)
+        if user_id is not None:
+            return q.order_by(cols.user_id, cols.created_at)
+        return q.order_by(cols.created_at) if lo or hi else q.order_by(cols.id)
+    if lo or hi:
+        raise ExportError("time_filter_only_for_action_logs")
+    return q.order_by(*model.__table__.primary_key.columns)
+
+def iter_batches(model, query, batch: int = DEFAULT_BATCH):
+    """Пачки строк со всех шардов; серверный курсор, ``yield_per``."""
+    for shard in shard_names():
+        with on_shard(shard):
+            # mapper — чтобы сессия выбрала шард для Core-запроса по таблице
+            result = db.session.execute(query.execution_options(yield_per=batch),
+                                        bind_arguments={"mapper": model})
+        try:
+            for part in result.partitions():
+                yield part
+        finally:
+            result.close()
+
+# --- кодировщики ---------------------------------------------------------
+
+def _json_default(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    raise TypeError(type(v).__name__)
+
+def _ndjson(columns, batches):
+    dumps = json.JSONEncoder(ensure_ascii=False, default=_json_default, separators=(",", ":")).encode
+    for rows in batches:
+        yield "".join(dumps(dict(zip(columns, r))) + "\n" for r in rows).encode()
+
+def _csv(columns, batches):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(columns)
+    for rows in batches:
+        w.writerows(rows)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+class _Sink:
+    """Файл для ParquetWriter, отдающий записанное кусками."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+def _arrow_type(col):
+    if isinstance(col.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(col.type, (Integer, Boolean)):
+        return pa.int64()
+    return pa.string()
+
+def _parquet(table_cols, batches):
+    schema = pa.schema([pa.field(c.name, _arrow_type(c)) for c in table_cols])
+    sink = _Sink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for rows in batches:
+            arrays = [pa.array([r[i] for r in rows], type=f.type) for i, f in enumerate(schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def stream(table: str, fmt: str, *, user_id: int | None = None, since: str | None = None,
+           until: str | None = None, batch: int = DEFAULT_BATCH):
+    """
+    Генератор кусков ``bytes`` выгрузки.
+
+    Параметры проверяются сразу (``ExportError``), чтение начинается при
+    первой итерации.
+    """
+    if fmt not in FORMATS:
+        raise ExportError("unknown_format")
+    if fmt == "parquet" and pa is None:
+        raise ExportError("parquet_requires_pyarrow")
+    query = build_query(table, user_id=user_id, since=since, until=until)
+    model = TABLES[table]
+    table_cols = list(model.__table__.c)
+    batches = iter_batches(model, query, batch)
+    if fmt == "ndjson":
+        return _ndjson([c.name for c in table_cols], batches)
+    if fmt == "csv":
+        return _csv([c.name for c in table_cols], batches)
+    return _parquet(table_cols, batches)
@@ -0,0 +1,226 @@
+"""Локальная заглушка сетевого KV (протокол Redis) для проверок без Redis.
+
+Минимальный RESP2-сервер на сокетах в отдельном треде. Понимает ровно
+то, что использует ``RedisBackend``: ``GET``, ``SET`` (``NX``/``XX``/
+``PX``/``EX``), ``DEL``, ``INCR``, ``PEXPIRE``, ``PING``, ``HELLO``, ``SELECT`` и
+Lua-скрипты бэкенда через ``SCRIPT LOAD``/``EVALSHA``/``EVAL`` —
+вместо интерпретатора Lua для каждого известного скрипта есть своя
+реализация на Python. Любой другой скрипт — ошибка.
+
+Пример::
+
+    kv = FakeKV()
+    kv.start()
+    state = RedisBackend(kv.url)
+    ...
+    kv.stop()
+"""
+
+from __future__ import annotations
+import hashlib
+import socket
+import socketserver
+import threading
+import time
+
+from app.utils.shared_state import RedisBackend
+
+class _Error(Exception):
+    pass
+
+
+class FakeKV:
+    """
+    Заглушка Redis.
+
+    Args:
+        latency: Искусственная задержка ответа (сек) — для оценки сетевого бэкенда
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.commands = 0
+        # key -> (expires_at | None, value)
+        self._data: dict[bytes, tuple[float | None, bytes]] = {}
+        self._lock = threading.Lock()
+        self._scripts = {
+            hashlib.sha1(RedisBackend.CAS_SCRIPT.encode()).hexdigest(): self._script_cas,
+            hashlib.sha1(RedisBackend.INCR_SCRIPT.encode()).hexdigest(): self._script_incr,
+        }
+        self._server: socketserver.ThreadingTCPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self) -> None:
+        kv = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                kv._serve(self.rfile, self.wfile)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-kv", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # --- RESP ------------------------------------------------------------
+
+    @staticmethod
+    def _read(rfile) -> list[bytes] | None:
+        line = rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # inline-команда (redis-cli, telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(rfile.readline()[1:])
+            args.append(rfile.read(size + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _encode(value, proto: int) -> bytes:
+        if value is None:
+            return b"_\r\n" if proto == 3 else b"$-1\r\n"
+        if isinstance(value, _Error):
+            return b"-" + str(value).encode() + b"\r\n"
+        if value is True:
+            return b"+OK\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, str):
+            value = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _serve(self, rfile, wfile) -> None:
+        proto = 2
+        while True:
+            try:
+                args = self._read(rfile)
+            except (ConnectionError, ValueError, socket.error):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            if args[0].upper() == b"HELLO":
+                # Клиенты redis>=8 начинают с HELLO 3; в RESP3 меняется
+                # только кодирование nil, остальные наши ответы одинаковы
+                proto = int(args[1]) if len(args) > 1 else proto
+                wfile.write(self._hello(proto))
+                wfile.flush()
+                continue
+            try:
+                reply = self._dispatch([args[0].upper()] + args[1:])
+            except _Error as e:
+                reply = e
+            except (IndexError, ValueError):
+                reply = _Error("ERR syntax error")
+            wfile.write(self._encode(reply, proto))
+            wfile.flush()
+
+    # --- команды ---------------------------------------------------------
+
+    def _live(self, key: bytes, now: float):
+        item = self._data.get(key)
+        if item and item[0] is not None and item[0] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def _dispatch(self, args: list[bytes]):
+        cmd = args[0].decode()
+        self.commands += 1
+        now = time.monotonic()
+        with self._lock:
+            if cmd == "PING":
+                return "PONG"
+            if cmd in ("SELECT", "CLIENT"):
+                return True
+            if cmd == "GET":
+                item = self._live(args[1], now)
+                return item[1] if item else None
+            if cmd == "SET":
+                return self._set(args, now)
+            if cmd == "DEL":
+                return sum(1 for k in args[1:] if self._live(k, now) and self._data.pop(k, None))
+            if cmd == "INCR":
+                return self._incr(args[1], now)
+            if cmd == "PEXPIRE":
+                item = self._live(args[1], now)
+                if not item:
+                    return 0
+                self._data[args[1]] = (now + int(args[2]) / 1000, item[1])
+                return 1
+            if cmd == "SCRIPT" and args[1].upper() == b"LOAD":
+                sha = hashlib.sha1(args[2]).hexdigest()
+                if sha not in self._scripts:
+                    raise _Error("ERR FakeKV: unsupported script")
+                return sha
+            if cmd in ("EVALSHA", "EVAL"):
+                sha = args[1].decode() if cmd == "EVALSHA" else hashlib.sha1(args[1]).hexdigest()
+                script = self._scripts.get(sha)
+                if script is None:
+                    raise _Error("NOSCRIPT No matching script.")
+                nkeys = int(args[2])
+                return script(args[3:3 + nkeys], args[3 + nkeys:], now)
+        raise _Error(f"ERR unknown command '{cmd}'")
+
+    @staticmethod
+    def _hello(proto: int) -> bytes:
+        head = b"%3\r\n" if proto == 3 else b"*6\r\n"
+        return (head + b"$6\r\nserver\r\n$6\r\nfakekv\r\n$7\r\nversion\r\n$5\r\n7.0.0\r\n"
+                b"$5\r\nproto\r\n:%d\r\n" % proto)
+
+    def _set(self, args, now):
+        key, value = args[1], args[2]
+        opts = [a.upper() for a in args[3:]]
+        expires = None
+        if b"PX" in opts:
+            expires = now + int(args[3 + opts.index(b"PX") + 1]) / 1000
+        elif b"EX" in opts:
+            expires = now + int(args[3 + opts.index(b"EX") + 1])
+        exists = self._live(key, now) is not None
+        if (b"NX" in opts and exists) or (b"XX" in opts and not exists):
+            return None
+        self._data[key] = (expires, value)
+        return True
+
+    def _incr(self, key, now, amount: int = 1) -> int:
+        item = self._live(key, now)
+        n = int(item[1]) + amount if item else amount
+        self._data[key] = (item[0] if item else None, str(n).encode())
+        return n
+
+    # --- скрипты RedisBackend ------------------------------------------------
+
+    def _script_cas(self, keys, argv, now):
+        item = self._live(keys[0], now)
+        if not item or item[1] != argv[0]:
+            return 0
+        ttl = int(argv[2])
+        self._data[keys[0]] = (now + ttl / 1000 if ttl else None, argv[1])
+        return 1
+
+    def _script_incr(self, keys, argv, now):
+        amount = int(argv[1])
+        n = self._incr(keys[0], now, amount)
+        ttl = int(argv[0])
+        if n == amount and ttl:
+            self._data[keys[0]] = (now + ttl / 1000, self._data[keys[0]][1])
+        return n
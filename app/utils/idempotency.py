@@ -0,0 +1,128 @@
+"""Idempotency-Key для игровых действий.
+
+Клиент повторяет запрос после сетевой ошибки с тем же заголовком
+``Idempotency-Key``. Первый ответ действия запоминается в общем
+хранилище ``(uid, key) -> ответ`` с TTL, повтор — на любом узле —
+получает сохранённый ответ без проверки nonce, rate limit и без транзакции.
+
+Сохраняются только окончательные ответы: 409 (nonce), 429 (rate limit)
+и 5xx не кэшируются — их повтор должен выполниться заново.
+"""
+
+from __future__ import annotations
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request, session
+
+from app.utils.shared_state import SharedState, get_shared_state
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LEN = 128
+_NOT_CACHED = {409, 429}
+# Сколько держать отметку «выполняется», если узел упал посреди запроса
+PENDING_TTL_SEC = 60
+
+class _Pending:
+    """Заглушка: запрос с этим ключом ещё выполняется."""
+    __slots__ = ()
+
+PENDING = _Pending()
+
+class IdempotencyCache:
+    """
+    Ответы действий в общем хранилище (``SharedState``) с TTL.
+
+    Запись ``idem:<uid>:<key>`` — либо отметка «выполняется» (``P``),
+    либо готовый ответ (``R``: статус, путь, тело). Ограничение объёма —
+    на стороне бэкенда (TTL, LRU у ``memory``).
+
+    Args:
+        state: Общее хранилище
+        ttl_sec: Сколько секунд ответ можно повторить
+    """
+
+    def __init__(self, state: SharedState, ttl_sec: float = 300.0):
+        self.state = state
+        self.ttl_sec = ttl_sec
+
+    @staticmethod
+    def _key(uid: int, key: str) -> str:
+        return f"idem:{uid}:{key}"
+
+    def reserve(self, uid: int, key: str, path: str):
+        """
+        Занимает ключ перед выполнением действия.
+
+        Returns:
+            None — ключ свободен и занят этим запросом;
+            ``PENDING`` — тот же ключ сейчас выполняется;
+            кортеж ``(path, status, body)`` — сохранённый ответ.
+        """
+        k = self._key(uid, key)
+        if self.state.add(k, b"P\n" + path.encode(), ttl=PENDING_TTL_SEC):
+            return None
+        raw = self.state.get(k)
+        if raw is None:  # истёк между add и get — пробуем ещё раз
+            return None if self.state.add(k, b"P\n" + path.encode(), ttl=PENDING_TTL_SEC) else PENDING
+        if raw.startswith(b"P"):
+            return PENDING
+        _, status, stored_path, body = raw.split(b"\n", 3)
+        return stored_path.decode(), int(status), body
+
+    def store(self, uid: int, key: str, path: str, status: int, body: bytes) -> None:
+        self.state.set(self._key(uid, key), b"R\n%d\n%s\n" % (status, path.encode()) + body, ttl=self.ttl_sec)
+
+    def release(self, uid: int, key: str) -> None:
+        """Освобождает ключ, если ответ не сохраняется."""
+        self.state.delete(self._key(uid, key))
+
+def get_cache(app) -> IdempotencyCache:
+    cache = app.extensions.get("idempotency")
+    if cache is None:
+        cache = app.extensions.setdefault("idempotency", IdempotencyCache(
+            get_shared_state(app), ttl_sec=app.config.get("IDEMPOTENCY_TTL_SEC", 300),
+        ))
+    return cache
+
+def _replay(path: str, status: int, body: bytes) -> Response:
+    resp = current_app.response_class(body, status=status, mimetype="application/json")
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+def idempotent(view):
+    """
+    Декоратор действия: повтор с тем же ``Idempotency-Key`` получает
+    сохранённый ответ. Без заголовка действие выполняется как обычно.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        uid = session.get("uid")
+        key = request.headers.get(HEADER)
+        if not uid or not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LEN:
+            return jsonify(ok=False, error="bad_idempotency_key"), 400
+
+        cache = get_cache(current_app)
+        found = cache.reserve(uid, key, request.path)
+        if found is PENDING:
+            return jsonify(ok=False, error="request_in_progress"), 409
+        if found is not None:
+            path, status, body = found
+            if path != request.path:
+                return jsonify(ok=False, error="idempotency_key_reused"), 422
+            return _replay(path, status, body)
+
+        try:
+            resp = make_response(view(*args, **kwargs))
+        except Exception:
+            cache.release(uid, key)
+            raise
+        if resp.status_code in _NOT_CACHED or resp.status_code >= 500:
+            cache.release(uid, key)
+        else:
+            cache.store(uid, key, request.path, resp.status_code, resp.get_data())
+        return resp
+
+    return wrapper
@@ -0,0 +1,101 @@
+"""Кэш отрендеренных публичных страниц.
+
+Страницы ``/``, ``/farm`` и ``/blocked`` зависят только от версии
+деплоя (``START_TIME`` и манифеста статики), поэтому рендерятся один
+раз на процесс. Вместе с телом заранее считаются ETag и сжатые
+варианты, ответ поддерживает условный GET (304).
+"""
+
+from __future__ import annotations
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import Response, current_app, render_template, request
+
+from app.utils.shared_state import get_shared_state
+
+try:  # brotli — необязательная зависимость
+    import brotli
+except ImportError:
+    brotli = None
+
+class CachedPage:
+    """Отрендеренная страница с предвычисленными вариантами кодирования."""
+    __slots__ = ("variants",)
+
+    def __init__(self, body: bytes):
+        etag = hashlib.sha256(body).hexdigest()[:20]
+        # encoding -> (тело, etag); у каждого варианта свой строгий ETag
+        self.variants: dict[str, tuple[bytes, str]] = {"identity": (body, etag)}
+        self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f"{etag}-gz")
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body), f"{etag}-br")
+
+    def pick(self, accept_encoding) -> str:
+        for enc in ("br", "gzip"):
+            if enc in self.variants and accept_encoding[enc]:
+                return enc
+        return "identity"
+
+_cache: dict[tuple[str, str], CachedPage] = {}
+_lock = threading.Lock()
+# Версия кэша страниц в общем хранилище: invalidate() на любом узле
+# сбрасывает кэш всех узлов. Проверяем не чаще PAGE_CACHE_CHECK_SEC.
+_shared = {"version": 0, "checked": float("-inf")}
+
+def _get_page(template: str, version: str, context: dict) -> CachedPage:
+    key = (template, version)
+    page = _cache.get(key)
+    if page is None:
+        with _lock:
+            page = _cache.get(key)
+            if page is None:
+                body = render_template(template, **context).encode("utf-8")
+                page = CachedPage(body)
+                _cache[key] = page
+    return page
+
+def clear() -> None:
+    """Сбрасывает кэш этого процесса."""
+    with _lock:
+        _cache.clear()
+
+def invalidate() -> int:
+    """Сбрасывает кэш на всех узлах (например, после пересборки статики без рестарта)."""
+    clear()
+    _shared["checked"] = float("-inf")
+    return get_shared_state().bump("pages")
+
+def _shared_version() -> int:
+    now = time.monotonic()
+    if now - _shared["checked"] >= current_app.config.get("PAGE_CACHE_CHECK_SEC", 5):
+        _shared["version"] = get_shared_state().version("pages")
+        _shared["checked"] = now
+    return _shared["version"]
+
+def render_cached(template: str, **context) -> Response:
+    """
+    Отдаёт страницу из кэша рендера.
+
+    В дев-режиме (``DEV_MODE``) рендерит как обычно, чтобы
+    правки шаблонов подхватывались сразу.
+    """
+    if current_app.config.get("DEV_MODE"):
+        return Response(render_template(template, **context), mimetype="text/html")
+
+    version = f'{current_app.config.get("START_TIME", "dev")}:{_shared_version()}'
+    page = _get_page(template, version, context)
+    enc = page.pick(request.accept_encodings)
+    body, etag = page.variants[enc]
+
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype="text/html")
+        if enc != "identity":
+            resp.headers["Content-Encoding"] = enc
+    resp.set_etag(etag)
+    resp.vary.add("Accept-Encoding")
+    return resp
@@ -0,0 +1,280 @@
+"""Профилирование запросов по требованию.
+
+Выключено — ничего не стоит: ни слушателей SQL, ни потока-сэмплера;
+на запрос остаётся одно сравнение времени (настройки перечитываются из
+общего хранилища не чаще ``PROFILER_CHECK_SEC``).
+
+Включается на лету с ``/admin/testing/tools`` (``POST /api/dev/profiler``),
+без перезапуска, на всех узлах сразу — настройки лежат в общем
+хранилище под ключом ``profiler:settings`` с TTL = длительность сеанса.
+Что профилировать:
+    * ``sample_pct`` — процент всех запросов;
+    * ``endpoint`` — все запросы маршрута (``actions.sell``);
+    * ``user_id`` — все запросы игрока.
+
+Для выбранного запроса:
+    * поток-сэмплер раз в ``PROFILER_INTERVAL_MS`` снимает стек потока
+      запроса (``sys._current_frames``) — статистический профиль без
+      трассировки каждого вызова; стеки хранятся в свёрнутом виде
+      (``a;b;c N``), его понимают flamegraph.pl и speedscope;
+    * SQL-запросы со временем выполнения (события движка).
+
+Последние ``PROFILER_KEEP`` профилей — кольцевой буфер процесса; при
+нескольких воркерах каждый показывает свои. С ``ACTION_QUEUE`` транзакция
+действия идёт в потоке очереди: в профиле запроса видно ожидание
+результата, а не её SQL.
+"""
+
+from __future__ import annotations
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import g, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.shared_state import get_shared_state
+
+SETTINGS_KEY = "profiler:settings"
+MAX_STACK_DEPTH = 64
+MAX_SQL = 500  # запросов в одном профиле
+
+class Profile:
+    """Профиль одного запроса."""
+
+    __slots__ = ("id", "method", "path", "endpoint", "user_id", "started_at", "started",
+                 "total_ms", "status", "stacks", "samples", "sql", "sql_ms")
+
+    def __init__(self, pid: int, method: str, path: str, endpoint: str | None, user_id: int | None):
+        self.id = pid
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.user_id = user_id
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.status: int | None = None
+        self.stacks: dict[str, int] = {}
+        self.samples = 0
+        self.sql: list[tuple[str, float]] = []
+        self.sql_ms = 0.0
+
+    def add_stack(self, frame) -> None:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        key = ";".join(reversed(names))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """Свёрнутые стеки: строка ``корень;...;лист число`` на стек."""
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id, "method": self.method, "path": self.path, "endpoint": self.endpoint,
+            "user_id": self.user_id, "status": self.status, "started_at": self.started_at.isoformat(),
+            "total_ms": round(self.total_ms, 2), "samples": self.samples,
+            "sql_count": len(self.sql), "sql_ms": round(self.sql_ms, 2),
+        }
+
+    def to_dict(self) -> dict:
+        out = self.summary()
+        out["stacks"] = [{"stack": s, "count": n}
+                         for s, n in sorted(self.stacks.items(), key=lambda kv: -kv[1])]
+        out["sql"] = [{"sql": s, "ms": round(ms, 3)} for s, ms in self.sql]
+        return out
+
+class _Sampler(threading.Thread):
+    """Снимает стеки потоков профилируемых запросов."""
+
+    def __init__(self, interval_sec: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.interval_sec = interval_sec
+        self.targets: dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def watch(self, thread_id: int, profile: Profile) -> None:
+        with self._lock:
+            self.targets[thread_id] = profile
+        self._wake.set()
+
+    def unwatch(self, thread_id: int) -> None:
+        with self._lock:
+            self.targets.pop(thread_id, None)
+
+    def run(self) -> None:
+        while True:
+            if not self.targets:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval_sec)
+            frames = sys._current_frames()
+            with self._lock:
+                for tid, profile in self.targets.items():
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        profile.add_stack(frame)
+            del frames
+
+class Profiler:
+    """
+    Профилировщик процесса.
+
+    Args:
+        state: Общее хранилище (настройки сеанса)
+        keep: Сколько последних профилей хранить
+        interval_ms: Период сэмплирования стека
+        check_sec: Как часто перечитывать настройки
+    """
+
+    def __init__(self, state, *, keep: int = 50, interval_ms: float = 5.0, check_sec: float = 2.0):
+        self.state = state
+        self.keep = keep
+        self.interval_ms = interval_ms
+        self.check_sec = check_sec
+        self.profiles: deque[Profile] = deque(maxlen=keep)
+        self.settings: dict | None = None
+        self._next_check = 0.0
+        self._ids = itertools.count(1)
+        self._sampler: _Sampler | None = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._listening = False
+
+    # --- настройки ---------------------------------------------------------
+
+    def configure(self, settings: dict | None, duration_sec: float = 600) -> None:
+        """Включает (``settings``) или выключает (None) профилирование на всех узлах."""
+        if settings is None:
+            self.state.delete(SETTINGS_KEY)
+        else:
+            self.state.set(SETTINGS_KEY, json.dumps(settings).encode(), ttl=duration_sec)
+        with self._lock:
+            self._apply(settings)
+            self._next_check = time.monotonic() + self.check_sec
+
+    def current(self) -> dict | None:
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    raw = self.state.get(SETTINGS_KEY)
+                    self._apply(json.loads(raw) if raw else None)
+                    self._next_check = now + self.check_sec
+        return self.settings
+
+    def _apply(self, settings: dict | None) -> None:
+        self.settings = settings
+        if settings and not self._listening:
+            event.listen(Engine, "before_cursor_execute", self._before_sql)
+            event.listen(Engine, "after_cursor_execute", self._after_sql)
+            self._listening = True
+        elif not settings and self._listening:
+            event.remove(Engine, "before_cursor_execute", self._before_sql)
+            event.remove(Engine, "after_cursor_execute", self._after_sql)
+            self._listening = False
+
+    def _wanted(self, settings: dict, endpoint: str | None, uid: int | None) -> bool:
+        if settings.get("endpoint") and settings["endpoint"] == endpoint:
+            return True
+        if settings.get("user_id") and settings["user_id"] == uid:
+            return True
+        pct = float(settings.get("sample_pct") or 0)
+        return pct > 0 and random.random() * 100 < pct
+
+    # --- запрос -------------------------------------------------------------
+
+    def start(self) -> None:
+        if self.settings is None and time.monotonic() < self._next_check:
+            return  # выключено: единственная проверка на запрос
+        settings = self.current()
+        if not settings:
+            return
+        uid = session.get("uid")
+        if not self._wanted(settings, request.endpoint, uid):
+            return
+        profile = Profile(next(self._ids), request.method, request.path, request.endpoint, uid)
+        g.profile = profile
+        self._local.profile = profile
+        if self._sampler is None:
+            with self._lock:
+                if self._sampler is None:
+                    self._sampler = _Sampler(self.interval_ms / 1000)
+                    self._sampler.start()
+        self._sampler.watch(threading.get_ident(), profile)
+
+    def finish(self, status: int | None) -> None:
+        profile: Profile | None = g.pop("profile", None)
+        if profile is None:
+            return
+        self._sampler.unwatch(threading.get_ident())
+        self._local.profile = None
+        profile.total_ms = (time.perf_counter() - profile.started) * 1000
+        profile.status = status
+        self.profiles.append(profile)
+
+    # --- SQL ----------------------------------------------------------------
+
+    def _before_sql(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, "profile", None) is not None:
+            conn.info.setdefault("profiler_t0", []).append(time.perf_counter())
+
+    def _after_sql(self, conn, cursor, statement, parameters, context, executemany):
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            return
+        stack = conn.info.get("profiler_t0")
+        if not stack:
+            return
+        ms = (time.perf_counter() - stack.pop()) * 1000
+        profile.sql_ms += ms
+        if len(profile.sql) < MAX_SQL:
+            profile.sql.append((" ".join(statement.split()), ms))
+
+    # --- чтение -------------------------------------------------------------
+
+    def get(self, pid: int) -> Profile | None:
+        for p in self.profiles:
+            if p.id == pid:
+                return p
+        return None
+
+def init_profiler(app) -> Profiler:
+    profiler = Profiler(
+        get_shared_state(app),
+        keep=app.config.get("PROFILER_KEEP", 50),
+        interval_ms=app.config.get("PROFILER_INTERVAL_MS", 5),
+        check_sec=app.config.get("PROFILER_CHECK_SEC", 2),
+    )
+    app.extensions["profiler"] = profiler
+
+    @app.before_request
+    def _profile_start():
+        profiler.start()
+
+    @app.teardown_request
+    def _profile_finish(exc):
+        if "profile" in g:
+            profiler.finish(500 if exc is not None else g.get("profile_status"))
+
+    @app.after_request
+    def _profile_status(resp):
+        if "profile" in g:
+            g.profile_status = resp.status_code
+        return resp
+
+    return profiler
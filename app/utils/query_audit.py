@@ -0,0 +1,140 @@
+"""Аудит SQL-запросов и индексов.
+
+``StatementRecorder`` записывает все уникальные запросы, которые
+приложение отправляет в БД, ``explain`` прогоняет каждый через
+``EXPLAIN QUERY PLAN`` (SQLite) или ``EXPLAIN (FORMAT JSON)``
+(PostgreSQL) и находит полные сканы таблиц, ``redundant_indexes``
+ищет индексы, которые являются префиксом другого индекса или PK.
+Отчёт собирает скрипт ``audit_queries.py``.
+"""
+
+from __future__ import annotations
+import json
+import re
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+
+_WS_RE = re.compile(r"\s+")
+
+class StatementRecorder:
+    """
+    Записывает уникальные SQL-запросы движка (с первыми параметрами).
+
+    Использование::
+
+        with StatementRecorder(engine) as rec:
+            ...  # нагрузка
+        for sql, params in rec.statements.items(): ...
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements: OrderedDict[str, object] = OrderedDict()
+        self.counts: dict[str, int] = {}
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            return
+        key = _WS_RE.sub(" ", statement).strip()
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.statements.setdefault(key, parameters)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        return False
+
+def _pg_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _pg_nodes(child)
+
+def explain(engine, statement: str, parameters) -> tuple[list[str], list[str]]:
+    """
+    План запроса.
+
+    Returns:
+        tuple: (строки плана, таблицы с полным сканом)
+    """
+    verb = statement.split(None, 1)[0].upper()
+    if verb not in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH"):
+        return [], []
+
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            trans = conn.begin()  # EXPLAIN без ANALYZE ничего не меняет, но откатим на всякий случай
+            try:
+                # На маленьких таблицах планировщик и так выберет Seq Scan;
+                # запрещаем его, чтобы увидеть, есть ли вообще подходящий индекс
+                conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+                raw = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            finally:
+                trans.rollback()
+            plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+            lines, scans = [], []
+            for node in _pg_nodes(plan):
+                rel = node.get("Relation Name")
+                idx = node.get("Index Name")
+                lines.append(" ".join(x for x in (node["Node Type"], rel or "", f"using {idx}" if idx else "") if x))
+                if node["Node Type"] == "Seq Scan" and rel:
+                    scans.append(rel)
+            return lines, scans
+
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        lines = [r[-1] for r in rows]
+        scans = []
+        for detail in lines:
+            # "SCAN action_logs" — полный проход; "SCAN x USING COVERING INDEX" — проход по индексу
+            m = re.match(r"SCAN (?:TABLE )?(\w+)(.*)", detail)
+            if m and "INDEX" not in m.group(2):
+                scans.append(m.group(1))
+        return lines, scans
+
+def _index_sets(engine, table: str) -> list[tuple[str, tuple[str, ...], bool]]:
+    insp = inspect(engine)
+    out = []
+    pk = insp.get_pk_constraint(table).get("constrained_columns") or []
+    if pk:
+        out.append(("PRIMARY KEY", tuple(pk), True))
+    for uc in insp.get_unique_constraints(table):
+        out.append((uc["name"] or "unique", tuple(uc["column_names"]), True))
+    for ix in insp.get_indexes(table):
+        cols = tuple(c for c in ix["column_names"] if c)
+        if cols:
+            out.append((ix["name"], cols, bool(ix.get("unique"))))
+    return out
+
+def redundant_indexes(engine) -> list[tuple[str, str, str]]:
+    """
+    Индексы, которые не нужны рядом с другими.
+
+    Индекс избыточен, если его столбцы — префикс другого индекса
+    (или совпадают с PK / другим уникальным ограничением).
+
+    Returns:
+        list: (таблица, избыточный индекс, чем покрывается)
+    """
+    out = []
+    for table in inspect(engine).get_table_names():
+        sets = _index_sets(engine, table)
+        for name, cols, unique in sets:
+            if name == "PRIMARY KEY":
+                continue
+            for other, ocols, ounique in sets:
+                if other == name:
+                    continue
+                if ocols[: len(cols)] != cols:
+                    continue
+                # Уникальность сохраняем: уникальный индекс покрывается только
+                # равным по столбцам уникальным
+                if unique and not (ounique and ocols == cols):
+                    continue
+                if ocols == cols and not unique and ounique is False and name < other:
+                    continue  # пара одинаковых — сообщаем об одном
+                out.append((table, name, other))
+                break
+    return out
@@ -0,0 +1,353 @@
+"""Общее состояние узлов: nonce, лимиты, ключи идемпотентности, инвалидации.
+
+Всё, что раньше жило в памяти процесса или в отдельных таблицах, идёт
+через один интерфейс ``SharedState`` (ключ -> bytes с TTL) с тремя
+реализациями, выбираемыми ``SHARED_STATE_BACKEND``:
+
+    * ``memory`` — словарь процесса (по умолчанию): без сети и без БД,
+      но только для одного процесса;
+    * ``redis`` — сетевое KV (``SHARED_STATE_URL=redis://...``): несколько
+      процессов и узлов без нагрузки на БД. Нужен пакет ``redis``;
+    * ``sql`` — таблица ``shared_state`` в основной БД: несколько узлов
+      без новой инфраструктуры, но каждая операция — своя транзакция на
+      основной БД (лимит и nonce на каждое действие, две записи на запрос
+      с ключом идемпотентности).
+
+Для проверок без Redis есть ``app/utils/fake_kv.py`` — локальный
+RESP-сервер, понимающий ровно то, что использует ``RedisBackend``.
+
+Все операции атомарны в пределах бэкенда: ``add`` — «записать, если
+нет», ``compare_and_set`` — «заменить, если равно», ``incr`` — счётчик,
+TTL которому ставится при создании (читается ``counter``).
+"""
+
+from __future__ import annotations
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update, or_
+from sqlalchemy.exc import IntegrityError
+
+try:  # redis — необязательная зависимость
+    import redis
+except ImportError:
+    redis = None
+
+class SharedState:
+    """Интерфейс общего KV. ``ttl`` — секунды, None — без срока."""
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Записывает, только если ключа нет. True — записано."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def compare_and_set(self, key: str, expected: bytes, value: bytes, ttl: float | None = None) -> bool:
+        """Заменяет значение, только если сейчас оно равно ``expected``."""
+        raise NotImplementedError
+
+    def incr(self, key: str, ttl: float | None = None, amount: int = 1) -> int:
+        """Увеличивает счётчик на ``amount``; TTL ставится, когда счётчик создаётся."""
+        raise NotImplementedError
+
+    def counter(self, key: str) -> int:
+        """Значение счётчика ``incr``; 0 — счётчика нет."""
+        raw = self.get(key)
+        return int(raw) if raw else 0
+
+    # --- версии для инвалидации кэшей ------------------------------------
+
+    def version(self, name: str) -> int:
+        return self.counter(f"ver:{name}")
+
+    def bump(self, name: str) -> int:
+        """Сбрасывает кэши ``name`` на всех узлах (узлы сверяют ``version``)."""
+        return self.incr(f"ver:{name}")
+
+# --- память процесса ---------------------------------------------------
+
+class MemoryBackend(SharedState):
+    """
+    Словарь с TTL и LRU-вытеснением.
+
+    Args:
+        max_entries: Сколько ключей держать; старые вытесняются
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        # key -> (expires_at | None, value)
+        self._items: OrderedDict[str, tuple[float | None, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] <= now:
+            del self._items[key]
+            return None
+        return item
+
+    def _put(self, key: str, value: bytes, ttl: float | None, now: float) -> None:
+        self._items[key] = (now + ttl if ttl else None, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.monotonic())
+            return item[1] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._put(key, value, ttl, time.monotonic())
+
+    def add(self, key, value, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._put(key, value, ttl, now)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._items.pop(key, None) is not None
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._live(key, now)
+            if item is None or item[1] != expected:
+                return False
+            self._put(key, value, ttl, now)
+            return True
+
+    def incr(self, key, ttl=None, amount=1):
+        now = time.monotonic()
+        with self._lock:
+            item = self._live(key, now)
+            if item is None:
+                self._put(key, str(amount).encode(), ttl, now)
+                return amount
+            n = int(item[1]) + amount
+            self._items[key] = (item[0], str(n).encode())
+            return n
+
+# --- SQL ----------------------------------------------------------------
+
+class SqlBackend(SharedState):
+    """
+    Таблица ``shared_state`` в основной БД (модель ``SharedStateEntry``).
+
+    Каждая операция — своя короткая транзакция на отдельном соединении
+    движка, вне сессии запроса. Просроченные строки удаляются при
+    обращении к ключу и изредка пачкой.
+    """
+
+    PURGE_EVERY = 1000  # в среднем раз на столько записей чистим просроченные
+
+    def __init__(self, engine):
+        from app.models import SharedStateEntry
+
+        self.engine = engine
+        self.t = SharedStateEntry.__table__
+
+    @staticmethod
+    def _expires(ttl):
+        return datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
+
+    def _alive(self, now):
+        return or_(self.t.c.expires_at.is_(None), self.t.c.expires_at > now)
+
+    def _drop_expired(self, conn, key, now) -> None:
+        conn.execute(delete(self.t).where(self.t.c.key == key, self.t.c.expires_at <= now))
+        if random.randrange(self.PURGE_EVERY) == 0:
+            conn.execute(delete(self.t).where(self.t.c.expires_at <= now))
+
+    def get(self, key):
+        now = datetime.utcnow()
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(self.t.c.value).where(self.t.c.key == key, self._alive(now))
+            ).scalar()
+
+    def set(self, key, value, ttl=None):
+        for _ in range(3):
+            try:
+                with self.engine.begin() as conn:
+                    res = conn.execute(update(self.t).where(self.t.c.key == key).values(
+                        value=value, counter=0, expires_at=self._expires(ttl)))
+                    if res.rowcount == 0:
+                        conn.execute(insert(self.t).values(
+                            key=key, value=value, counter=0, expires_at=self._expires(ttl)))
+                return
+            except IntegrityError:
+                continue  # параллельная вставка того же ключа — обновим её
+        raise RuntimeError(f"shared_state: cannot set {key!r}")
+
+    def add(self, key, value, ttl=None):
+        try:
+            with self.engine.begin() as conn:
+                self._drop_expired(conn, key, datetime.utcnow())
+                conn.execute(insert(self.t).values(
+                    key=key, value=value, counter=0, expires_at=self._expires(ttl)))
+            return True
+        except IntegrityError:
+            return False
+
+    def delete(self, key):
+        with self.engine.begin() as conn:
+            return conn.execute(delete(self.t).where(self.t.c.key == key)).rowcount > 0
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            res = conn.execute(
+                update(self.t)
+                .where(self.t.c.key == key, self.t.c.value == expected, self._alive(now))
+                .values(value=value, expires_at=self._expires(ttl))
+            )
+            return res.rowcount == 1
+
+    def incr(self, key, ttl=None, amount=1):
+        for _ in range(3):
+            now = datetime.utcnow()
+            try:
+                with self.engine.begin() as conn:
+                    self._drop_expired(conn, key, now)
+                    res = conn.execute(
+                        update(self.t).where(self.t.c.key == key)
+                        .values(counter=self.t.c.counter + amount)
+                        .returning(self.t.c.counter)
+                    ).scalar()
+                    if res is not None:
+                        return res
+                    conn.execute(insert(self.t).values(
+                        key=key, value=b"", counter=amount, expires_at=self._expires(ttl)))
+                    return amount
+            except IntegrityError:
+                continue  # счётчик создали параллельно — увеличим его
+        raise RuntimeError(f"shared_state: cannot incr {key!r}")
+
+    def counter(self, key):
+        now = datetime.utcnow()
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(self.t.c.counter).where(self.t.c.key == key, self._alive(now))
+            ).scalar() or 0
+
+# --- Redis ----------------------------------------------------------------
+
+class RedisBackend(SharedState):
+    """
+    Сетевое KV с протоколом Redis (Redis, Valkey, KeyDB или ``FakeKV``).
+
+    Args:
+        url: ``redis://host:port/db``
+        prefix: Префикс ключей приложения
+    """
+
+    # KEYS[1]; ARGV: expected, value, ttl_ms (0 — без срока)
+    CAS_SCRIPT = (
+        "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+        "if ARGV[3] == '0' then redis.call('SET', KEYS[1], ARGV[2]) "
+        "else redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3]) end "
+        "return 1 end return 0"
+    )
+    # KEYS[1]; ARGV: ttl_ms (0 — без срока), amount
+    INCR_SCRIPT = (
+        "local n = redis.call('INCRBY', KEYS[1], ARGV[2]) "
+        "if n == tonumber(ARGV[2]) and ARGV[1] ~= '0' then redis.call('PEXPIRE', KEYS[1], ARGV[1]) end "
+        "return n"
+    )
+
+    def __init__(self, url: str, prefix: str = "farm:"):
+        if redis is None:
+            raise RuntimeError("SHARED_STATE_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._cas = self.client.register_script(self.CAS_SCRIPT)
+        self._incr = self.client.register_script(self.INCR_SCRIPT)
+
+    @staticmethod
+    def _ms(ttl) -> int:
+        return int(ttl * 1000) if ttl else 0
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, px=self._ms(ttl) or None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, value, px=self._ms(ttl) or None, nx=True))
+
+    def delete(self, key):
+        return self.client.delete(self.prefix + key) > 0
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        return self._cas(keys=[self.prefix + key], args=[expected, value, self._ms(ttl)]) == 1
+
+    def incr(self, key, ttl=None, amount=1):
+        return int(self._incr(keys=[self.prefix + key], args=[self._ms(ttl), amount]))
+
+# --- фабрика ------------------------------------------------------------
+
+def create_backend(config, engine=None) -> SharedState:
+    kind = config.get("SHARED_STATE_BACKEND", "memory")
+    if kind == "memory":
+        return MemoryBackend(max_entries=config.get("SHARED_STATE_MAX_ENTRIES", 100_000))
+    if kind == "sql":
+        return SqlBackend(engine)
+    if kind == "redis":
+        return RedisBackend(config["SHARED_STATE_URL"], prefix=config.get("SHARED_STATE_PREFIX", "farm:"))
+    raise ValueError(f"unknown SHARED_STATE_BACKEND {kind!r}")
+
+def get_shared_state(app=None) -> SharedState:
+    """Бэкенд приложения (создаётся в ``create_app``)."""
+    if app is None:
+        from flask import current_app
+        app = current_app
+    return app.extensions["shared_state"]
+
+# --- лимиты --------------------------------------------------------------
+
+def hit_rate_limit(state: SharedState, user_id: int, max_per_window: int, window_sec: int,
+                   now: float | None = None) -> bool:
+    """
+    Пропускает действие, если за последние ``window_sec`` секунд их было
+    меньше ``max_per_window``.
+
+    Скользящее окно приближается двумя фиксированными: счётчик прошлого
+    окна берётся с весом ещё не прошедшей его доли, поэтому на стыке окон
+    проходит не больше лимита, а не вдвое больше. Отклонённая попытка не
+    считается — превысивший лимит запрос сразу вычитается обратно.
+
+    Счётчик общий для всех действий игрока, лимит — свой у каждого
+    действия (как раньше при подсчёте по action_logs).
+
+    Returns:
+        bool: True — лимит не превышен
+    """
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, window_sec)
+    key = f"rl:{user_id}:{window_sec}:"
+    prev = state.counter(key + str(int(window) - 1))
+    n = state.incr(key + str(int(window)), ttl=2 * window_sec + 1)
+    if prev * (1 - elapsed / window_sec) + n <= max_per_window:
+        return True
+    state.incr(key + str(int(window)), amount=-1)
+    return False
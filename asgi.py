@@ -0,0 +1,11 @@
+"""ASGI-точка входа: ``uvicorn asgi:app``."""
+
+import os
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 5500)))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Аудит запросов: прогоняет типичную нагрузку через API, записывает
+все SQL-запросы, делает по каждому EXPLAIN и ищет полные сканы
+и избыточные индексы.
+
+    python audit_queries.py                                   # временная SQLite
+    DATABASE_URL=postgresql+psycopg://... python audit_queries.py
+
+Скрипт создаёт тестовых игроков (user_id от 900000) в указанной БД.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "audit.db")
+
+from app import create_app
+from app.models import db, Player, Plot
+from app.utils.query_audit import StatementRecorder, explain, redundant_indexes
+
+AUDIT_UID = 900000
+PLAYERS = 50
+
+def _seed(app):
+    with app.app_context():
+        for uid in range(AUDIT_UID, AUDIT_UID + PLAYERS):
+            if db.session.get(Player, uid) is None:
+                db.session.add(Player(user_id=uid, display_name=f"audit{uid}", balance=10_000))
+        db.session.commit()
+
+def _workload(app):
+    """Сценарий одного игрока: состояние, покупки, посадка, сбор, продажа."""
+    client = app.test_client()
+    for uid in range(AUDIT_UID, AUDIT_UID + PLAYERS):
+        with client.session_transaction() as s:
+            s["uid"] = uid
+
+        def act(path, body=None):
+            nonce = client.get("/api/state").get_json()["state"]["action_nonce"]
+            return client.post(f"/api/action/{path}", json=body or {}, headers={"X-Action-Nonce": nonce})
+
+        client.get("/api/inventory")
+        act("buy_field")
+        act("shop/buy", {"item_key": "seed_wheat"})
+        act("plant", {"idx": 0, "item_key": "seed_wheat"})
+        with app.app_context():
+            plot = db.session.query(Plot).filter_by(user_id=uid, idx=0).one()
+            plot.planted_at -= timedelta(hours=1)
+            plot.ready_at -= timedelta(hours=1)
+            db.session.commit()
+        act("harvest", {"idx": 0})
+        act("sell", {"item_key": "crop_wheat"})
+    client.get("/api/dev/players")
+
+def main():
+    app = create_app()
+    _seed(app)
+    with app.app_context():
+        engine = db.engine
+        print(f"🔎 Аудит запросов: {engine.url.render_as_string(hide_password=True)}\n")
+
+        with StatementRecorder(engine) as rec:
+            _workload(app)
+
+        problems = 0
+        for sql, params in rec.statements.items():
+            lines, scans = explain(engine, sql, params)
+            if not lines:
+                continue
+            mark = "❌" if scans else "✅"
+            if scans:
+                problems += 1
+            print(f"{mark} [{rec.counts[sql]}x] {sql[:150]}")
+            for line in lines:
+                print(f"      {line}")
+
+        print("\n📇 Избыточные индексы:")
+        redundant = redundant_indexes(engine)
+        for table, name, covered_by in redundant:
+            print(f"   ⚠️  {table}.{name} — покрывается {covered_by}")
+        if not redundant:
+            print("   нет")
+
+    print(f"\nЗапросов: {len(rec.statements)}, с полным сканом: {problems}, избыточных индексов: {len(redundant)}")
+    return problems == 0 and not redundant
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
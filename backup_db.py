@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Резервные копии БД без остановки игры (app/utils/backup.py).
+
+    python backup_db.py                         # копия основной БД и шардов, проверка, ротация
+    python backup_db.py --loop                  # раз в BACKUP_INTERVAL_SEC
+    python backup_db.py --list
+    python backup_db.py --verify instance/backups/main-20250101T000000Z.sqlite.gz
+    python backup_db.py --restore <копия> [--to instance/app.db]   # при остановленном приложении
+
+SQLite копируется онлайн-API бэкапа порциями (BACKUP_PAGES страниц,
+пауза BACKUP_SLEEP_SEC), PostgreSQL — ``pg_dump -Fc``. Каждая свежая
+копия сразу проверяется; хранится BACKUP_KEEP последних копий каждой БД.
+Код выхода 1 — копия не снята или не прошла проверку.
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from sqlalchemy.engine import make_url
+
+from app import create_app
+from app.models import db
+from app.models.sharding import MAIN
+from app.utils import backup
+
+log = logging.getLogger("backup_db")
+
+def _dir(app, args) -> str:
+    return args.dir or app.config["BACKUP_DIR"] or os.path.join(app.instance_path, "backups")
+
+def _engines(app) -> dict:
+    with app.app_context():
+        return {(key or MAIN): engine for key, engine in db.engines.items()}
+
+def _run_once(app, out_dir: str, keep: int, check: bool) -> bool:
+    ok = True
+    for name, engine in _engines(app).items():
+        try:
+            path = backup.backup_engine(engine, out_dir, name, app.config)
+            meta = backup.verify(path) if check else backup.read_manifest(path)
+        except backup.BackupError as e:
+            print(f"   ❌ {name}: {e}")
+            ok = False
+            continue
+        extra = f", перезапусков {meta['restarts']}" if "restarts" in meta else ""
+        print(f"   ✅ {name}: {os.path.basename(path)} — {meta['bytes'] / 1e6:.1f} МБ "
+              f"за {meta['seconds']:.1f} с{extra}{', проверена' if check else ''}")
+        for old in backup.rotate(out_dir, name, keep):
+            print(f"      🗑 {os.path.basename(old)}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервные копии БД")
+    parser.add_argument("--dir", help="каталог копий (BACKUP_DIR)")
+    parser.add_argument("--keep", type=int, help="копий каждой БД (BACKUP_KEEP)")
+    parser.add_argument("--loop", action="store_true", help="снимать копии раз в BACKUP_INTERVAL_SEC")
+    parser.add_argument("--no-verify", action="store_true", help="не проверять свежую копию")
+    parser.add_argument("--list", action="store_true", help="показать копии")
+    parser.add_argument("--verify", metavar="PATH", help="проверить копию")
+    parser.add_argument("--restore", metavar="PATH", help="восстановить копию")
+    parser.add_argument("--to", help="куда восстанавливать: файл SQLite или URL PostgreSQL "
+                                     "(по умолчанию — БД из имени копии)")
+    args = parser.parse_args()
+
+    app = create_app()
+    out_dir = _dir(app, args)
+
+    if args.list:
+        for path in backup.list_backups(out_dir):
+            meta = backup.read_manifest(path)
+            print(f"   {os.path.basename(path):<48} {meta['bytes'] / 1e6:8.1f} МБ  {meta['created_at']}")
+        return True
+
+    if args.verify:
+        try:
+            meta = backup.verify(args.verify)
+        except backup.BackupError as e:
+            print(f"❌ {e}")
+            return False
+        rows = sum(meta.get("tables", {}).values())
+        print(f"✅ Копия цела: {meta['name']}, {meta['created_at']}" + (f", строк {rows}" if rows else ""))
+        return True
+
+    if args.restore:
+        name = backup.read_manifest(args.restore)["name"]
+        engine = _engines(app).get(name)
+        if args.restore.endswith(backup.SQLITE_EXT):
+            target = args.to or (engine.url.database if engine is not None else None)
+            if not target:
+                print(f"❌ Неизвестная БД {name}: укажите --to")
+                return False
+            backup.restore_sqlite(args.restore, target)
+        else:
+            url = make_url(args.to) if args.to else (engine.url if engine is not None else None)
+            if url is None:
+                print(f"❌ Неизвестная БД {name}: укажите --to")
+                return False
+            backup.restore_postgres(args.restore, url)
+        print(f"✅ {name} восстановлена из {os.path.basename(args.restore)}")
+        return True
+
+    keep = args.keep or app.config["BACKUP_KEEP"]
+    while True:
+        started = time.perf_counter()
+        ok = _run_once(app, out_dir, keep, check=not args.no_verify)
+        print(f"{'✅' if ok else '❌'} Копии в {out_dir} за {time.perf_counter() - started:.1f} с")
+        if not args.loop:
+            return ok
+        time.sleep(app.config["BACKUP_INTERVAL_SEC"])
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        if not main():
+            raise SystemExit(1)
+    except KeyboardInterrupt:
+        pass
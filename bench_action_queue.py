@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк очереди действий: пропускная способность продаж при
+всплеске параллельных запросов — коммит на каждое действие против
+группового коммита (ACTION_QUEUE).
+
+    python bench_action_queue.py                       # временная SQLite
+    DATABASE_URL=postgresql+psycopg://... python bench_action_queue.py
+
+Скрипт создаёт тестовых игроков (user_id от 920000) в указанной БД.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from app import create_app
+from app.logic.action_queue import get_action_queue
+from app.models import db, Player, add_inventory
+from app.routes.actions import _run_action, _sell_tx
+
+BENCH_UID = 920000
+
+def _seed(app, players: int, actions: int) -> None:
+    with app.app_context():
+        for uid in range(BENCH_UID, BENCH_UID + players):
+            if db.session.get(Player, uid) is None:
+                db.session.add(Player(user_id=uid, display_name=f"bench{uid}"))
+            add_inventory(uid, "crop_wheat", actions)
+        db.session.commit()
+
+def _run(app, threads: int, per_thread: int, players: int) -> tuple[float, int]:
+    errors = []
+    start = threading.Barrier(threads + 1)
+
+    def worker(n: int):
+        uid = BENCH_UID + n % players
+        with app.app_context():
+            start.wait()
+            for _ in range(per_thread):
+                try:
+                    _, err = _run_action(uid, _sell_tx, "crop_wheat", 10)
+                    if err:
+                        errors.append(err)
+                except Exception as e:  # "database is locked" и т.п.
+                    errors.append(e)
+                    db.session.rollback()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - t0, len(errors)
+
+def main():
+    ap = argparse.ArgumentParser(description="Бенчмарк группового коммита действий")
+    ap.add_argument("--threads", type=int, default=32, help="параллельных запросов")
+    ap.add_argument("--actions", type=int, default=50, help="действий на тред")
+    ap.add_argument("--players", type=int, default=16, help="разных игроков")
+    args = ap.parse_args()
+
+    app = create_app()
+    _seed(app, args.players, args.threads * args.actions * 2)
+    total = args.threads * args.actions
+    print(f"🏁 {args.threads} тредов × {args.actions} продаж, {args.players} игроков, "
+          f"{app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]}\n")
+
+    for mode in (False, True):
+        app.config["ACTION_QUEUE"] = mode
+        elapsed, errors = _run(app, args.threads, args.actions, args.players)
+        name = "групповой коммит" if mode else "коммит на действие"
+        print(f"   {name:<20} {total / elapsed:8.0f} действий/с  ({elapsed:.2f} с, ошибок: {errors})")
+
+    stats = get_action_queue(app).stats
+    print(f"\n   пачек: {stats['batches']}, в среднем {stats['commands'] / max(1, stats['batches']):.1f} действий на коммит")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк ASGI-режима (uvicorn asgi:app) против синхронного gunicorn
+(run:app, gthread): пропускная способность и задержки чтений API при
+N одновременных клиентах, и то же при K открытых SSE-потоках (только ASGI).
+
+    python bench_asgi.py --clients 64 --requests 3000 --sse 500
+
+Оба сервера запускаются подпроцессами на одной временной SQLite-базе
+(или на DATABASE_URL, если он задан).
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from app import create_app
+from app.models import db, Player, add_inventory
+
+BENCH_UID = 930000
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _seed(players: int) -> list[str]:
+    """Создаёт игроков и возвращает подписанные session-cookie для них."""
+    app = create_app()
+    with app.app_context():
+        for uid in range(BENCH_UID, BENCH_UID + players):
+            if db.session.get(Player, uid) is None:
+                db.session.add(Player(user_id=uid, display_name=f"bench{uid}"))
+                add_inventory(uid, "seed_wheat", 5)
+        db.session.commit()
+    ser = app.session_interface.get_signing_serializer(app)
+    return [ser.dumps({"uid": uid}) for uid in range(BENCH_UID, BENCH_UID + players)]
+
+def _start(kind: str, port: int, workers: int, threads: int) -> subprocess.Popen:
+    if kind == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "run:app", "-b", f"127.0.0.1:{port}",
+               "-w", str(workers), "--threads", str(threads), "-k", "gthread", "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=os.environ.copy())
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/inventory", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{kind} did not start")
+
+async def _load(base: str, cookies: list[str], clients: int, total: int, path: str) -> tuple[float, list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    left = total
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async def client(i: int, ac: httpx.AsyncClient):
+        nonlocal left, errors
+        cookie = {"session": cookies[i % len(cookies)]}
+        while left > 0:
+            left -= 1
+            t0 = time.perf_counter()
+            try:
+                r = await ac.get(path, cookies=cookie)
+                if r.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as ac:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(i, ac) for i in range(clients)))
+        return time.perf_counter() - t0, latencies, errors
+
+async def _with_sse(base: str, cookies: list[str], streams: int, clients: int, total: int, path: str):
+    """Держит ``streams`` SSE-потоков открытыми и параллельно гонит нагрузку."""
+    opened = 0
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=0)
+
+    async def stream(i: int, ac: httpx.AsyncClient):
+        nonlocal opened
+        async with ac.stream("GET", "/api/events", cookies={"session": cookies[i % len(cookies)]}) as r:
+            await r.aiter_text().__anext__()
+            opened += 1
+            await stop.wait()
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as ac:
+        tasks = [asyncio.create_task(stream(i, ac)) for i in range(streams)]
+        while opened < streams and not any(t.done() for t in tasks):
+            await asyncio.sleep(0.05)
+        result = await _load(base, cookies, clients, total, path)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return opened, result
+
+def _report(name: str, elapsed: float, lat: list[float], errors: int) -> None:
+    lat = sorted(lat)
+    p50 = lat[len(lat) // 2] * 1000
+    p99 = lat[int(len(lat) * 0.99) - 1] * 1000
+    print(f"   {name:<34} {len(lat) / elapsed:7.0f} rps   p50 {p50:6.1f} мс   p99 {p99:6.1f} мс   "
+          f"среднее {statistics.mean(lat) * 1000:6.1f} мс   ошибок {errors}")
+
+def main():
+    ap = argparse.ArgumentParser(description="ASGI vs gunicorn")
+    ap.add_argument("--clients", type=int, default=64)
+    ap.add_argument("--requests", type=int, default=3000)
+    ap.add_argument("--players", type=int, default=50)
+    ap.add_argument("--sse", type=int, default=500, help="открытых SSE-потоков во втором прогоне")
+    ap.add_argument("--workers", type=int, default=1, help="процессов на сервер")
+    ap.add_argument("--threads", type=int, default=8, help="тредов на процесс gunicorn")
+    ap.add_argument("--path", default="/api/inventory")
+    args = ap.parse_args()
+
+    cookies = _seed(args.players)
+    print(f"🏁 GET {args.path}: {args.clients} клиентов, {args.requests} запросов, "
+          f"{args.workers} процесс(а) на сервер\n")
+
+    for kind in ("gunicorn", "uvicorn"):
+        port = _free_port()
+        proc = _start(kind, port, args.workers, args.threads)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            label = f"gunicorn gthread ×{args.threads}" if kind == "gunicorn" else "uvicorn (ASGI)"
+            _report(label, *asyncio.run(_load(base, cookies, args.clients, args.requests, args.path)))
+            if kind == "uvicorn" and args.sse:
+                opened, result = asyncio.run(_with_sse(base, cookies, args.sse, args.clients, args.requests, args.path))
+                _report(f"uvicorn + {opened} SSE-потоков", *result)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
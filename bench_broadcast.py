@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон рассылки (app/bot/broadcast.py) против локальной
+заглушки Bot API (app/bot/fake_api.py) — без сети и без настоящего бота.
+
+    python bench_broadcast.py                       # 300 000 игроков, временная SQLite
+    python bench_broadcast.py --players 1000000 --workers 200
+    DATABASE_URL=postgresql+psycopg://... python bench_broadcast.py
+
+Что проверяется:
+    * память: RSS процесса снимается по ходу рассылки и не должна расти
+      с числом отправленных (ID читаются потоком, очередь ограничена);
+    * контрольная точка: рассылка останавливается на ``--stop-at`` доле,
+      все игроки до ``cursor_user_id`` уже получили сообщение; продолжение
+      доходит до конца, каждый получает сообщение, повторов не больше
+      числа сообщений «в полёте»;
+    * заблокировавшие бота (403) помечены ``bot_blocked``, 429 повторяются,
+      счётчики рассылки сходятся с тем, что приняла заглушка.
+
+Скрипт создаёт тестовых игроков (user_id от 960000) в указанной БД.
+Код выхода 1 — проверка не прошла.
+"""
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from sqlalchemy import delete, func, insert, select
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from app import create_app
+from app.bot.broadcast import BroadcastEngine
+from app.bot.fake_api import FakeBotApi
+from app.bot.sender import RateLimiter
+from app.models import db, Broadcast, Player
+
+BENCH_UID = 960000
+BLOCK_EVERY = 97  # каждый N-й игрок заблокировал бота
+
+class CountingApi(FakeBotApi):
+    """Заглушка, которая вместо списка сообщений считает их по игрокам (байт на игрока)."""
+
+    def __init__(self, hits, counters, **kwargs):
+        super().__init__(**kwargs)
+        self.hits = hits          # общая память с основным процессом
+        self.counters = counters  # [принято, 429]
+
+    def _send_message(self, params):
+        status, payload = super()._send_message(params)
+        if status == 200:
+            self.sent.pop()
+            self.counters[0] += 1
+            i = int(params["chat_id"]) - BENCH_UID
+            self.hits[i] = min(255, self.hits[i] + 1)
+        elif status == 429:
+            self.counters[1] += 1
+        return status, payload
+
+def _serve(hits, counters, blocked, flood_every, ready, done) -> None:
+    """Заглушка в отдельном процессе — не делит GIL и цикл событий с рассылкой."""
+    async def serve():
+        api = CountingApi(hits, counters, blocked=blocked, flood_every=flood_every, retry_after=1)
+        await api.start()
+        ready.put(api.base_url)
+        await asyncio.to_thread(done.wait)
+        await api.stop()
+    asyncio.run(serve())
+
+class ApiProcess:
+    """Заглушка Bot API в дочернем процессе и её счётчики в общей памяти."""
+
+    def __init__(self, players: int, blocked: set[int], flood_every: int):
+        self.hits = mp.Array("B", players, lock=False)
+        self._counters = mp.Array("q", 2, lock=False)
+        ready = mp.Queue()
+        self._done = mp.Event()
+        self._proc = mp.Process(target=_serve, daemon=True, args=(
+            self.hits, self._counters, blocked, flood_every, ready, self._done))
+        self._proc.start()
+        self.base_url = ready.get(timeout=30)
+
+    @property
+    def accepted(self) -> int:
+        return self._counters[0]
+
+    @property
+    def floods(self) -> int:
+        return self._counters[1]
+
+    def stop(self) -> None:
+        self._done.set()
+        self._proc.join(timeout=10)
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:  # не Linux — пиковый RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+def _seed(app, players: int) -> None:
+    with app.app_context():
+        db.session.execute(delete(Player).where(Player.user_id >= BENCH_UID,
+                                                Player.user_id < BENCH_UID + players))
+        for lo in range(0, players, 10_000):
+            db.session.execute(insert(Player), [
+                {"user_id": BENCH_UID + i, "display_name": f"bench{i}", "bot_blocked": 0}
+                for i in range(lo, min(players, lo + 10_000))
+            ])
+        db.session.commit()
+
+async def _run(app, api: ApiProcess, args, broadcast_id: int | None, stop_at: float | None):
+    stop = asyncio.Event()
+    samples: list[tuple[int, float]] = []
+
+    async def watch():
+        while not stop.is_set():
+            samples.append((api.accepted, _rss_mb()))
+            if stop_at is not None and api.accepted >= stop_at * args.players:
+                stop.set()
+            await asyncio.sleep(0.5)
+
+    request = HTTPXRequest(connection_pool_size=args.workers)
+    async with Bot("123:TEST", base_url=api.base_url, request=request) as bot:
+        engine = BroadcastEngine(app, bot, limiter=RateLimiter(per_sec=1e9, per_chat_interval=0),
+                                 workers=args.workers, fetch_batch=args.fetch_batch)
+        broadcast_id = broadcast_id or engine.create("📣 Нагрузочная рассылка")
+        watcher = asyncio.create_task(watch())
+        t0 = time.perf_counter()
+        res = await engine.run(broadcast_id, stop)
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await watcher
+    samples.append((api.accepted, _rss_mb()))
+    return broadcast_id, res, elapsed, samples
+
+def _check(cond: bool, text: str) -> bool:
+    print(f"   {'✅' if cond else '❌'} {text}")
+    return cond
+
+def _memory_flat(samples, players: int, tolerance_mb: float) -> bool:
+    """Рост RSS от 20% до конца прогона; при линейной утечке он пропорционален числу сообщений."""
+    tail = [rss for sent, rss in samples if sent >= players * 0.2]
+    if len(tail) < 2:
+        return _check(True, "память: мало замеров, пропущено")
+    growth = max(tail) - tail[0]
+    return _check(growth <= tolerance_mb,
+                  f"память: RSS {tail[0]:.0f} → {max(tail):.0f} МБ (рост {growth:.1f} МБ, допуск {tolerance_mb:.0f})")
+
+async def main(args) -> bool:
+    app = create_app()
+    print(f"🏁 Рассылка: {args.players} игроков, {args.workers} воркеров, "
+          f"БД {app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]}\n")
+    t0 = time.perf_counter()
+    _seed(app, args.players)
+    print(f"   игроки созданы за {time.perf_counter() - t0:.1f} с")
+
+    blocked = {BENCH_UID + i for i in range(0, args.players, BLOCK_EVERY)}
+    api = ApiProcess(args.players, blocked, args.flood_every)
+    ok = True
+    try:
+        # 1. Прерванная рассылка
+        bid, res, elapsed, samples = await _run(app, api, args, None, args.stop_at)
+        cursor = res["cursor_user_id"]
+        print(f"   ⏸️  остановлена на user_id={cursor}: {res['sent']} отправлено за {elapsed:.1f} с "
+              f"({res['sent'] / elapsed:.0f}/с)")
+        ok &= _check(not res["finished"] and cursor > BENCH_UID, "рассылка прервана с контрольной точкой")
+        missed = sum(1 for i in range(cursor - BENCH_UID + 1)
+                     if BENCH_UID + i not in blocked and not api.hits[i])
+        ok &= _check(missed == 0, f"до контрольной точки не получили сообщение: {missed}")
+
+        # 2. Продолжение
+        _, res2, elapsed2, samples2 = await _run(app, api, args, bid, None)
+        print(f"   ▶️  продолжена: {res2['sent']} отправлено за {elapsed2:.1f} с ({res2['sent'] / elapsed2:.0f}/с)")
+        ok &= _check(res2["finished"], "рассылка завершена")
+        missed = sum(1 for i in range(args.players) if BENCH_UID + i not in blocked and not api.hits[i])
+        dup = sum(1 for h in api.hits if h > 1)
+        in_flight = args.workers * 5  # очередь (workers × 4) плюс отправки воркеров
+        ok &= _check(missed == 0, f"не получили сообщение: {missed}")
+        ok &= _check(dup <= in_flight, f"повторов после продолжения: {dup} (не больше {in_flight})")
+        ok &= _check(api.floods > 0, f"429 повторены: {api.floods}")
+
+        with app.app_context():
+            b = db.session.get(Broadcast, bid)
+            flagged = db.session.execute(select(func.count()).select_from(Player).where(
+                Player.user_id >= BENCH_UID, Player.bot_blocked == 1)).scalar_one()
+            ok &= _check(b.status == "done" and b.sent == api.accepted,
+                         f"счётчики: sent={b.sent}, принято заглушкой {api.accepted}, status={b.status}")
+            ok &= _check(flagged == len(blocked) and b.blocked == len(blocked),
+                         f"bot_blocked: {flagged} из {len(blocked)}")
+        ok &= _memory_flat(samples + samples2, args.players, args.rss_tolerance_mb)
+    finally:
+        api.stop()
+    return ok
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Нагрузочный прогон рассылки против заглушки Bot API")
+    ap.add_argument("--players", type=int, default=300_000)
+    ap.add_argument("--workers", type=int, default=100)
+    ap.add_argument("--fetch-batch", type=int, default=1000)
+    ap.add_argument("--flood-every", type=int, default=5000, help="каждый N-й запрос отвечает 429")
+    ap.add_argument("--stop-at", type=float, default=0.4, help="доля, на которой прервать первый прогон")
+    ap.add_argument("--rss-tolerance-mb", type=float, default=64.0, help="допустимый рост RSS")
+    if not asyncio.run(main(ap.parse_args())):
+        raise SystemExit(1)
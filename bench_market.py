@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рынка игроков (app/logic/market.py).
+
+    python bench_market.py                          # временная SQLite
+    python bench_market.py --book-orders 200000     # только стакан в памяти
+    DATABASE_URL=postgresql+psycopg://... python bench_market.py --threads 16
+
+Две части:
+    * стакан в памяти — сведение случайных заявок без БД: сколько заявок
+      в секунду выдерживает сам ``OrderBook`` при глубоком стакане;
+    * целиком — заявки через ``_run_action`` (обеспечение, сведение,
+      расчёт обеих сторон одной транзакцией) из нескольких тредов.
+
+После прогона сверяется, что монеты и урожай игроков сохранились
+(с учётом обеспечения открытых заявок), а журнал баланса без расхождений.
+Скрипт создаёт тестовых игроков (user_id от 950000) в указанной БД.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("ANTICHEAT", "0")
+os.environ.setdefault("MARKET_MAX_OPEN_ORDERS", "1000000")
+
+from sqlalchemy import func, select
+
+from app import create_app
+from app.logic import ledger
+from app.logic.market import OrderBook
+from app.models import db, Inventory, MarketOrder, Player, add_inventory
+from app.routes.actions import _market_order_tx, _run_action
+
+BENCH_UID = 950000
+ITEM = "crop_wheat"
+
+def _random_order(rnd: random.Random, mid: int, spread: int):
+    side = rnd.choice(("buy", "sell"))
+    # Покупки чуть ниже середины, продажи чуть выше — часть заявок встаёт в стакан
+    price = mid + rnd.randint(-spread, spread) + (-1 if side == "buy" else 1)
+    return side, max(1, price), rnd.randint(1, 20)
+
+def bench_book(orders: int, depth: int) -> None:
+    rnd = random.Random(1)
+    book = OrderBook()
+    oid = 0
+    for _ in range(depth):
+        side, price, qty = _random_order(rnd, 100, 30)
+        oid += 1
+        book.set(oid, side, price + (20 if side == "sell" else -20), qty, oid % 1000)
+    trades = 0
+    t0 = time.perf_counter()
+    for _ in range(orders):
+        side, price, qty = _random_order(rnd, 100, 30)
+        oid += 1
+        left = qty
+        for mid_, mprice, mrem, muid in book.crossing(side, price, qty, skip_uid=oid % 1000):
+            fill = min(left, mrem)
+            book.set(mid_, "sell" if side == "buy" else "buy", mprice, mrem - fill, muid)
+            left -= fill
+            trades += 1
+            if not left:
+                break
+        book.set(oid, side, price, left, oid % 1000)
+    elapsed = time.perf_counter() - t0
+    print(f"   стакан в памяти: {orders / elapsed:10.0f} заявок/с, сделок {trades}, "
+          f"в стакане {len(book)} заявок ({elapsed:.2f} с)")
+
+def _seed(app, players: int, coins: int, crops: int) -> None:
+    with app.app_context():
+        for uid in range(BENCH_UID, BENCH_UID + players):
+            player = db.session.get(Player, uid)
+            if player is None:
+                db.session.add(Player(user_id=uid, display_name=f"bench{uid}", balance=coins))
+                add_inventory(uid, ITEM, crops)
+        db.session.commit()
+
+def _totals(app, players: int) -> tuple[tuple[int, int], list]:
+    uids = list(range(BENCH_UID, BENCH_UID + players))
+    with app.app_context():
+        coins = db.session.execute(select(func.sum(Player.balance)).where(Player.user_id.in_(uids))).scalar_one()
+        crops = db.session.execute(select(func.sum(Inventory.qty)).where(
+            Inventory.user_id.in_(uids), Inventory.item_key == ITEM)).scalar_one()
+        open_ = db.session.execute(
+            select(MarketOrder.side, func.sum(MarketOrder.price * MarketOrder.remaining), func.sum(MarketOrder.remaining))
+            .where(MarketOrder.user_id.in_(uids), MarketOrder.status == "open").group_by(MarketOrder.side)
+        ).all()
+        issues = ledger.verify_chunk(uids)
+        db.session.rollback()
+    escrow = {side: (coins_, qty) for side, coins_, qty in open_}
+    return (int(coins or 0) + int(escrow.get("buy", (0, 0))[0] or 0),
+            int(crops or 0) + int(escrow.get("sell", (0, 0))[1] or 0)), issues
+
+def bench_full(app, threads: int, per_thread: int, players: int) -> bool:
+    _seed(app, players, coins=10 ** 7, crops=10 ** 5)
+    before, _ = _totals(app, players)
+    errors = []
+    placed = [0]
+    start = threading.Barrier(threads + 1)
+
+    def worker(n: int):
+        rnd = random.Random(n)
+        with app.app_context():
+            start.wait()
+            for _ in range(per_thread):
+                uid = BENCH_UID + rnd.randrange(players)
+                side, price, qty = _random_order(rnd, 100, 10)
+                try:
+                    _, err = _run_action(uid, _market_order_tx, ITEM, side, price, qty)
+                    if err:
+                        errors.append(err[0].get_json()["error"])
+                    else:
+                        placed[0] += 1
+                except Exception as e:  # "database is locked" и т.п.
+                    errors.append(type(e).__name__)
+                    db.session.rollback()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with app.app_context():
+        trades = db.session.execute(select(func.count()).select_from(
+            select(MarketOrder.id).where(MarketOrder.user_id >= BENCH_UID, MarketOrder.status == "filled").subquery()
+        )).scalar_one()
+        db.session.rollback()
+    total = threads * per_thread
+    print(f"   целиком ({threads} тредов): {total / elapsed:8.0f} заявок/с, принято {placed[0]}, исполнено {trades}, "
+          f"ошибок {len(errors)} ({elapsed:.2f} с)")
+    after, issues = _totals(app, players)
+    ok = before == after and not issues
+    print(f"   {'✅' if ok else '❌'} монеты и урожай с обеспечением: до {before}, после {after}; "
+          f"журнал баланса: {len(issues)} расхождений")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser(description="Бенчмарк рынка игроков")
+    ap.add_argument("--book-orders", type=int, default=100_000, help="заявок для стакана в памяти")
+    ap.add_argument("--book-depth", type=int, default=50_000, help="заявок в стакане до начала")
+    ap.add_argument("--threads", type=int, default=8, help="тредов для прогона целиком")
+    ap.add_argument("--orders", type=int, default=250, help="заявок на тред")
+    ap.add_argument("--players", type=int, default=50, help="игроков")
+    args = ap.parse_args()
+
+    print(f"🏁 Рынок: {args.book_orders} заявок в стакан глубиной {args.book_depth}; "
+          f"{args.threads} × {args.orders} заявок через БД\n")
+    bench_book(args.book_orders, args.book_depth)
+
+    app = create_app()
+    print(f"   БД: {app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]}")
+    if not bench_full(app, args.threads, args.orders, args.players):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
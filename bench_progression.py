@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарк прогрессии: поиск уровня по таблице порогов
+(bisect) против прохода циклом и число SQL-запросов в действиях
+с начислением опыта и без него (считаются все запросы).
+
+Опыт пишется в строку игрока. Продажа и так меняет баланс — опыт уходит
+тем же UPDATE. Посадка и сбор строку игрока не меняют, им опыт стоит
+ровно одного UPDATE players (``XP_EXTRA_QUERIES``).
+
+    python bench_progression.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import timeit
+from datetime import timedelta
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+# Фоновые пересборки (рейтинг, цены) — один раз при старте, не во время замера
+os.environ["LEADERBOARD_RESYNC_SEC"] = "0"
+os.environ["PRICE_RESYNC_SEC"] = "0"
+
+from app import create_app
+from app.logic import leaderboard, pricing
+from app.logic.progression import LEVEL_THRESHOLDS, MAX_LEVEL, level_for_xp
+from app.models import db, Player, Plot
+from app.utils.query_audit import StatementRecorder
+
+BENCH_UID = 910000
+
+# Запросов, которые добавляет начисление опыта: отдельный UPDATE строки игрока
+XP_EXTRA_QUERIES = {"plant": 1, "harvest": 1, "sell": 0}
+
+def _level_loop(xp: int) -> int:
+    level = 1
+    while level < MAX_LEVEL and xp >= LEVEL_THRESHOLDS[level]:
+        level += 1
+    return level
+
+def bench_lookup(n: int = 200_000) -> None:
+    top = LEVEL_THRESHOLDS[-1] + 100
+    samples = [(i * 7919) % top for i in range(1000)]
+    assert all(level_for_xp(x) == _level_loop(x) for x in samples)
+
+    for name, fn in (("bisect", level_for_xp), ("loop", _level_loop)):
+        t = timeit.timeit(lambda: [fn(x) for x in samples], number=n // len(samples))
+        print(f"   {name:<7} {t / n * 1e9:8.0f} нс/вызов")
+
+def _count_queries(app, client, path, body, with_xp: bool) -> int:
+    import app.logic.progression as progression
+    original = progression.award
+    if not with_xp:
+        progression.award = lambda *a, **kw: {}
+    try:
+        nonce = client.get("/api/state").get_json()["state"]["action_nonce"]
+        with app.app_context():
+            engine = db.engine
+        with StatementRecorder(engine) as rec:
+            r = client.post(f"/api/action/{path}", json=body, headers={"X-Action-Nonce": nonce})
+        assert r.status_code == 200, r.get_json()
+        return sum(rec.counts.values())
+    finally:
+        progression.award = original
+
+def bench_queries() -> bool:
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        db.session.add(Player(user_id=BENCH_UID, display_name="bench", balance=10_000))
+        db.session.commit()
+    with client.session_transaction() as s:
+        s["uid"] = BENCH_UID
+
+    # Первый запрос воркера запускает фоновую сборку рейтинга и цен;
+    # её запросы идут через тот же движок — дожидаемся до замера
+    client.get("/api/state")
+    for thread in (leaderboard._resync_thread, pricing._resync_thread):
+        thread.join(timeout=30)
+
+    def ripen():
+        with app.app_context():
+            plot = db.session.query(Plot).filter_by(user_id=BENCH_UID, idx=0).one()
+            plot.planted_at -= timedelta(hours=1)
+            plot.ready_at -= timedelta(hours=1)
+            db.session.commit()
+
+    def buy_seed():
+        nonce = client.get("/api/state").get_json()["state"]["action_nonce"]
+        client.post("/api/action/shop/buy", json={"item_key": "seed_wheat"}, headers={"X-Action-Nonce": nonce})
+
+    counts = {}
+    for with_xp in (False, True):
+        buy_seed()
+        row = counts[with_xp] = {}
+        row["plant"] = _count_queries(app, client, "plant", {"idx": 0, "item_key": "seed_wheat"}, with_xp)
+        ripen()
+        row["harvest"] = _count_queries(app, client, "harvest", {"idx": 0}, with_xp)
+        row["sell"] = _count_queries(app, client, "sell", {"item_key": "crop_wheat"}, with_xp)
+        print(f"   {'с опытом' if with_xp else 'без опыта':<10} "
+              + " ".join(f"{action}={n}" for action, n in row.items()))
+    extra = {action: counts[True][action] - counts[False][action] for action in counts[True]}
+    print("   добавил опыт: " + " ".join(f"{action}=+{n}" for action, n in extra.items())
+          + "   (ожидается " + " ".join(f"{a}=+{n}" for a, n in XP_EXTRA_QUERIES.items()) + ")")
+    return extra == XP_EXTRA_QUERIES
+
+def main():
+    print("⏱  Поиск уровня по опыту:")
+    bench_lookup()
+    print("\n🧮 SQL-запросов на действие:")
+    ok = bench_queries()
+    print("\n✅ Лишних запросов нет" if ok else "\n❌ Начисление опыта добавило лишние запросы")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
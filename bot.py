@@ -1,38 +1,38 @@
+import asyncio
 import os
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram import Bot
+
+from app.bot import handlers
 
 load_dotenv()
 BOT_TOKEN  = os.getenv("BOT_TOKEN", "").strip()
 WEBAPP_URL = os.getenv("WEBAPP_URL", "").strip()
+BOT_MODE   = os.getenv("BOT_MODE", "polling")
 
 if not BOT_TOKEN or not WEBAPP_URL:
     raise RuntimeError("BOT_TOKEN и/или WEBAPP_URL не заданы в .env")
 
-# Текст приветствия
-WELCOME = (
-    "Привет! 👋\n"
-    "Это мини-ферма. Открой её внутри Telegram WebApp.\n\n"
-    "Нажми кнопку ниже — «Открыть ферму»."
-)
-
 def webapp_keyboard_inline():
     # Инлайн-кнопка над сообщением
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton(text="🌾 Открыть ферму", web_app=WebAppInfo(url=WEBAPP_URL))]
-    ])
-    return kb
+    return handlers.webapp_keyboard_inline(WEBAPP_URL)
 
-async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        WELCOME,
-        reply_markup=webapp_keyboard_inline()
-    )
+async def register_webhook():
+    # В режиме webhook апдейты принимает само веб-приложение (/bot/webhook),
+    # здесь только сообщаем Telegram адрес и секрет
+    url = os.getenv("BOT_WEBHOOK_URL", "").strip()
+    secret = os.getenv("BOT_WEBHOOK_SECRET", "").strip()
+    if not url or not secret:
+        raise RuntimeError("BOT_WEBHOOK_URL и/или BOT_WEBHOOK_SECRET не заданы в .env")
+    async with Bot(BOT_TOKEN) as bot:
+        await bot.set_webhook(url=url, secret_token=secret, allowed_updates=["message"])
+    print(f"Webhook registered: {url}")
 
 def main():
-    application = Application.builder().token(BOT_TOKEN).build()
-    application.add_handler(CommandHandler("start", cmd_start))
+    if BOT_MODE == "webhook":
+        asyncio.run(register_webhook())
+        return
+    application = handlers.build_application(BOT_TOKEN, WEBAPP_URL)
     print("Bot polling started. Press Ctrl+C to stop.")
     application.run_polling()
 
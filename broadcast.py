@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Рассылка сообщения всем игрокам через бота.
+
+    python broadcast.py "Текст объявления"   # новая рассылка
+    python broadcast.py --resume 3            # продолжить прерванную
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from app import create_app
+from app.bot.broadcast import BroadcastEngine
+from app.bot.sender import RateLimiter
+from bot import BOT_TOKEN, webapp_keyboard_inline
+
+async def main(args):
+    app = create_app()
+    cfg = app.config
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    # Пул соединений под число воркеров — иначе PTB шлёт по одному запросу
+    request = HTTPXRequest(connection_pool_size=cfg["BROADCAST_WORKERS"])
+    async with Bot(BOT_TOKEN, request=request) as bot:
+        engine = BroadcastEngine(
+            app, bot,
+            limiter=RateLimiter(per_sec=cfg["BOT_SEND_PER_SEC"]),
+            workers=cfg["BROADCAST_WORKERS"],
+            fetch_batch=cfg["BROADCAST_FETCH_BATCH"],
+            reply_markup=webapp_keyboard_inline(),
+        )
+        broadcast_id = args.resume or engine.create(args.text)
+        print(f"📣 Рассылка #{broadcast_id} запущена. Ctrl+C — пауза (можно продолжить --resume).")
+        res = await engine.run(broadcast_id, stop)
+
+    if res["finished"]:
+        print(f"✅ Рассылка #{broadcast_id} завершена: {res}")
+    else:
+        print(f"⏸️  Рассылка #{broadcast_id} остановлена на user_id={res['cursor_user_id']}: {res}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Рассылка всем игрокам")
+    parser.add_argument("text", nargs="?", help="Текст сообщения")
+    parser.add_argument("--resume", type=int, help="ID рассылки для продолжения")
+    args = parser.parse_args()
+    if not args.text and not args.resume:
+        parser.error("нужен текст или --resume ID")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args))
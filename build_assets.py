@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Сборка статики: хэш содержимого в именах, минификация CSS/JS,
+WebP-варианты картинок и manifest.json для шаблонов.
+
+Запускать при каждом деплое, до старта gunicorn:
+    python build_assets.py
+"""
+
+import os
+
+from app.utils.assets import build, DIST_DIR
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app", "static")
+
+if __name__ == "__main__":
+    print("📦 Сборка статики...\n")
+    manifest = build(STATIC_ROOT)
+    print(f"\n✅ Готово: {len(manifest)} файлов в app/static/{DIST_DIR}/")
@@ -14,6 +14,8 @@ class Config:
     игровой механики и магазина.
     """
     SECRET_KEY = os.getenv("SECRET_KEY", "dev_secret_key")
+    # Дев-режим: автоперезагрузка шаблонов, без кэша рендера страниц
+    DEV_MODE = os.getenv("DEV_MODE", "0") == "1"
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = "Lax"
@@ -66,6 +68,141 @@ class Config:
         "onion": ONION_GROW_MS,
     }
 
+    # Рейтинг: дельта из БД (изменения других воркеров), сек; 0 — только сборка при старте
+    LEADERBOARD_RESYNC_SEC = int(os.getenv("LEADERBOARD_RESYNC_SEC", "60"))
+    # Запас дельты на поздние коммиты и разницу часов узлов
+    LEADERBOARD_RESYNC_OVERLAP_SEC = int(os.getenv("LEADERBOARD_RESYNC_OVERLAP_SEC", "120"))
+    # Сколько мест материализовать в leaderboard_snapshots при пересборке; 0 — не писать
+    LEADERBOARD_SNAPSHOT_TOP = int(os.getenv("LEADERBOARD_SNAPSHOT_TOP", "0"))
+    LEADERBOARD_MAX_LIMIT = int(os.getenv("LEADERBOARD_MAX_LIMIT", "100"))
+
+    # Почасовые агрегаты экономики (app/logic/rollups.py, rollup_stats.py)
+    ROLLUP_BATCH = int(os.getenv("ROLLUP_BATCH", "5000"))
+    ROLLUP_SETTLE_SEC = float(os.getenv("ROLLUP_SETTLE_SEC", "10"))  # не брать строки лога моложе
+    ROLLUP_POLL_SEC = float(os.getenv("ROLLUP_POLL_SEC", "30"))
+    ROLLUP_MAX_HOURS = int(os.getenv("ROLLUP_MAX_HOURS", str(24 * 90)))  # окно /api/dev/stats
+
+    # Журнал баланса (app/logic/ledger.py): снимок баланса каждые N записей игрока
+    LEDGER_SNAPSHOT_EVERY = int(os.getenv("LEDGER_SNAPSHOT_EVERY", "100"))
+
+    # Анти-чит по потоку действий (app/logic/anticheat.py)
+    ANTICHEAT = os.getenv("ANTICHEAT", "1") == "1"
+    ANTICHEAT_AUTOBLOCK = os.getenv("ANTICHEAT_AUTOBLOCK", "1") == "1"
+    ANTICHEAT_MAX_USERS = int(os.getenv("ANTICHEAT_MAX_USERS", "100000"))
+    ANTICHEAT_MIN_CV = float(os.getenv("ANTICHEAT_MIN_CV", "0.05"))  # σ/μ интервалов между действиями
+    ANTICHEAT_READY_STREAK = int(os.getenv("ANTICHEAT_READY_STREAK", "12"))
+    ANTICHEAT_READY_WINDOW_MS = int(os.getenv("ANTICHEAT_READY_WINDOW_MS", "500"))
+    # Доход с полей: все 16 полей под луком дают ~620 монет в минуту
+    ANTICHEAT_MAX_INCOME_PER_MIN = float(os.getenv("ANTICHEAT_MAX_INCOME_PER_MIN", "1500"))
+
+    # Рынок игроков (app/logic/market.py)
+    MARKET_MAX_PRICE = int(os.getenv("MARKET_MAX_PRICE", "10000"))  # монет за штуку
+    MARKET_MAX_QTY = int(os.getenv("MARKET_MAX_QTY", "1000"))
+    MARKET_MAX_OPEN_ORDERS = int(os.getenv("MARKET_MAX_OPEN_ORDERS", "20"))  # на игрока
+    MARKET_DEPTH_LEVELS = int(os.getenv("MARKET_DEPTH_LEVELS", "10"))
+    # Пересборка стаканов из БД (исполнения и отмены других воркеров), сек; 0 — только при старте
+    MARKET_RESYNC_SEC = int(os.getenv("MARKET_RESYNC_SEC", "30"))
+
+    # Цены продажи от предложения (app/logic/pricing.py); 0 — всегда SELL_PRICES
+    PRICE_DYNAMIC = os.getenv("PRICE_DYNAMIC", "1") == "1"
+    PRICE_HALF_LIFE_SEC = float(os.getenv("PRICE_HALF_LIFE_SEC", "3600"))  # затухание счётчика продаж
+    PRICE_WINDOW_SEC = int(os.getenv("PRICE_WINDOW_SEC", str(4 * 3600)))  # сколько общих счётчиков учитывать
+    PRICE_BUCKET_SEC = int(os.getenv("PRICE_BUCKET_SEC", "300"))  # ширина корзины общих счётчиков
+    # Объём продаж предмета (затухающий), при котором цена ещё базовая
+    PRICE_TARGET_VOLUME = float(os.getenv("PRICE_TARGET_VOLUME", "500"))
+    PRICE_ELASTICITY = float(os.getenv("PRICE_ELASTICITY", "0.5"))
+    PRICE_FLOOR = float(os.getenv("PRICE_FLOOR", "0.25"))  # доля базовой цены
+    PRICE_CAP = float(os.getenv("PRICE_CAP", "1.0"))
+    PRICE_CACHE_SEC = float(os.getenv("PRICE_CACHE_SEC", "5"))  # пересчёт таблицы цен
+    # Обмен продажами с другими воркерами через SharedState, сек; 0 — только чтение при старте
+    PRICE_RESYNC_SEC = int(os.getenv("PRICE_RESYNC_SEC", "60"))
+
+    # Резервные копии (app/utils/backup.py, backup_db.py); пусто — instance/backups
+    BACKUP_DIR = os.getenv("BACKUP_DIR", "")
+    BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))  # копий каждой БД
+    BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "1024"))  # страниц SQLite за порцию
+    BACKUP_SLEEP_SEC = float(os.getenv("BACKUP_SLEEP_SEC", "0.05"))  # пауза между порциями
+    BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "5"))
+    BACKUP_INTERVAL_SEC = int(os.getenv("BACKUP_INTERVAL_SEC", "3600"))  # backup_db.py --loop
+
+    # Админы (Telegram ID через запятую): /api/dev/profiler и т.п.; в DEV_MODE — все
+    ADMIN_USER_IDS = os.getenv("ADMIN_USER_IDS", "")
+    # Профилирование запросов по требованию (app/utils/profiler.py)
+    PROFILER_KEEP = int(os.getenv("PROFILER_KEEP", "50"))
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+    PROFILER_CHECK_SEC = float(os.getenv("PROFILER_CHECK_SEC", "2"))
+
+    # Idempotency-Key для действий: сколько секунд ответ можно повторить
+    IDEMPOTENCY_TTL_SEC = int(os.getenv("IDEMPOTENCY_TTL_SEC", "300"))
+
+    # Общее состояние узлов (nonce, лимиты, идемпотентность, версии кэшей):
+    # memory — один процесс (run.py, uvicorn без --workers);
+    # redis — SHARED_STATE_URL, для нескольких процессов (gunicorn -w N) и узлов;
+    # sql — таблица shared_state, без Redis, но каждая операция — коммит в основной
+    # БД: лимит и nonce на каждое действие, ещё два — на запрос с Idempotency-Key.
+    # Шардированию нужен redis или sql: reshard.py — отдельный процесс
+    SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")
+    SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "")
+    SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "farm:")
+    SHARED_STATE_MAX_ENTRIES = int(os.getenv("SHARED_STATE_MAX_ENTRIES", "100000"))
+    # Как часто узел сверяет версию кэша страниц с общим хранилищем
+    PAGE_CACHE_CHECK_SEC = float(os.getenv("PAGE_CACHE_CHECK_SEC", "5"))
+
+    # Реплики для маршрутов только на чтение (app/models/replicas.py), через запятую;
+    # нужен SHARED_STATE_BACKEND=redis (memory — в одном процессе), не sql
+    DATABASE_REPLICA_URLS = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_RYW_SEC = float(os.getenv("REPLICA_RYW_SEC", "5"))  # после записи игрок читает с основной
+    REPLICA_RETRY_SEC = float(os.getenv("REPLICA_RETRY_SEC", "30"))
+    REPLICA_CHECK_SEC = float(os.getenv("REPLICA_CHECK_SEC", "5"))
+    REPLICA_MAX_LAG_SEC = float(os.getenv("REPLICA_MAX_LAG_SEC", "10"))  # только PostgreSQL
+
+    # Шардирование по user_id (app/models/sharding.py): SHARD_URLS="s1=url,s2=url",
+    # SHARDS — шарды в кольце; main — основная БД (DATABASE_URL)
+    SQLALCHEMY_BINDS = dict(
+        p.strip().split("=", 1) for p in os.getenv("SHARD_URLS", "").split(",") if p.strip()
+    )
+    SHARDS = os.getenv("SHARDS", "main")
+    SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+    SHARD_CHECK_SEC = float(os.getenv("SHARD_CHECK_SEC", "2"))
+
+    # Очередь действий с групповым коммитом (app/logic/action_queue.py)
+    ACTION_QUEUE = os.getenv("ACTION_QUEUE", "0") == "1"
+    ACTION_QUEUE_BATCH_MS = float(os.getenv("ACTION_QUEUE_BATCH_MS", "5"))
+    ACTION_QUEUE_MAX_BATCH = int(os.getenv("ACTION_QUEUE_MAX_BATCH", "256"))
+    # Нужно, если действия пишут несколько процессов (gunicorn -w N)
+    ACTION_QUEUE_ROW_LOCKS = os.getenv("ACTION_QUEUE_ROW_LOCKS", "0") == "1"
+    ACTION_QUEUE_TIMEOUT_SEC = float(os.getenv("ACTION_QUEUE_TIMEOUT_SEC", "30"))
+
+    # ASGI-режим (uvicorn asgi:app): пул async-движка отдельно от числа запросов
+    ASGI_DB_POOL_SIZE = int(os.getenv("ASGI_DB_POOL_SIZE", "10"))
+    ASGI_DB_MAX_OVERFLOW = int(os.getenv("ASGI_DB_MAX_OVERFLOW", "5"))
+    ASGI_DB_POOL_TIMEOUT = float(os.getenv("ASGI_DB_POOL_TIMEOUT", "10"))
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))  # для Flask-маршрутов
+    ASGI_SSE_HEARTBEAT_SEC = float(os.getenv("ASGI_SSE_HEARTBEAT_SEC", "15"))
+
+    # Бот: polling (отдельный процесс bot.py) или webhook (эндпоинт /bot/webhook в этом приложении)
+    BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
+    WEBAPP_URL = os.getenv("WEBAPP_URL", "").strip()
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "")  # публичный https://.../bot/webhook
+    BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")
+    BOT_WEBHOOK_WORKERS = int(os.getenv("BOT_WEBHOOK_WORKERS", "8"))
+    BOT_WEBHOOK_QUEUE = int(os.getenv("BOT_WEBHOOK_QUEUE", "1000"))
+    BOT_WEBHOOK_DEDUP_SEC = int(os.getenv("BOT_WEBHOOK_DEDUP_SEC", "3600"))  # сколько помнить update_id
+    BOT_WEBHOOK_START_TIMEOUT_SEC = float(os.getenv("BOT_WEBHOOK_START_TIMEOUT_SEC", "30"))
+    BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "")  # пусто — api.telegram.org
+
+    # Уведомления о созревании (notifier.py)
+    NOTIFY_HORIZON_SEC = int(os.getenv("NOTIFY_HORIZON_SEC", "60"))
+    NOTIFY_POLL_SEC = int(os.getenv("NOTIFY_POLL_SEC", "15"))
+    NOTIFY_BATCH = int(os.getenv("NOTIFY_BATCH", "500"))
+    NOTIFY_COALESCE_SEC = int(os.getenv("NOTIFY_COALESCE_SEC", "5"))
+    # Глобальный лимит отправки бота (Telegram: ~30 сообщений/сек)
+    BOT_SEND_PER_SEC = float(os.getenv("BOT_SEND_PER_SEC", "25"))
+    # Рассылки (broadcast.py)
+    BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "20"))
+    BROADCAST_FETCH_BATCH = int(os.getenv("BROADCAST_FETCH_BATCH", "1000"))
+
     # Рост пшеницы (для обратной совместимости)
     WHEAT_STAGE_SPROUT = int(os.getenv("WHEAT_STAGE_SPROUT", "30"))
     WHEAT_STAGE_YOUNG  = int(os.getenv("WHEAT_STAGE_YOUNG",  "90"))
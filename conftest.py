@@ -0,0 +1,25 @@
+"""Общие фикстуры тестов: приложение на временных файлах SQLite."""
+
+import os
+
+import pytest
+
+from config import Config
+
+@pytest.fixture
+def make_app(monkeypatch, tmp_path):
+    """
+    Фабрика приложений: ``make_app(SHARDS="main,s1", ...)``.
+
+    Основная БД — ``tmp_path/main.db``; остальные настройки ``Config``
+    подменяются на время теста.
+    """
+    def factory(**overrides):
+        from app import create_app
+        overrides.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///" + os.path.join(tmp_path, "main.db"))
+        overrides.setdefault("ANTICHEAT", False)
+        for key, value in overrides.items():
+            monkeypatch.setattr(Config, key, value, raising=False)
+        return create_app()
+
+    return factory
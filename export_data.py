@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Потоковая выгрузка данных (app/utils/export.py).
+
+    python export_data.py action_logs --format csv --since 2025-01-01 --out logs.csv
+    python export_data.py players --format ndjson > players.ndjson
+    python export_data.py inventories --user 12345
+    python export_data.py action_logs --format parquet --out logs.parquet   # нужен pyarrow
+
+Память не растёт с объёмом выгрузки: строки читаются серверным
+курсором пачками по --batch.
+"""
+
+import argparse
+import sys
+import time
+
+from app import create_app
+from app.utils import export
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка таблиц игры")
+    parser.add_argument("table", choices=sorted(export.TABLES))
+    parser.add_argument("--format", default="ndjson", choices=sorted(export.FORMATS))
+    parser.add_argument("--user", type=int, help="только этот user_id")
+    parser.add_argument("--since", help="action_logs: created_at >= (ISO, UTC)")
+    parser.add_argument("--until", help="action_logs: created_at < (ISO, UTC)")
+    parser.add_argument("--batch", type=int, default=export.DEFAULT_BATCH, help="строк в пачке")
+    parser.add_argument("--out", help="файл; по умолчанию stdout")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            chunks = export.stream(args.table, args.format, user_id=args.user,
+                                   since=args.since, until=args.until, batch=args.batch)
+        except export.ExportError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return False
+
+        out = open(args.out, "wb") if args.out else sys.stdout.buffer
+        started = time.perf_counter()
+        size = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        finally:
+            if args.out:
+                out.close()
+        if args.out:
+            print(f"✅ {args.out}: {size / 1024 / 1024:.1f} МБ за {time.perf_counter() - started:.1f} с",
+                  file=sys.stderr)
+        return True
+
+if __name__ == "__main__":
+    if not main():
+        raise SystemExit(1)
@@ -1,65 +1,64 @@
 #!/usr/bin/env python3
 """
-Скрипт миграции для добавления полей блокировки в таблицу players.
+Применение миграций схемы (app/migrations).
+
+    python migrate_db.py            # применить все ожидающие
+    python migrate_db.py --list     # показать статус
+    python migrate_db.py --to 2     # применить до версии 2 включительно
+
+База берётся из конфигурации приложения (DATABASE_URL); при
+шардировании миграции применяются и к каждому шарду из SHARD_URLS.
 """
 
-import sqlite3
-import os
+import argparse
 
-def migrate_database():
-    """Добавляет поля блокировки в таблицу players."""
-    db_path = "instance/app.db"
-    
-    if not os.path.exists(db_path):
-        print("❌ База данных не найдена. Запустите приложение сначала.")
-        return False
-    
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Проверяем, существуют ли уже столбцы
-        cursor.execute("PRAGMA table_info(players)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'is_blocked' in columns:
-            print("✅ Столбцы блокировки уже существуют.")
-            conn.close()
-            return True
-        
-        print("🔄 Добавление полей блокировки в таблицу players...")
-        
-        # Добавляем столбцы
-        cursor.execute("ALTER TABLE players ADD COLUMN is_blocked INTEGER DEFAULT 0")
-        cursor.execute("ALTER TABLE players ADD COLUMN blocked_reason TEXT")
-        
-        conn.commit()
-        
-        print("✅ Миграция выполнена успешно!")
-        print("   - Добавлен столбец is_blocked (INTEGER, по умолчанию 0)")
-        print("   - Добавлен столбец blocked_reason (TEXT, может быть NULL)")
-        
-        # Проверяем результат
-        cursor.execute("SELECT COUNT(*) FROM players")
-        player_count = cursor.fetchone()[0]
-        print(f"📊 Обновлено записей игроков: {player_count}")
-        
-        conn.close()
+from app import create_app
+from app.models import db
+from app import migrations
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции базы данных")
+    parser.add_argument("--list", action="store_true", help="показать статус миграций")
+    parser.add_argument("--to", type=int, help="последняя версия для применения")
+    parser.add_argument("--batch", type=int, default=1000, help="размер пачки при заполнении данных")
+    parser.add_argument("--throttle", type=float, default=0.05, help="пауза между пачками, сек")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        # Основная БД первой, затем шарды
+        engines = [db.engine] + [e for key, e in db.engines.items() if key is not None]
+        for engine in engines:
+            if not migrate(engine, args):
+                return False
         return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Ошибка SQLite: {e}")
-        return False
+
+def migrate(engine, args) -> bool:
+    print(f"🗄️  База: {engine.url.render_as_string(hide_password=True)}\n")
+
+    if args.list:
+        done = migrations.applied_versions(engine)
+        for mig in migrations.discover():
+            mark = "✅" if mig.version in done else "⏳"
+            print(f"{mark} {mig.version:04d} {mig.name}")
+        return True
+
+    try:
+        applied = migrations.upgrade(engine, target=args.to,
+                                     batch_size=args.batch, throttle_sec=args.throttle)
     except Exception as e:
-        print(f"❌ Общая ошибка: {e}")
+        print(f"❌ Ошибка миграции: {e}")
         return False
 
+    if applied:
+        print(f"\n✅ Применено миграций: {len(applied)}")
+    else:
+        print("✅ Схема актуальна.")
+    return True
+
 if __name__ == "__main__":
-    print("🗄️  Миграция базы данных для системы блокировки...\n")
+    success = main()
     
-    success = migrate_database()
-    
-    if success:
-        print(f"\n🎉 Миграция завершена! Теперь можно запускать приложение.")
-    else:
-        print(f"\n💥 Миграция не удалась. Проверьте ошибки выше.")
\ No newline at end of file
+    if not success:
+        print(f"\n💥 Миграция не удалась. Проверьте ошибки выше.")
+        raise SystemExit(1)
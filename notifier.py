@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Сервис уведомлений о созревании урожая.
+
+Запускается отдельным процессом рядом с bot.py:
+    python notifier.py
+"""
+
+import asyncio
+import logging
+import signal
+
+from telegram import Bot
+
+from app import create_app
+from app.bot.notifier import ReadyNotifier
+from app.bot.sender import RateLimiter
+from bot import BOT_TOKEN, webapp_keyboard_inline
+
+async def main():
+    app = create_app()
+    cfg = app.config
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    async with Bot(BOT_TOKEN) as bot:
+        notifier = ReadyNotifier(
+            app, bot,
+            limiter=RateLimiter(per_sec=cfg["BOT_SEND_PER_SEC"]),
+            horizon_sec=cfg["NOTIFY_HORIZON_SEC"],
+            poll_sec=cfg["NOTIFY_POLL_SEC"],
+            batch_size=cfg["NOTIFY_BATCH"],
+            coalesce_sec=cfg["NOTIFY_COALESCE_SEC"],
+            reply_markup=webapp_keyboard_inline(),
+        )
+        print("Notifier started. Press Ctrl+C to stop.")
+        await notifier.run(stop)
+        print(f"Notifier stopped: {notifier.stats}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Перенос игроков между шардами (app/models/sharding.py).
+
+    python reshard.py --to main,shard1 --dry-run   # сколько игроков переедет
+    python reshard.py --to main,shard1             # перенести
+    # выкатить SHARDS=main,shard1 на все узлы
+    python reshard.py --to main,shard1 --finish    # добрать новых и выключить переопределения
+
+Новый шард сначала добавляется в SHARD_URLS (таблицы создаст
+create_app). Скрипт обходит игроков каждого шарда и переносит тех, кого
+кольцо ``--to`` относит к другому шарду: строки таблиц игрока
+(``SHARDED_TABLES``: players, plots, inventories, журнал баланса, ...) —
+одной транзакцией на каждой из двух БД. Пока идёт перенос, игрок получает 503,
+после — узлы находят его по переопределению ``shard:<uid>`` в общем
+хранилище, пока не выкатят новое кольцо.
+
+Запуск повторный безопасен: строки на целевом шарде перезаписываются.
+
+Заявки рынка (``market_orders``) не переносятся: рынок работает только
+без шардирования (app/logic/market.py), а обеспечение открытой заявки —
+списанные монеты или урожай — осталось бы в основной БД без возможности
+отмены. Поэтому, пока есть открытые заявки, перенос не запускается:
+их отменяют (или дожидаются исполнения) до подключения ``SHARD_URLS``.
+История сделок (``market_trades``) остаётся в основной БД.
+"""
+
+import argparse
+import time
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app import create_app
+from app.models import db
+from app.models.sharding import MAIN, MOVING, SHARDED_TABLES, HashRing
+from app.utils.shared_state import get_shared_state
+
+MOVING_TTL_SEC = 60  # если скрипт упал посреди переноса игрока
+OVERRIDE_TTL_SEC = 7 * 24 * 3600
+
+def _engines() -> dict:
+    return {MAIN if key is None else key: engine for key, engine in db.engines.items()}
+
+def _player_ids(engine, batch: int):
+    players = db.metadata.tables["players"]
+    last = None
+    while True:
+        q = select(players.c.user_id).order_by(players.c.user_id).limit(batch)
+        if last is not None:
+            q = q.where(players.c.user_id > last)
+        with engine.connect() as conn:
+            page = conn.execute(q).scalars().all()
+        yield from page
+        if len(page) < batch:
+            return
+        last = page[-1]
+
+def open_market_orders() -> int:
+    """Открытые заявки рынка (основная БД) — в них лежит обеспечение игроков."""
+    orders = db.metadata.tables["market_orders"]
+    with db.engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(orders).where(orders.c.status == "open")
+        ).scalar_one()
+
+def move_player(uid: int, src, dst) -> int:
+    """
+    Переносит строки игрока ``src`` -> ``dst``. Возвращает число строк.
+
+    Суррогатные ``id`` (plots, inventories, action_logs) не копируются —
+    на целевом шарде у таблиц своя последовательность.
+    """
+    moved = 0
+    with src.begin() as s, dst.begin() as d:
+        players = db.metadata.tables["players"]
+        # Блокировка строки игрока: параллельное действие дождётся конца переноса
+        s.execute(update(players).where(players.c.user_id == uid).values(user_id=players.c.user_id))
+        for name in sorted(SHARDED_TABLES):
+            t = db.metadata.tables[name]
+            rows = [dict(r) for r in s.execute(select(t).where(t.c.user_id == uid)).mappings()]
+            if "id" in t.c and t.c.id.primary_key:
+                for r in rows:
+                    del r["id"]
+            d.execute(delete(t).where(t.c.user_id == uid))
+            if rows:
+                d.execute(insert(t), rows)
+            s.execute(delete(t).where(t.c.user_id == uid))
+            moved += len(rows)
+    return moved
+
+def run_pass(ring: HashRing, state, *, batch: int, dry_run: bool) -> dict:
+    engines = _engines()
+    plan: dict[tuple[str, str], int] = {}
+    for src_name, src in engines.items():
+        for uid in _player_ids(src, batch):
+            dst_name = ring.shard_for(uid)
+            if dst_name == src_name:
+                continue
+            plan[(src_name, dst_name)] = plan.get((src_name, dst_name), 0) + 1
+            if dry_run:
+                continue
+            state.set(f"shard:{uid}", MOVING, ttl=MOVING_TTL_SEC)
+            try:
+                move_player(uid, src, engines[dst_name])
+            except Exception:
+                state.delete(f"shard:{uid}")  # строки остались на исходном шарде
+                raise
+            state.set(f"shard:{uid}", dst_name.encode(), ttl=OVERRIDE_TTL_SEC)
+    return plan
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос игроков между шардами")
+    parser.add_argument("--to", required=True, help="шарды нового кольца через запятую, например main,shard1")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать переезды")
+    parser.add_argument("--finish", action="store_true", help="последний проход и выключение переопределений")
+    parser.add_argument("--batch", type=int, default=1000, help="размер страницы игроков")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        shards = [s.strip() for s in args.to.split(",") if s.strip()]
+        unknown = [s for s in shards if s not in _engines()]
+        if unknown:
+            print(f"❌ Нет в SHARD_URLS: {', '.join(unknown)}")
+            return False
+        orders = open_market_orders()
+        if orders and not args.dry_run:
+            print(f"❌ Открытых заявок рынка: {orders}. Их обеспечение не переносится — "
+                  f"отмените заявки (без SHARD_URLS рынок доступен) и запустите снова.")
+            return False
+        ring = HashRing(shards, vnodes=app.config.get("SHARD_VNODES", 64))
+        state = get_shared_state(app)
+
+        if not args.dry_run:
+            state.set("shard:resharding", args.to.encode())
+            # Узлы проверяют флаг раз в SHARD_CHECK_SEC
+            time.sleep(app.config.get("SHARD_CHECK_SEC", 2) * 2)
+
+        started = time.perf_counter()
+        plan = run_pass(ring, state, batch=args.batch, dry_run=args.dry_run)
+        for (src, dst), n in sorted(plan.items()):
+            print(f"   {src} -> {dst}: {n}")
+        total = sum(plan.values())
+        verb = "Переедет" if args.dry_run else "Перенесено"
+        print(f"✅ {verb} игроков: {total} за {time.perf_counter() - started:.1f} с")
+
+        if args.finish:
+            state.delete("shard:resharding")
+            print("✅ Перенос завершён, узлы работают по кольцу SHARDS.")
+        elif not args.dry_run:
+            print(f"\nДальше: SHARDS={args.to} на всех узлах, затем reshard.py --to {args.to} --finish")
+        return True
+
+if __name__ == "__main__":
+    if not main():
+        raise SystemExit(1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Почасовые агрегаты экономики (app/logic/rollups.py).
+
+    python rollup_stats.py                  # догнать лог и выйти
+    python rollup_stats.py --loop           # фоновый процесс, проход раз в ROLLUP_POLL_SEC
+    python rollup_stats.py --rebuild        # стереть агрегаты и пересчитать историю
+    python rollup_stats.py --throttle 0.1   # догон истории с паузами между пачками
+
+История догоняется пачками по --batch строк, каждая пачка — своя
+транзакция; прерванный запуск продолжится с водяной отметки.
+"""
+
+import argparse
+import logging
+import time
+
+from app import create_app
+from app.logic import rollups
+
+log = logging.getLogger("rollup_stats")
+
+def main():
+    parser = argparse.ArgumentParser(description="Почасовые агрегаты экономики")
+    parser.add_argument("--loop", action="store_true", help="работать постоянно")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать всё с начала лога")
+    parser.add_argument("--batch", type=int, help="строк лога в пачке (ROLLUP_BATCH)")
+    parser.add_argument("--throttle", type=float, default=0.0, help="пауза между пачками, сек")
+    args = parser.parse_args()
+
+    app = create_app()
+    cfg = app.config
+    batch = args.batch or cfg["ROLLUP_BATCH"]
+    with app.app_context():
+        if args.rebuild:
+            rollups.reset()
+            print("✅ Агрегаты очищены, пересчёт с начала лога")
+
+        while True:
+            started = time.perf_counter()
+            try:
+                n = rollups.run_pass(batch=batch, settle_sec=cfg["ROLLUP_SETTLE_SEC"],
+                                     throttle_sec=args.throttle)
+            except Exception:
+                if not args.loop:
+                    raise
+                log.exception("rollup pass failed")
+                n = 0
+            if n or not args.loop:
+                print(f"✅ Учтено строк лога: {n} за {time.perf_counter() - started:.1f} с")
+            if not args.loop:
+                return True
+            time.sleep(cfg["ROLLUP_POLL_SEC"])
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Стресс-тест действий: много параллельных покупок, посадок, сборов и
+продаж по одним и тем же игрокам, затем проверка инвариантов.
+
+    python stress_actions.py                              # временная SQLite, 16 тредов
+    python stress_actions.py --threads 8 --processes 4    # 4 процесса × 8 тредов
+    DATABASE_URL=postgresql+psycopg://... python stress_actions.py --retries 3
+    python stress_actions.py --queue                      # через очередь действий
+
+Действия идут через ``_run_action`` — ту же транзакцию, что у
+обработчиков API, без nonce и лимитов. Посадка датируется прошлым, чтобы
+урожай сразу был готов и сборы одной грядки гонялись друг с другом.
+
+После прогона по ``action_logs`` этого прогона сверяется:
+    * баланс = начальный + продажи − покупки − поля, и журнал баланса
+      (``ledger.verify_chunk``) без расхождений;
+    * поля, семена и урожай сходятся с числом действий, остатки ≥ 0,
+      дублей строк инвентаря нет;
+    * сборов не больше, чем было посажено (нет двойного сбора);
+    * успешных ответов столько же, сколько записей в журнале действий.
+
+Отчёт: гистограммы задержки действий и ожидания блокировок (на
+PostgreSQL — ``SELECT ... FOR UPDATE``, на SQLite — запись, где берётся
+блокировка файла), ошибки по видам и число повторов. Код выхода 1 —
+инвариант нарушен. Игроки — user_id от 940000 в указанной БД.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "stress.db")
+# Сотни действий в секунду от одного игрока — ровно то, что ловит анти-чит
+os.environ.setdefault("ANTICHEAT", "0")
+
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from app import create_app
+from app.logic import ledger
+from app.logic.action_queue import get_action_queue
+from app.models import db, ActionLog, Inventory, Player, Plot, add_inventory
+from app.models.sharding import use_shard
+from app.routes.actions import _buy_field_tx, _harvest_tx, _plant_tx, _run_action, _sell_tx, _shop_buy_tx
+
+STRESS_UID = 940000
+SEED, CROP = "seed_wheat", "crop_wheat"
+DEFAULT_MIX = "buy_field:1,shop_buy:4,plant:4,harvest:4,sell:4"
+# Границы корзин гистограмм, мс
+BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# --- замер ожидания блокировок ------------------------------------------------
+
+# Замеры всех соединений процесса: в режиме очереди запросы идут из её треда
+_waits: list[float] = []
+
+def _is_lock_statement(statement: str, sqlite: bool) -> bool:
+    head = statement.lstrip()[:6].upper()
+    if sqlite:
+        # FOR UPDATE SQLite не поддерживает: файл блокируется первой записью
+        return head in ("INSERT", "UPDATE", "DELETE")
+    return head == "SELECT" and "FOR UPDATE" in statement.upper()
+
+def _install_lock_timer(engine) -> None:
+    sqlite = engine.dialect.name == "sqlite"
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _is_lock_statement(statement, sqlite):
+            conn.info["stress_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info.pop("stress_t0", None)
+        if t0 is not None:
+            _waits.append((time.perf_counter() - t0) * 1000)
+
+# --- игроки --------------------------------------------------------------------
+
+def _seed(app, players: int, balance: int, stock: int, fields: int) -> None:
+    with app.app_context():
+        for uid in range(STRESS_UID, STRESS_UID + players):
+            with use_shard(uid):
+                player = db.session.get(Player, uid)
+                if player is None:
+                    db.session.add(Player(user_id=uid, display_name=f"stress{uid}", balance=balance,
+                                          fields_owned=fields))
+                    add_inventory(uid, SEED, stock)
+                    add_inventory(uid, CROP, stock)
+                db.session.commit()
+
+def _snapshot(uid: int) -> dict:
+    """Состояние игрока для сверки (сессия — на его шарде)."""
+    player = db.session.get(Player, uid)
+    inv = dict(db.session.execute(
+        select(Inventory.item_key, func.sum(Inventory.qty)).where(Inventory.user_id == uid)
+        .group_by(Inventory.item_key)
+    ).all())
+    rows = db.session.execute(
+        select(Inventory.item_key, func.count()).where(Inventory.user_id == uid)
+        .group_by(Inventory.item_key)
+    ).all()
+    planted = db.session.execute(
+        select(func.count()).select_from(Plot).where(Plot.user_id == uid, Plot.crop_key.isnot(None))
+    ).scalar_one()
+    last_log = db.session.execute(
+        select(func.max(ActionLog.id)).where(ActionLog.user_id == uid)
+    ).scalar_one()
+    negative = db.session.execute(
+        select(func.count()).select_from(Inventory).where(Inventory.user_id == uid, Inventory.qty < 0)
+    ).scalar_one()
+    return {
+        "balance": player.balance, "fields": player.fields_owned,
+        "seeds": int(inv.get(SEED) or 0), "crops": int(inv.get(CROP) or 0),
+        "planted": planted, "last_log": last_log or 0, "negative": negative,
+        "dup_rows": [key for key, n in rows if n > 1],
+    }
+
+def _log_counts(uid: int, after_id: int) -> Counter:
+    rows = db.session.execute(
+        select(ActionLog.action, func.count()).where(ActionLog.user_id == uid, ActionLog.id > after_id)
+        .group_by(ActionLog.action)
+    ).all()
+    return Counter({action.split(":", 1)[0]: n for action, n in rows})
+
+# --- нагрузка ------------------------------------------------------------------
+
+_app = None
+
+def _init_worker(queue: bool) -> None:
+    global _app
+    _app = create_app()
+    _app.config["ACTION_QUEUE"] = queue
+    with _app.app_context():
+        for engine in db.engines.values():
+            _install_lock_timer(engine)
+
+def _classify(exc: Exception) -> str:
+    if isinstance(exc, IntegrityError):
+        return "conflict"  # (user_id, seq) журнала, uq_inventory_user_item, uq_plot_user_idx
+    code = getattr(getattr(exc, "orig", None), "pgcode", None) or getattr(getattr(exc, "orig", None), "sqlstate", None)
+    if code == "40P01":
+        return "deadlock"
+    if code == "40001":
+        return "serialization"
+    if code == "55P03":
+        return "lock_timeout"
+    if isinstance(exc, OperationalError) and "locked" in str(exc).lower():
+        return "db_locked"
+    return type(exc).__name__
+
+_RETRYABLE = {"conflict", "deadlock", "serialization", "lock_timeout", "db_locked"}
+
+def _prepare(op: str, cfg, past: datetime, fields: int):
+    if op == "buy_field":
+        return _buy_field_tx, ()
+    if op == "shop_buy":
+        return _shop_buy_tx, (SEED, int(cfg["SHOP_ITEMS"][SEED]["price"]))
+    if op == "plant":
+        return _plant_tx, (random.randrange(fields), SEED, "wheat", past)
+    if op == "harvest":
+        return _harvest_tx, (random.randrange(fields),)
+    return _sell_tx, (CROP, int(cfg["SELL_PRICES"][CROP]))
+
+def _worker(job) -> dict:
+    """Тред нагрузки: ``ops`` случайных действий по случайным игрокам."""
+    ops, players, mix, retries, fields, seed, start = job
+    rnd = random.Random(seed)
+    names, weights = zip(*mix)
+    out = {"ok": Counter(), "rejected": Counter(), "errors": Counter(), "retries": 0,
+           "latency": [], "waits": []}
+    # Сбор сразу после посадки: урожай «созрел» день назад
+    past = datetime.now(timezone.utc) - timedelta(days=1)
+    with _app.app_context():
+        if start is not None:
+            start.wait()
+        for _ in range(ops):
+            op = rnd.choices(names, weights)[0]
+            uid = STRESS_UID + rnd.randrange(players)
+            fn, args = _prepare(op, _app.config, past, fields)
+            t0 = time.perf_counter()
+            for attempt in range(retries + 1):
+                try:
+                    with use_shard(uid):
+                        _, err = _run_action(uid, fn, *args)
+                except (DBAPIError, OperationalError) as e:
+                    db.session.rollback()
+                    kind = _classify(e)
+                    out["errors"][kind] += 1
+                    if kind in _RETRYABLE and attempt < retries:
+                        out["retries"] += 1
+                        continue
+                    break
+                if err:
+                    out["rejected"][f"{op}:{err[0].get_json()['error']}"] += 1
+                else:
+                    out["ok"][op] += 1
+                break
+            out["latency"].append((time.perf_counter() - t0) * 1000)
+    return out
+
+def _process_job(job) -> dict:
+    threads, ops, players, mix, retries, fields, seed = job
+    start = threading.Barrier(threads)
+    results = [None] * threads
+
+    def run(i):
+        results[i] = _worker((ops, players, mix, retries, fields, seed * 1000 + i, start))
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    _waits.clear()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    total = _merge(results)
+    total["waits"] = list(_waits)
+    return total
+
+def _merge(results) -> dict:
+    total = {"ok": Counter(), "rejected": Counter(), "errors": Counter(), "retries": 0,
+             "latency": [], "waits": []}
+    for r in results:
+        for key in ("ok", "rejected", "errors"):
+            total[key].update(r[key])
+        total["retries"] += r["retries"]
+        total["latency"].extend(r["latency"])
+        total["waits"].extend(r["waits"])
+    return total
+
+# --- отчёт ---------------------------------------------------------------------
+
+def _histogram(title: str, values: list[float]) -> None:
+    print(f"\n   {title}: {len(values)} замеров", end="")
+    if not values:
+        print()
+        return
+    values = sorted(values)
+    pct = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    print(f", p50 {pct(0.5):.2f} мс, p99 {pct(0.99):.2f} мс, max {values[-1]:.2f} мс")
+    counts = Counter()
+    for v in values:
+        counts[next((b for b in BUCKETS if v <= b), None)] += 1
+    peak = max(counts.values())
+    lo = 0
+    for b in (*BUCKETS, None):
+        n = counts.get(b, 0)
+        label = f"≤{b:g}" if b is not None else f">{lo:g}"
+        if n:
+            print(f"   {label:>7} мс {n:7d} {'█' * max(1, round(30 * n / peak))}")
+        lo = b if b is not None else lo
+
+def _check(app, players: int, before: dict, ok: Counter) -> list[str]:
+    cfg = app.config
+    seed_price = int(cfg["SHOP_ITEMS"][SEED]["price"])
+    crop_price = int(cfg["SELL_PRICES"][CROP])
+    field_cost = cfg.get("FIELD_COST", 5)
+    problems = []
+    logged = Counter()
+    with app.app_context():
+        for uid in range(STRESS_UID, STRESS_UID + players):
+            with use_shard(uid):
+                b = before[uid]
+                a = _snapshot(uid)
+                n = _log_counts(uid, b["last_log"])
+                logged.update(n)
+                issues = ledger.verify_chunk([uid])
+            expected = {
+                "balance": b["balance"] + n["sell"] * crop_price - n["shop_buy"] * seed_price
+                           - n["buy_field"] * field_cost,
+                "fields": b["fields"] + n["buy_field"],
+                "seeds": b["seeds"] + n["shop_buy"] - n["plant"],
+                "crops": b["crops"] + n["harvest"] - n["sell"],
+                "planted": b["planted"] + n["plant"] - n["harvest"],
+            }
+            for key, want in expected.items():
+                if a[key] != want:
+                    problems.append(f"{uid}: {key} = {a[key]}, ожидалось {want}")
+            if a["balance"] < 0:
+                problems.append(f"{uid}: отрицательный баланс {a['balance']}")
+            if a["fields"] > cfg.get("FIELD_MAX", 16):
+                problems.append(f"{uid}: полей {a['fields']} больше FIELD_MAX")
+            if a["negative"]:
+                problems.append(f"{uid}: отрицательных остатков: {a['negative']}")
+            if a["dup_rows"]:
+                problems.append(f"{uid}: дубли строк инвентаря {a['dup_rows']}")
+            if n["harvest"] > b["planted"] + n["plant"]:
+                problems.append(f"{uid}: двойной сбор — сборов {n['harvest']}, посадок {b['planted'] + n['plant']}")
+            problems.extend(f"{uid}: журнал баланса — {p['issue']}" for p in issues)
+    for op in set(ok) | set(logged):
+        if ok[op] != logged[op]:
+            problems.append(f"{op}: успешных ответов {ok[op]}, записей в action_logs {logged[op]}")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser(description="Стресс-тест действий и проверка инвариантов")
+    ap.add_argument("--threads", type=int, default=16, help="тредов (в каждом процессе)")
+    ap.add_argument("--processes", type=int, default=0, help="процессов; 0 — треды в этом процессе")
+    ap.add_argument("--ops", type=int, default=200, help="действий на тред")
+    ap.add_argument("--players", type=int, default=2, help="игроков — чем меньше, тем жёстче гонки")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="веса действий, имя:вес через запятую")
+    ap.add_argument("--retries", type=int, default=0, help="повторов при конфликте/блокировке")
+    ap.add_argument("--balance", type=int, default=500, help="начальный баланс игрока")
+    ap.add_argument("--stock", type=int, default=20, help="начальных семян и урожая")
+    ap.add_argument("--fields", type=int, default=4, help="грядок, на которых сажаем")
+    ap.add_argument("--queue", action="store_true", help="через очередь действий (ACTION_QUEUE)")
+    ap.add_argument("--seed", type=int, default=1, help="seed случайных действий")
+    args = ap.parse_args()
+
+    mix = [(name, float(w)) for name, w in (part.split(":") for part in args.mix.split(","))]
+    _init_worker(args.queue)
+    app = _app
+    _seed(app, args.players, args.balance, args.stock, args.fields)
+    with app.app_context():
+        before = {}
+        for uid in range(STRESS_UID, STRESS_UID + args.players):
+            with use_shard(uid):
+                before[uid] = _snapshot(uid)
+        db.session.rollback()
+
+    workers = max(1, args.processes)
+    total_ops = workers * args.threads * args.ops
+    print(f"🔥 {workers} проц. × {args.threads} тредов × {args.ops} действий, игроков: {args.players}, "
+          f"{app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0]}"
+          f"{', очередь действий' if args.queue else ''}")
+
+    t0 = time.perf_counter()
+    if args.processes:
+        jobs = [(args.threads, args.ops, args.players, mix, args.retries, args.fields, args.seed + i)
+                for i in range(args.processes)]
+        with ProcessPoolExecutor(args.processes, initializer=_init_worker, initargs=(args.queue,)) as pool:
+            result = _merge(pool.map(_process_job, jobs))
+    else:
+        result = _process_job((args.threads, args.ops, args.players, mix, args.retries, args.fields, args.seed))
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n   {total_ops} действий за {elapsed:.2f} с ({total_ops / elapsed:.0f}/с)")
+    print(f"   успешно: {dict(result['ok'])}")
+    print(f"   отказы:  {dict(result['rejected'].most_common(8))}")
+    print(f"   ошибки:  {dict(result['errors']) or 'нет'}, повторов: {result['retries']}")
+    if args.queue and not args.processes:
+        stats = get_action_queue(app).stats
+        print(f"   очередь: пачек {stats['batches']}, откатов пачки {stats['fallbacks']}")
+    _histogram("Задержка действия", result["latency"])
+    _histogram("Ожидание блокировок", result["waits"])
+
+    problems = _check(app, args.players, before, result["ok"])
+    print()
+    for p in problems[:30]:
+        print(f"   ❌ {p}")
+    if len(problems) > 30:
+        print(f"   ... и ещё {len(problems) - 30}")
+    print("✅ Инварианты соблюдены" if not problems else f"❌ Нарушений инвариантов: {len(problems)}")
+    return not problems
+
+if __name__ == "__main__":
+    if not main():
+        raise SystemExit(1)
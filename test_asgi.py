@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Тесты ASGI-режима (app/asgi): async-движок смотрит в ту же БД, что и Flask.
+
+Запросы идут через ``httpx.ASGITransport`` — без сервера и сети.
+"""
+
+import asyncio
+import os
+
+import flask
+import httpx
+
+def test_asgi_reads_what_flask_wrote_with_relative_sqlite_url(make_app, tmp_path, monkeypatch):
+    """Относительный ``sqlite:///main.db`` — файл в instance_path, а не в рабочем каталоге."""
+    from app.asgi import create_asgi_app
+    from app.models import db, Player
+
+    instance = tmp_path / "instance"
+    instance.mkdir()
+    cwd = tmp_path / "cwd"
+    cwd.mkdir()
+    monkeypatch.setattr(flask.Flask, "auto_find_instance_path", lambda self: str(instance))
+    monkeypatch.chdir(cwd)
+
+    app = make_app(SQLALCHEMY_DATABASE_URI="sqlite:///main.db")
+    with app.app_context():
+        db.session.add(Player(user_id=77, display_name="asgi", balance=123))
+        db.session.commit()
+    assert os.path.exists(instance / "main.db")
+
+    game = create_asgi_app(app)
+    cookie = app.session_interface.get_signing_serializer(app).dumps({"uid": 77})
+
+    async def get_state():
+        transport = httpx.ASGITransport(app=game)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test",
+                                     cookies={app.config["SESSION_COOKIE_NAME"]: cookie}) as client:
+            try:
+                return await client.get("/api/state")
+            finally:
+                await game.engine.dispose()
+
+    r = asyncio.run(get_state())
+    assert r.status_code == 200, r.text
+    state = r.json()["state"]
+    assert state["display_name"] == "asgi"
+    assert state["balance"] == 123
+    assert not os.path.exists(cwd / "main.db")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Тесты отправки ботом против локальной заглушки Bot API (app/bot/fake_api.py).
+
+Сеть не нужна: ``FakeBotApi`` слушает 127.0.0.1 на свободном порту.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import telegram
+
+from app.bot.fake_api import FakeBotApi
+from app.bot.sender import BLOCKED, SENT, RateLimiter, send_with_retry
+
+async def _with_bot(api: FakeBotApi, fn):
+    await api.start()
+    try:
+        async with telegram.Bot("123:TEST", base_url=api.base_url) as bot:
+            return await fn(bot)
+    finally:
+        await api.stop()
+
+def test_send_with_retry_handles_429_and_blocked():
+    """429 с retry_after повторяется, заблокировавший бота — BLOCKED без повторов."""
+    api = FakeBotApi(blocked={13}, flood_every=2, retry_after=1)
+    limiter = RateLimiter(per_sec=100, per_chat_interval=0)
+
+    async def run(bot):
+        return [await send_with_retry(bot, chat_id, f"привет {chat_id}", limiter=limiter)
+                for chat_id in (11, 12, 13)]
+
+    t0 = time.monotonic()
+    results = asyncio.run(_with_bot(api, run))
+    elapsed = time.monotonic() - t0
+
+    assert results == [SENT, SENT, BLOCKED]
+    assert [m["chat_id"] for m in api.sent] == [11, 12]
+    assert [m["text"] for m in api.sent] == ["привет 11", "привет 12"]
+    assert api.floods >= 1
+    assert elapsed >= api.retry_after  # повтор ждал retry_after
+
+def test_ready_notifier_sends_one_message_per_player(make_app):
+    """Созревшие грядки игрока склеиваются в одно сообщение; заблокировавшим бота не пишем."""
+    from app.bot.notifier import ReadyNotifier
+    from app.models import db, Player, Plot
+
+    app = make_app()
+    soon = datetime.utcnow() + timedelta(seconds=1)
+    with app.app_context():
+        for uid, blocked, plots in ((101, 0, 3), (102, 0, 1), (103, 1, 2)):
+            db.session.add(Player(user_id=uid, display_name=f"p{uid}", bot_blocked=blocked))
+            for idx in range(plots):
+                db.session.add(Plot(user_id=uid, idx=idx, crop_key="wheat",
+                                    planted_at=soon - timedelta(minutes=2), ready_at=soon))
+        db.session.commit()
+
+    api = FakeBotApi(flood_every=3, retry_after=1)
+
+    async def run(bot):
+        notifier = ReadyNotifier(app, bot, limiter=RateLimiter(per_sec=100, per_chat_interval=0),
+                                 horizon_sec=30, poll_sec=1, coalesce_sec=1)
+        stop = asyncio.Event()
+        task = asyncio.create_task(notifier.run(stop))
+        for _ in range(100):
+            if notifier.stats["skipped"] + notifier.stats[SENT] >= 3:
+                break
+            await asyncio.sleep(0.1)
+        stop.set()
+        await task
+        return notifier.stats
+
+    stats = asyncio.run(_with_bot(api, run))
+
+    by_chat = {m["chat_id"]: m["text"] for m in api.sent}
+    assert len(api.sent) == 2
+    assert "Готово грядок: 3" in by_chat[101]
+    assert "Готово грядок: 1" in by_chat[102]
+    assert 103 not in by_chat
+    assert stats[SENT] == 2 and stats["skipped"] == 1
+
+def test_webhook_start_fails_fast_when_bot_api_is_down():
+    """Ошибка initialize() (getMe недоступен) пробрасывается в start(), а не вешает тред запроса."""
+    import pytest
+    from app.bot.handlers import build_application
+    from app.bot.webhook import WebhookDispatcher
+
+    application = build_application("123:TEST", "https://example.invalid", polling=False,
+                                    base_url="http://127.0.0.1:1/bot")
+    disp = WebhookDispatcher(application, workers=1)
+    t0 = time.monotonic()
+    with pytest.raises(telegram.error.NetworkError):
+        disp.start(timeout=20)
+    assert time.monotonic() - t0 < 20
+
+def test_webhook_dedup_is_shared_between_dispatchers():
+    """Повтор update_id, пришедший в другой воркер, отсекается через общее состояние."""
+    from app.bot.webhook import WebhookDispatcher
+    from app.utils.shared_state import MemoryBackend
+
+    state = MemoryBackend()
+    a = WebhookDispatcher(None, state=state)
+    b = WebhookDispatcher(None, state=state)
+    assert a._mark_seen(501)
+    assert not b._mark_seen(501)
+    a._unmark(501)  # очередь была полна — повтор от Telegram должен пройти
+    assert b._mark_seen(501)
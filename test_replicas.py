@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Тесты чтения с реплик (app/models/replicas.py) на двух файлах SQLite.
+
+Реплика — копия основной БД (backup API SQLite), после которой баланс
+игрока в ней «отстаёт»: по балансу в ответе видно, откуда он прочитан.
+Общее состояние (окно RYW, nonce) — в ``FakeKV``, как в Redis на проде.
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+PRIMARY_BALANCE = 100
+REPLICA_BALANCE = 1
+
+@pytest.fixture
+def kv():
+    pytest.importorskip("redis")
+    from app.utils.fake_kv import FakeKV
+
+    server = FakeKV()
+    server.start()
+    yield server
+    server.stop()
+
+def _setup(make_app, tmp_path, kv, **overrides):
+    from app.models import db, Player
+    from app.utils.shared_state import get_shared_state
+
+    primary = os.path.join(tmp_path, "main.db")
+    replica = os.path.join(tmp_path, "replica.db")
+    overrides.setdefault("REPLICA_CHECK_SEC", 3600)
+    overrides.setdefault("SHARED_STATE_BACKEND", "redis")
+    overrides.setdefault("SHARED_STATE_URL", kv.url)
+    app = make_app(DATABASE_REPLICA_URLS="sqlite:///" + replica, **overrides)
+    with app.app_context():
+        for uid in (1, 2):
+            db.session.add(Player(user_id=uid, display_name=f"p{uid}", balance=PRIMARY_BALANCE))
+        db.session.commit()
+    # Подготовка — не запись игрока: окно «читаю свои записи» не нужно
+    for uid in (1, 2):
+        get_shared_state(app).delete(f"ryw:{uid}")
+
+    src, dst = sqlite3.connect(primary), sqlite3.connect(replica)
+    src.backup(dst)
+    dst.execute("UPDATE players SET balance = ?", (REPLICA_BALANCE,))
+    dst.commit()
+    src.close()
+    dst.close()
+    return app, replica
+
+def _client(app, uid):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["uid"] = uid
+    return client
+
+def _balance(client) -> int:
+    r = client.get("/api/state")
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()["state"]["balance"]
+
+def test_read_only_routes_go_to_replica(make_app, tmp_path, kv):
+    app, _ = _setup(make_app, tmp_path, kv)
+    pool = app.extensions["replicas"]
+
+    assert _balance(_client(app, 1)) == REPLICA_BALANCE
+    assert pool.stats["replica"] == 1
+
+def test_replicas_refuse_sql_shared_state(make_app, tmp_path):
+    """Окно RYW и nonce на основной БД съели бы разгрузку — такая настройка не запускается."""
+    with pytest.raises(RuntimeError, match="SHARED_STATE_BACKEND"):
+        make_app(DATABASE_REPLICA_URLS="sqlite:///" + os.path.join(tmp_path, "replica.db"),
+                 SHARED_STATE_BACKEND="sql")
+
+def test_read_your_writes_after_commit(make_app, tmp_path, kv):
+    """После своей записи игрок читает с основной БД; другие игроки — по-прежнему с реплики."""
+    app, _ = _setup(make_app, tmp_path, kv, REPLICA_RYW_SEC=60)
+    pool = app.extensions["replicas"]
+    client = _client(app, 1)
+
+    nonce = client.get("/api/state").get_json()["state"]["action_nonce"]
+    r = client.post("/api/action/shop/buy", json={"item_key": "seed_wheat"}, headers={"X-Action-Nonce": nonce})
+    assert r.status_code == 200, r.get_json()
+    price = app.config["SHOP_ITEMS"]["seed_wheat"]["price"]
+
+    assert _balance(client) == PRIMARY_BALANCE - price
+    assert pool.stats["primary_ryw"] == 1
+    assert _balance(_client(app, 2)) == REPLICA_BALANCE
+
+def test_failover_when_replica_file_is_gone(make_app, tmp_path, kv):
+    """Запрос к пропавшей реплике выводит её из ротации и выполняется на основной БД."""
+    app, replica = _setup(make_app, tmp_path, kv)
+    pool = app.extensions["replicas"]
+    client = _client(app, 1)
+    assert _balance(client) == REPLICA_BALANCE
+
+    pool.dispose()
+    os.remove(replica)  # SQLite создаст пустой файл — без таблиц
+
+    assert _balance(client) == PRIMARY_BALANCE
+    assert pool.stats["failovers"] == 1
+    assert _balance(client) == PRIMARY_BALANCE  # реплика вне ротации — сразу основная
+    assert pool.stats["primary_down"] == 1
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Тесты шардирования (app/models/sharding.py, reshard.py) на нескольких
+файлах SQLite: основная БД ``main.db`` и шарды ``s1.db``, ``s2.db``.
+
+Где лежит строка, проверяется чтением файлов напрямую, мимо приложения.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import reshard
+
+UIDS = list(range(1001, 1061))
+
+def _shard_app(make_app, tmp_path, shards: str):
+    binds = {name: "sqlite:///" + os.path.join(tmp_path, f"{name}.db") for name in ("s1", "s2")}
+    # Переопределения шардов пишет reshard.py из своего процесса — нужно общее состояние
+    return make_app(SQLALCHEMY_BINDS=binds, SHARDS=shards, SHARD_CHECK_SEC=0, SHARED_STATE_BACKEND="sql")
+
+def _seed(app, uids) -> None:
+    from app.models import db, ActionLog, Player, add_inventory
+    from app.models.sharding import use_shard
+
+    with app.app_context():
+        for uid in uids:
+            with use_shard(uid):
+                db.session.add(Player(user_id=uid, display_name=f"p{uid}", balance=uid))
+                add_inventory(uid, "crop_wheat", 3)
+                db.session.add(ActionLog(user_id=uid, action="harvest:wheat"))
+                db.session.commit()
+
+def _uids_in(tmp_path, shard: str, table: str = "players") -> list[int]:
+    conn = sqlite3.connect(os.path.join(tmp_path, f"{shard}.db"))
+    try:
+        return sorted(uid for (uid,) in conn.execute(f"SELECT user_id FROM {table}"))
+    finally:
+        conn.close()
+
+def test_players_live_on_their_ring_shard(make_app, tmp_path):
+    app = _shard_app(make_app, tmp_path, "main,s1,s2")
+    ring = app.extensions["shards"].ring
+    _seed(app, UIDS)
+
+    for shard in ("main", "s1", "s2"):
+        expected = [uid for uid in UIDS if ring.shard_for(uid) == shard]
+        assert expected, f"кольцо не отдало шарду {shard} ни одного игрока"
+        assert _uids_in(tmp_path, shard) == expected
+        assert _uids_in(tmp_path, shard, "inventories") == expected
+
+    # Запрос с игроком в сессии читает с его шарда
+    uid = next(u for u in UIDS if ring.shard_for(u) == "s2")
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["uid"] = uid
+    r = client.get("/api/state")
+    assert r.status_code == 200
+    assert r.get_json()["state"]["balance"] == uid
+
+def test_export_gathers_all_shards(make_app, tmp_path):
+    from app.utils import export
+
+    app = _shard_app(make_app, tmp_path, "main,s1,s2")
+    _seed(app, UIDS)
+    with app.app_context():
+        body = b"".join(export.stream("players", "ndjson"))
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert sorted(r["user_id"] for r in rows) == UIDS
+
+def test_reshard_moves_player_rows(make_app, tmp_path):
+    from app.models.sharding import HashRing, shard_of
+    from app.utils.shared_state import get_shared_state
+
+    app = _shard_app(make_app, tmp_path, "main")
+    _seed(app, UIDS)
+    assert _uids_in(tmp_path, "main") == UIDS
+
+    ring = HashRing(["main", "s1"], vnodes=app.config["SHARD_VNODES"])
+    moved = [uid for uid in UIDS if ring.shard_for(uid) == "s1"]
+    with app.app_context():
+        state = get_shared_state(app)
+        plan = reshard.run_pass(ring, state, batch=7, dry_run=False)
+
+        assert plan == {("main", "s1"): len(moved)}
+        stayed = [uid for uid in UIDS if uid not in moved]
+        for table in ("players", "inventories", "action_logs"):
+            assert _uids_in(tmp_path, "main", table) == stayed
+            assert _uids_in(tmp_path, "s1", table) == moved
+
+        # Пока идёт перенос, узлы находят игрока по переопределению
+        state.set("shard:resharding", b"main,s1")
+        assert {shard_of(uid) for uid in moved} == {"s1"}
+        assert {shard_of(uid) for uid in stayed} == {"main"}
+
+def test_reshard_refuses_with_open_market_orders(make_app, tmp_path, monkeypatch):
+    from app.models import db, MarketOrder
+
+    app = _shard_app(make_app, tmp_path, "main")
+    _seed(app, UIDS[:5])
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add(MarketOrder(user_id=UIDS[0], item_key="crop_wheat", side="sell", price=10, qty=1,
+                                   remaining=1, status="open", created_at=now, updated_at=now))
+        db.session.commit()
+
+    monkeypatch.setattr(sys, "argv", ["reshard.py", "--to", "main,s1"])
+    assert reshard.main() is False
+    assert _uids_in(tmp_path, "main") == UIDS[:5]
+    assert _uids_in(tmp_path, "s1") == []
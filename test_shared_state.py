@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Тесты общего состояния (app/utils/shared_state.py): одинаковые
+``add`` / ``compare_and_set`` / ``incr`` / TTL у всех трёх бэкендов.
+
+``redis`` проверяется на ``FakeKV`` — локальном RESP-сервере.
+"""
+
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.utils.shared_state import MemoryBackend, SqlBackend, hit_rate_limit
+
+TTL = 0.3
+
+@pytest.fixture(params=["memory", "sql", "redis"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    elif request.param == "sql":
+        from app.models import SharedStateEntry
+
+        engine = create_engine("sqlite:///" + os.path.join(tmp_path, "state.db"))
+        SharedStateEntry.__table__.create(engine)
+        yield SqlBackend(engine)
+        engine.dispose()
+    else:
+        pytest.importorskip("redis")
+        from app.utils.fake_kv import FakeKV
+        from app.utils.shared_state import RedisBackend
+
+        kv = FakeKV()
+        kv.start()
+        backend = RedisBackend(kv.url, prefix="t:")
+        yield backend
+        backend.client.close()
+        kv.stop()
+
+def test_add_only_once(state):
+    assert state.add("k", b"1") is True
+    assert state.add("k", b"2") is False
+    assert state.get("k") == b"1"
+    assert state.delete("k") is True
+    assert state.delete("k") is False
+    assert state.add("k", b"3") is True
+
+def test_compare_and_set(state):
+    assert state.compare_and_set("k", b"a", b"b") is False  # ключа нет
+    state.set("k", b"a")
+    assert state.compare_and_set("k", b"x", b"b") is False
+    assert state.compare_and_set("k", b"a", b"b") is True
+    assert state.get("k") == b"b"
+
+def test_incr_amount_and_counter(state):
+    assert state.counter("n") == 0
+    assert state.incr("n") == 1
+    assert state.incr("n", amount=5) == 6
+    assert state.incr("n", amount=-2) == 4
+    assert state.counter("n") == 4
+
+def test_ttl_expires(state):
+    state.set("k", b"v", ttl=TTL)
+    assert state.add("a", b"v", ttl=TTL) is True
+    assert state.get("k") == b"v"
+    time.sleep(TTL + 0.2)
+    assert state.get("k") is None
+    assert state.compare_and_set("k", b"v", b"w") is False
+    assert state.add("a", b"again") is True  # просроченный ключ занимается заново
+
+def test_incr_ttl_is_set_on_creation_only(state):
+    """Следующие ``incr`` не продлевают срок: окно счётчика не «ползёт»."""
+    state.incr("n", ttl=TTL)
+    time.sleep(TTL / 2)
+    assert state.incr("n", ttl=TTL) == 2
+    time.sleep(TTL / 2 + 0.2)
+    assert state.counter("n") == 0
+    assert state.incr("n", ttl=TTL) == 1
+
+# --- лимит действий ----------------------------------------------------
+
+WINDOW = 10
+T0 = 1_000_000 * WINDOW  # начало окна
+
+def test_rate_limit_rejected_attempts_are_not_counted(state):
+    assert [hit_rate_limit(state, 1, 3, WINDOW, now=T0 + 1) for _ in range(3)] == [True] * 3
+    assert not any(hit_rate_limit(state, 1, 3, WINDOW, now=T0 + 2) for _ in range(20))
+    assert state.counter(f"rl:1:{WINDOW}:{T0 // WINDOW}") == 3
+    # 429 не сдвигают окно: через window_sec после первых попыток снова можно
+    assert hit_rate_limit(state, 1, 3, WINDOW, now=T0 + WINDOW + 9)
+
+def test_rate_limit_no_double_burst_at_window_edge(state):
+    """Пачка в конце окна учитывается и в начале следующего."""
+    assert all(hit_rate_limit(state, 1, 5, WINDOW, now=T0 + 9.9) for _ in range(5))
+    assert not hit_rate_limit(state, 1, 5, WINDOW, now=T0 + WINDOW + 0.1)
+    # Половина прошлого окна ушла — вес пачки 2.5, проходят ещё два
+    allowed = [hit_rate_limit(state, 1, 5, WINDOW, now=T0 + WINDOW + 5) for _ in range(4)]
+    assert allowed == [True, True, False, False]
+    # Лимит у каждого игрока свой
+    assert hit_rate_limit(state, 2, 5, WINDOW, now=T0 + WINDOW + 5)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Сверка балансов игроков с журналом (app/logic/ledger.py).
+
+    python verify_ledger.py                    # все шарды, 8 потоков
+    python verify_ledger.py --workers 16 --chunk 2000
+
+Игроки каждого шарда делятся на пачки по --chunk (по user_id), пачки
+проверяются параллельно: три агрегирующих запроса на пачку, журнал
+читается только после последнего снимка игрока. Код выхода 1 — есть
+расхождения.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+from app import create_app
+from app.logic import ledger
+from app.models import db, Player
+from app.models.sharding import on_shard, shard_names
+
+def _chunks(shard, size: int):
+    last = None
+    while True:
+        q = select(Player.user_id).order_by(Player.user_id).limit(size)
+        if last is not None:
+            q = q.where(Player.user_id > last)
+        with on_shard(shard):
+            page = db.session.execute(q).scalars().all()
+        db.session.rollback()
+        if page:
+            yield shard, page
+        if len(page) < size:
+            return
+        last = page[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка балансов с журналом")
+    parser.add_argument("--workers", type=int, default=8, help="параллельных проверок")
+    parser.add_argument("--chunk", type=int, default=1000, help="игроков в пачке")
+    parser.add_argument("--show", type=int, default=20, help="сколько расхождений вывести")
+    args = parser.parse_args()
+
+    app = create_app()
+
+    def check(job):
+        shard, uids = job
+        # У каждого потока свой app context — своя сессия и соединение
+        with app.app_context(), on_shard(shard):
+            return len(uids), ledger.verify_chunk(uids)
+
+    started = time.perf_counter()
+    checked = 0
+    problems = []
+    with app.app_context(), ThreadPoolExecutor(max_workers=args.workers) as pool:
+        jobs = (job for shard in shard_names() for job in _chunks(shard, args.chunk))
+        for n, found in pool.map(check, jobs):
+            checked += n
+            problems.extend(found)
+
+    for p in problems[:args.show]:
+        print(f"   ❌ {p['user_id']}: {p['issue']} (balance={p['balance']}, ledger={p['ledger']}, "
+              f"ledger_seq={p['ledger_seq']}, last_seq={p['last_seq']})")
+    if len(problems) > args.show:
+        print(f"   ... и ещё {len(problems) - args.show}")
+    icon = "❌" if problems else "✅"
+    print(f"{icon} Проверено игроков: {checked}, расхождений: {len(problems)} "
+          f"за {time.perf_counter() - started:.1f} с")
+    return not problems
+
+if __name__ == "__main__":
+    if not main():
+        raise SystemExit(1)